@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
-from modular.player_game_logs import load_nba_player_game_logs, prepare_upcoming_games_data
-from modular.metrics_functions import prepare_mean_std_data, prepare_league_std_data, prepare_performance_against_all_teams
+from modular.player_game_logs import load_nba_player_game_logs, prepare_upcoming_games_data, combine_with_upcoming_games
+from modular.metrics_functions import prepare_mean_std_data_windows, prepare_league_std_data, prepare_performance_against_team
+from modular.storage import load_game_logs
+from modular.schema import derived_stat_columns
 from modular.betting_functions import calculate_probability, calculate_bet_outcome, generate_betting_options, evaluate_bets, evaluate_bets_n_games_debug
+from modular.profiling import start_profile, profile_span, finish_profile, profile_frame, append_profile_log
 import os
 
 #file paths
@@ -15,6 +17,11 @@ upcoming_games_file_path = os.path.join('data', '23_24_season_games.csv')
 st.sidebar.header("Navigation")
 page = st.sidebar.radio("Select a page:", ["Player Analysis", "Forecasting Player Statistics"])
 
+# Stage timings of this rerun, shown in the sidebar on demand and appended to the JSON lines log at APP_PROFILE_LOG when set
+show_profile = st.sidebar.checkbox('Show stage timings', value=False)
+profile_log_path = os.environ.get('APP_PROFILE_LOG')
+profile = start_profile(page, trace_memory=show_profile or bool(profile_log_path))
+
 
 #------------Loading data with caching---------------
 st.sidebar.header("Refresh Data for Select Season Year with Players at the Minimum Average Minutes Played")
@@ -25,39 +32,84 @@ selected_season = st.sidebar.selectbox('Select Season Year', season_years)
 # min avg selection
 min_avg_minutes =st.sidebar.slider('Minimum Average Minutes Played', min_value=1, max_value=60, value=20, step=1)
 
-# Option to reload data
-if st.sidebar.button('Load/Refresh Data'):
-    load_nba_player_game_logs([selected_season], min_avg_minutes=min_avg_minutes, save_path=prev_data_file_path)
-    st.sidebar.success(f"Data for the {selected_season} season loaded successfully.")
-
-# Loading data with caching
-@st.cache(ttl=3600, max_entries=10, show_spinner=False)
-def load_data():
-    data = pd.read_csv(prev_data_file_path)
-    data['GAME_DATE'] = pd.to_datetime(data['GAME_DATE'])
+# Incremental refresh only appends the games played since the last refresh
+incremental_refresh = st.sidebar.checkbox('Only fetch new games (incremental refresh)', value=True)
+
+# Cached league/player aggregates, keyed by (dataset version, cutoff date, n_games, location) so widget changes
+# that only pick another player or stat reuse them across reruns
+def get_dataset_version(file_path):
+    """
+    Version of the saved game logs: changes whenever the file is rewritten.
+    """
+    if not os.path.exists(file_path):
+        return 'missing'
+    file_stat = os.stat(file_path)
+    return f"{file_stat.st_mtime_ns}-{file_stat.st_size}"
+
+@st.cache_data(ttl=3600, max_entries=2, show_spinner=False)
+def load_data(dataset_version):
+    # Reads the typed columnar copy of the game logs (built from the CSV when missing or outdated)
+    data = load_game_logs(prev_data_file_path)
     data.sort_values(by='GAME_DATE', inplace=True)
     return data
 
-#pull in upcoming games to concatenate to data and input averages onto it
-upcoming_games = prepare_upcoming_games_data(upcoming_games_file_path, prev_data_file_path, expand_with_players=True)
+@st.cache_data(ttl=3600, max_entries=2, show_spinner=False)
+def load_combined_data(dataset_version, today, schedule_version):
+    # Load the existing games data (these spans are only recorded when the cache misses)
+    with profile_span(profile, 'load_game_logs') as span:
+        previous_games = load_data(dataset_version)
+        span['rows_out'] = len(previous_games)
+
+    #pull in upcoming games to concatenate to data and input averages onto it
+    with profile_span(profile, 'prepare_upcoming_games_data') as span:
+        upcoming_games = prepare_upcoming_games_data(upcoming_games_file_path, prev_data_file_path, expand_with_players=True, today=today)
+        span['rows_out'] = len(upcoming_games)
+
+    # Upcoming games on dates not already in the logs, typed like the logs
+    with profile_span(profile, 'combine_with_upcoming_games', rows_in=len(previous_games) + len(upcoming_games)) as span:
+        data = combine_with_upcoming_games(previous_games, upcoming_games)
+        span['rows_out'] = len(data)
+    return data
 
-# Load the existing games data
-previous_games = load_data()
+# The leading underscore keeps streamlit from hashing the data, the version and cutoff identify it instead. The version
+# is the combined data's: the upcoming rows in it change with the day and the schedule as well as with the game logs
+# date_window tells apart data through the cutoff date ('through') from data on the cutoff date only ('on')
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_mean_std_data(_stats_data, dataset_version, cutoff_date, date_window, windows):
+    return prepare_mean_std_data_windows(_stats_data, list(windows))
 
-# Ensure GAME_DATE is in datetime format for comparison
-upcoming_games['GAME_DATE'] = pd.to_datetime(upcoming_games['GAME_DATE'])
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_league_std_data(_stats_data, dataset_version, cutoff_date, date_window, n_games, game_location):
+    return prepare_league_std_data(_stats_data, n_games=n_games, game_location=game_location)
 
-# Filter out upcoming games that have dates already in previous games
-unique_upcoming_games = upcoming_games[~upcoming_games['GAME_DATE'].isin(previous_games['GAME_DATE'])]
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_performance_against_team(_stats_data, dataset_version, cutoff_date, date_window, player_name, opponent_name):
+    return prepare_performance_against_team(_stats_data, player_name, opponent_name)
 
-# Concatenate the unique upcoming games to the previous games dataset
-data = pd.concat([previous_games, unique_upcoming_games], ignore_index=True)
+def clear_data_caches():
+    """
+    Explicitly evict every cached dataset and aggregate, e.g. after refreshing the game logs.
+    """
+    for cached_function in [load_data, load_combined_data, cached_mean_std_data, cached_league_std_data, cached_performance_against_team]:
+        cached_function.clear()
 
-# Sort the concatenated data by GAME_DATE to maintain chronological order
-data.sort_values(by='GAME_DATE', inplace=True)
+# Option to reload data
+if st.sidebar.button('Load/Refresh Data'):
+    refresh_progress = st.sidebar.progress(0.0)
+    def report_refresh_progress(completed, total, player_name, error=None):
+        refresh_progress.progress(completed / total, text=f"{completed}/{total} players ({player_name})")
+    load_nba_player_game_logs([selected_season], min_avg_minutes=min_avg_minutes, save_path=prev_data_file_path, max_workers=4, progress_callback=report_refresh_progress, incremental=incremental_refresh)
+    clear_data_caches()
+    st.sidebar.success(f"Data for the {selected_season} season loaded successfully.")
 
-# Reset the index of the concatenated DataFrame
-data.reset_index(drop=True, inplace=True)
+game_logs_version = get_dataset_version(prev_data_file_path)
+schedule_version = get_dataset_version(upcoming_games_file_path)
+upcoming_from_date = datetime.now().strftime('%Y-%m-%d')
+with profile_span(profile, 'load_combined_data') as span:
+    data = load_combined_data(game_logs_version, upcoming_from_date, schedule_version)
+    span['rows_out'] = len(data)
+# Version of the combined data, keys the cached aggregates built from it
+dataset_version = f"{game_logs_version}|{upcoming_from_date}|{schedule_version}"
 #------------Loading data with caching---------------
 
 # Use if-else to control the page display based on the sidebar selection
@@ -120,21 +172,28 @@ if page == "Player Analysis":
 
     # Computing averages and league standard deviation
     # (Ensure functions like prepare_mean_std_data and prepare_league_std_data are correctly implemented)
-    total_averages_data = prepare_mean_std_data(current_stats_data, n_games=total_games_played, game_location='All') #, current_date=current_date
-    n_game_aggregated_data_all = prepare_mean_std_data(current_stats_data, n_games=10, game_location='All') #, current_date=current_date
-    n_game_aggregated_data_home_or_away = prepare_mean_std_data(current_stats_data, n_games=10, game_location=game_location) #, current_date=current_date
-    league_std_data = prepare_league_std_data(current_stats_data, n_games=10, game_location=game_location)
-
-    # Performance against all teams
-    performance_against_all_teams = prepare_performance_against_all_teams(current_stats_data)
-    #filter against opposing_team
-    performance_against_all_teams = performance_against_all_teams[performance_against_all_teams['OPPONENT_NAME'] == game_opposing_team]
+    # Total, last 10 and last 10 home/away averages. The total window depends on the selected player's game count,
+    # so it is cached apart from the last 10 game windows shared by every player
+    with profile_span(profile, 'prepare_mean_std_data_windows', rows_in=len(current_stats_data)) as span:
+        aggregated_data = pd.concat([
+            cached_mean_std_data(current_stats_data, dataset_version, selected_date, 'through', ((total_games_played, 'All'),)),
+            cached_mean_std_data(current_stats_data, dataset_version, selected_date, 'through', ((10, 'All'), (10, game_location))),
+        ], ignore_index=True)
+        span['rows_out'] = len(aggregated_data)
+    with profile_span(profile, 'prepare_league_std_data', rows_in=len(current_stats_data)) as span:
+        league_std_data = cached_league_std_data(current_stats_data, dataset_version, selected_date, 'through', 10, game_location)
+        span['rows_out'] = len(league_std_data)
+
+    # Performance against the opposing team, only for the selected player
+    with profile_span(profile, 'prepare_performance_against_team', rows_in=len(current_stats_data)) as span:
+        performance_against_all_teams = cached_performance_against_team(current_stats_data, dataset_version, selected_date, 'through', selected_player, game_opposing_team)
+        span['rows_out'] = len(performance_against_all_teams)
 
     performance_against_all_teams = performance_against_all_teams.drop(columns=['OPPONENT_NAME'])
     #print(performance_against_all_teams.head())
 
     # Concatenate data for analysis
-    combined_data = pd.concat([total_averages_data, n_game_aggregated_data_all, n_game_aggregated_data_home_or_away, league_std_data, performance_against_all_teams], ignore_index=True)
+    combined_data = pd.concat([aggregated_data, league_std_data, performance_against_all_teams], ignore_index=True)
 
     # Filter for selected player and league standard
     combined_data_filtered = combined_data[combined_data['PLAYER_NAME'].isin([selected_player, 'League'])]
@@ -144,19 +203,22 @@ if page == "Player Analysis":
     st.dataframe(combined_data_filtered[['TEAM_NAME', 'HOME_AWAY', 'PLAYER_NAME', 'TYPE', 'TEAM_WIN_RATE', 'OPPONENT_WIN_RATE', 'PTS', 'FG3M', 'REB', 'AST', 'STL', 'BLK', 'TOV', 'MIN']])
 
     # Move Statistic Selection to Main Body
-    stats_options = ['PTS', 'REB', 'AST', 'STL', 'BLK']  # Extend with more stats as needed
+    stats_options = ['PTS', 'REB', 'AST', 'STL', 'BLK', 'FG3M', 'TOV'] + derived_stat_columns  # Combo and double/triple double columns are added at load
     selected_stat = st.selectbox('Select a Statistic for Graph', stats_options)
 
-    # Graph Visualization
-    fig, ax = plt.subplots()
-    player_season_data = data[data['PLAYER_NAME'] == selected_player]
-    ax.plot(player_season_data['GAME_DATE'], player_season_data[selected_stat], marker='o', linestyle='-', label=selected_stat)
-    ax.set_title(f"{selected_stat} Trend for {selected_player} During the Season")
-    ax.set_xlabel('Game Date')
-    ax.set_ylabel(selected_stat)
-    plt.xticks(rotation=45)
-    plt.legend()
-    st.pyplot(fig)
+    # Graph Visualization, matplotlib is only loaded by the page that plots
+    with profile_span(profile, 'plot_stat_trend') as span:
+        import matplotlib.pyplot as plt
+        fig, ax = plt.subplots()
+        player_season_data = data[data['PLAYER_NAME'] == selected_player]
+        span['rows_in'] = len(player_season_data)
+        ax.plot(player_season_data['GAME_DATE'], player_season_data[selected_stat], marker='o', linestyle='-', label=selected_stat)
+        ax.set_title(f"{selected_stat} Trend for {selected_player} During the Season")
+        ax.set_xlabel('Game Date')
+        ax.set_ylabel(selected_stat)
+        plt.xticks(rotation=45)
+        plt.legend()
+        st.pyplot(fig)
 
     # Betting Analysis Section
     st.header("Betting Analysis")
@@ -245,11 +307,13 @@ if page == "Player Analysis":
         #print("Preview of league_std_data:")
         #print(league_std_data.head())
 
-        betting_options_df = generate_betting_options(
-            player_data_filt, league_std_data, selected_player, game_opposing_team, 
-            all_players=False, n_games=n_games, league_std_rate=league_std_rate, 
-            probability_high=probability_high, probability_low=probability_low
-        )
+        with profile_span(profile, 'generate_betting_options (player)', rows_in=len(player_data_filt)) as span:
+            betting_options_df = generate_betting_options(
+                player_data_filt, league_std_data, selected_player, game_opposing_team, 
+                all_players=False, n_games=n_games, league_std_rate=league_std_rate, 
+                probability_high=probability_high, probability_low=probability_low
+            )
+            span['rows_out'] = len(betting_options_df)
 
         #print("betting_options_df.head()=", betting_options_df.head())
         #filter for Stats
@@ -261,21 +325,18 @@ if page == "Player Analysis":
         #print("betting option head =", betting_options_df.head())
         st.dataframe(betting_options_df)
 
-    # Ensure the correct datetime format and sort order
-    print("Step 1: Data Preparation Completed")
-
     # Step 2: Generate Betting Options for all historical data
-    betting_options_df = generate_betting_options(
-        player_data_filt, league_std_data, selected_player, game_opposing_team, all_players=True, n_games=n_games, league_std_rate=league_std_rate, 
-        probability_high=probability_high, probability_low=probability_low)
-    print(f"Step 2: Generated {len(betting_options_df)} betting options for all historical data.")
+    with profile_span(profile, 'generate_betting_options', rows_in=len(player_data_filt)) as span:
+        betting_options_df = generate_betting_options(
+            player_data_filt, league_std_data, selected_player, game_opposing_team, all_players=True, n_games=n_games, league_std_rate=league_std_rate, 
+            probability_high=probability_high, probability_low=probability_low)
+        span['rows_out'] = len(betting_options_df)
     
 
     # Step 3: Filter Betting Options for the selected date
     selected_date_dt = pd.to_datetime(selected_date)
     if not betting_options_df.empty:
         betting_options_df_selected_date = betting_options_df[betting_options_df['GAME_DATE'] == selected_date_dt]
-        print(f"Step 3: Filtered {len(betting_options_df_selected_date)} betting options for the selected date ({selected_date}):")
         #print(betting_options_df_selected_date[['PLAYER_NAME', 'Stat', 'Threshold', 'GAME_DATE']])
         st.dataframe(betting_options_df_selected_date)
 
@@ -287,11 +348,9 @@ if page == "Player Analysis":
         else:
             betting_options_df_n_games = betting_options_df
 
-        evaluated_bets_df = evaluate_bets(betting_options_df_n_games, player_data_filt)
-        print("Step 4: Evaluated bets based on the last {n_games} games.")
-
-        # Debugging prints for evaluated bets
-        print(f"Evaluated Bets DataFrame has {len(evaluated_bets_df)} rows after evaluation.")
+        with profile_span(profile, 'evaluate_bets', rows_in=len(betting_options_df_n_games)) as span:
+            evaluated_bets_df = evaluate_bets(betting_options_df_n_games, player_data_filt)
+            span['rows_out'] = len(evaluated_bets_df)
 
         #filter out NaN 
         evaluated_bets_df = evaluated_bets_df.dropna(subset=['Bet Outcome'])
@@ -339,9 +398,9 @@ elif page == "Forecasting Player Statistics":
     unique_dates = data['GAME_DATE'].dt.strftime('%Y-%m-%d').unique()
     selected_date = st.sidebar.selectbox('Select a Date', unique_dates)
     #select date and filter for the players and teams
-    data = data[data['GAME_DATE'] == pd.to_datetime(selected_date)]
-    selected_players = st.sidebar.multiselect("Select Players", options=data['PLAYER_NAME'].unique())
-    selected_teams = st.sidebar.multiselect("Select Teams", options=data['TEAM_NAME'].unique())  # Assuming this is used somewhere in your app
+    betting_today_data = data[data['GAME_DATE'] == pd.to_datetime(selected_date)]
+    selected_players = st.sidebar.multiselect("Select Players", options=betting_today_data['PLAYER_NAME'].unique())
+    selected_teams = st.sidebar.multiselect("Select Teams", options=betting_today_data['TEAM_NAME'].unique())  # Assuming this is used somewhere in your app
     game_location = st.sidebar.selectbox('Select Game Location', ['All', 'Home', 'Away'])
 
     # Parameters for betting options
@@ -350,19 +409,24 @@ elif page == "Forecasting Player Statistics":
     probability_high = st.sidebar.slider('High Probability Threshold', min_value=0.0, max_value=1.0, value=0.9, step=0.01)
     probability_low = st.sidebar.slider('Low Probability Threshold', min_value=0.0, max_value=1.0, value=0.1, step=0.01)
 
-    # Filter data for the selected date
-    betting_today_data = data[data['GAME_DATE'] == pd.to_datetime(selected_date)]
-    league_std_data = prepare_league_std_data(betting_today_data, n_games=n_games, game_location=game_location)
+    # The selected players' games through the selected date are scored and evaluated
+    history_data = data[data['GAME_DATE'] <= pd.to_datetime(selected_date)]
+    with profile_span(profile, 'prepare_league_std_data', rows_in=len(history_data)) as span:
+        league_std_data = cached_league_std_data(history_data, dataset_version, selected_date, 'through', n_games, game_location)
+        span['rows_out'] = len(league_std_data)
 
     if selected_players:
-        evaluated_bets_list = []
-        for player in selected_players:
-            player_data = betting_today_data[betting_today_data['PLAYER_NAME'] == player]
-            evaluated_bets_df = evaluate_bets_n_games_debug(player_data, player_data, n_games)  # Adjust this call as needed
-            evaluated_bets_list.append(evaluated_bets_df)
+        # One call for all the selected players. A handful of players is scored faster in process than it takes
+        # to start a worker pool and share the game logs with it, so the page stays on one worker
+        with profile_span(profile, 'generate_betting_options', rows_in=len(history_data)) as span:
+            betting_options_df = generate_betting_options(
+                history_data, league_std_data, list(selected_players), [None], all_players=False, n_games=n_games, league_std_rate=league_std_rate,
+                probability_high=probability_high, probability_low=probability_low)
+            span['rows_out'] = len(betting_options_df)
+        with profile_span(profile, 'evaluate_bets_n_games_debug', rows_in=len(betting_options_df)) as span:
+            combined_evaluated_bets_df = evaluate_bets_n_games_debug(betting_options_df, history_data, n_games, verbose=False) if not betting_options_df.empty else pd.DataFrame()
+            span['rows_out'] = len(combined_evaluated_bets_df)
 
-        combined_evaluated_bets_df = pd.concat(evaluated_bets_list, ignore_index=True) if evaluated_bets_list else pd.DataFrame()
-        
         if not combined_evaluated_bets_df.empty:
             st.dataframe(combined_evaluated_bets_df[['PLAYER_NAME', 'GAME_DATE', 'Stat', 'Threshold', 'Actual Value', 'Bet Correct']])
             total_bets = len(combined_evaluated_bets_df)
@@ -372,3 +436,10 @@ elif page == "Forecasting Player Statistics":
         else:
             st.write("No betting options generated for the selected criteria.")
 
+#------------Stage timings of the rerun---------------
+finish_profile(profile)
+if show_profile:
+    with st.sidebar.expander(f"Stage timings ({profile['seconds']:.2f}s)", expanded=True):
+        st.dataframe(profile_frame(profile), hide_index=True)
+if profile_log_path:
+    append_profile_log(profile, profile_log_path)
@@ -0,0 +1,273 @@
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from modular.schema import add_derived_stat_columns
+from modular.feature_store import build_feature_store, get_last_n_matrix
+from modular.betting_functions import betting_categories, get_market_stat
+
+#Walk-forward backtest of the betting strategy of generate_betting_options
+#Every game is scored with the games played before it only (point-in-time feature store, league std as of the
+#game date) and settled with its box score. The features are built once per player and every configuration of
+#the (n_games, league_std_rate, probability_high, probability_low) grid is evaluated on them, in worker
+#processes that each take a chunk of players.
+
+default_parameter_grid = {
+    'n_games': [5, 10, 15, 20],
+    'league_std_rate': [0.7, 0.8, 0.9, 1.0],
+    'probability_high': [0.8, 0.85, 0.9],
+    'probability_low': [0.1, 0.15, 0.2],
+}
+parameter_columns = ['N_GAMES', 'LEAGUE_STD_RATE', 'PROBABILITY_HIGH', 'PROBABILITY_LOW']
+# Totals accumulated per configuration by the workers
+total_columns = ['BETS', 'HITS', 'HIGHER_BETS', 'LOWER_BETS', 'PRICED_BETS', 'PRICED_HITS', 'PROFIT']
+
+
+def make_parameter_grid(parameter_grid=default_parameter_grid):
+    """
+    Every combination of the grid values, one row per configuration with parameter_columns.
+    """
+    keys = ['n_games', 'league_std_rate', 'probability_high', 'probability_low']
+    return pd.DataFrame(list(itertools.product(*(parameter_grid[key] for key in keys))), columns=parameter_columns)
+
+
+def league_std_asof(logs, stats, dates):
+    """
+    League population standard deviation (ddof=0, like calculate_league_stats) of every stat over all the games
+    played strictly before each date.
+
+    Returns:
+    - ndarray: (len(dates), len(stats)), NaN before the first game.
+    """
+    day_codes, days = pd.factorize(pd.to_datetime(logs['GAME_DATE']), sort=True)
+    position = np.searchsorted(days.to_numpy(), pd.to_datetime(pd.Series(dates)).to_numpy(), side='left')
+    league_std = np.full((len(position), len(stats)), np.nan)
+    for i, stat in enumerate(stats):
+        values = logs[stat].to_numpy(dtype=float)
+        has_value = ~np.isnan(values)
+        # Running totals by game day, with a leading 0 so entry k covers the days before day k
+        count = np.r_[0, np.cumsum(np.bincount(day_codes, weights=has_value, minlength=len(days)))][position]
+        total = np.r_[0, np.cumsum(np.bincount(day_codes, weights=np.where(has_value, values, 0), minlength=len(days)))][position]
+        squared_total = np.r_[0, np.cumsum(np.bincount(day_codes, weights=np.where(has_value, values, 0) ** 2, minlength=len(days)))][position]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / count
+            league_std[:, i] = np.where(count > 0, np.sqrt(np.clip(squared_total / count - mean ** 2, 0, None)), np.nan)
+    return league_std
+
+
+def prepare_backtest_odds(odds_board, stats):
+    """
+    The posted lines of an odds board (e.g. load_latest_odds over the backtest dates) that settle one of the stats,
+    one line per (player, date, stat, point), the base market winning over its alternate market.
+    """
+    odds = odds_board.copy()
+    odds['STAT'] = get_market_stat(odds['MARKET']).to_numpy()
+    odds['GAME_DATE'] = pd.to_datetime(odds['GAME_DATE'])
+    odds['IS_ALTERNATE'] = odds['MARKET'].astype(str).str.endswith('_alternate')
+    odds = odds[odds['STAT'].isin(stats) & odds['POINT'].notna()]
+    odds = odds.sort_values(by='IS_ALTERNATE', kind='mergesort').drop_duplicates(subset=['PLAYER_NAME', 'GAME_DATE', 'STAT', 'POINT'])
+    return odds[['PLAYER_NAME', 'GAME_DATE', 'STAT', 'POINT', 'OVER_PRICE', 'UNDER_PRICE']].reset_index(drop=True)
+
+
+def _last_n_windows(store, player, dates, stats, n_games):
+    """
+    The last n games before each date as an (n_games, len(dates), len(stats)) array, NaN padded at the top
+    like get_last_n_matrix.
+    """
+    played_games = store['history'][player].get('played_games')
+    if played_games is None:
+        return np.stack([get_last_n_matrix(store, player, game_date, stats, n_games) for game_date in dates], axis=1)
+    columns = [store['stat_columns'][stat] for stat in stats]
+    # Row 0 is a NaN row used for the padding, played game k is row k + 1
+    values = np.vstack([np.full((1, len(stats)), np.nan), played_games['values'][:, columns]])
+    end = np.searchsorted(played_games['GAME_DATE'], dates, side='left')
+    rows = end[None, :] - n_games + np.arange(n_games)[:, None]
+    return values[np.where(rows >= 0, rows + 1, 0)]
+
+
+def _score_player(store, player, stats, thresholds, stat_index, n_games_values, league_std, odds, start_date, end_date):
+    """
+    Per n_games, the probability, player std and league std of every (date, threshold pair) of a player's settled
+    games in the backtest window, with the outcome and the profit of both sides.
+    """
+    player_history = store['history'][player]
+    dates, matrix = player_history['GAME_DATE'], player_history['matrix']
+    is_settled = ~np.isnan(matrix).any(axis=1)
+    if start_date is not None:
+        is_settled &= dates >= start_date
+    if end_date is not None:
+        is_settled &= dates <= end_date
+    # One evaluation per game date, settled with the first box score of the date (like evaluate_bets)
+    dates, first_rows = np.unique(dates[is_settled], return_index=True)
+    if not len(dates):
+        return None
+    actual = matrix[is_settled][first_rows][:, stat_index]
+
+    won_higher = actual > thresholds
+    won_lower = actual < thresholds
+    over_price = np.full(actual.shape, np.nan)
+    under_price = np.full(actual.shape, np.nan)
+    if odds is not None and len(odds):
+        date_rows = pd.Index(dates).get_indexer(odds['GAME_DATE'])
+        pair_columns = pd.MultiIndex.from_arrays([np.asarray(stats, dtype=object)[stat_index], thresholds]).get_indexer(
+            pd.MultiIndex.from_arrays([odds['STAT'].to_numpy(dtype=object), odds['POINT'].to_numpy(dtype=float)]))
+        # Lines off the threshold grid or on unsettled dates have no bet to price
+        is_priced = (date_rows >= 0) & (pair_columns >= 0)
+        over_price[date_rows[is_priced], pair_columns[is_priced]] = odds['OVER_PRICE'].to_numpy(dtype=float)[is_priced]
+        under_price[date_rows[is_priced], pair_columns[is_priced]] = odds['UNDER_PRICE'].to_numpy(dtype=float)[is_priced]
+
+    # Profit of a 1 unit stake on each side, NaN without a posted price
+    scores = {'won_higher': won_higher, 'won_lower': won_lower,
+              'over_profit': np.where(np.isnan(over_price), np.nan, np.where(won_higher, over_price - 1, -1.0)),
+              'under_profit': np.where(np.isnan(under_price), np.nan, np.where(won_lower, under_price - 1, -1.0)),
+              'league_std': league_std.reindex(dates).to_numpy()[:, stat_index]}
+    for n_games in n_games_values:
+        windows = _last_n_windows(store, player, dates, stats, n_games)
+        # Same arithmetic as calculate_probability_grid and calculate_std_grid, over every date at once
+        number_of_games = np.count_nonzero(~np.isnan(windows), axis=0)
+        hits = np.count_nonzero(windows[:, :, stat_index] >= thresholds, axis=0)
+        games = number_of_games[:, stat_index]
+        probability = np.divide(hits, games, out=np.zeros(hits.shape), where=games > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.nansum(windows, axis=0) / number_of_games
+            variance = np.nansum((windows - mean) ** 2, axis=0) / (number_of_games - 1)
+        player_std = np.where(number_of_games > 1, np.sqrt(variance), np.nan)[:, stat_index]
+        scores[n_games] = {'probability': probability, 'player_std': player_std}
+    return scores
+
+
+def _backtest_task(task):
+    """
+    Totals of every configuration over a chunk of players, run in a worker process.
+
+    Returns:
+    - ndarray: (configurations, total_columns) totals.
+    """
+    stats, configs = task['stats'], task['configs']
+    thresholds = np.concatenate([betting_categories[stat] for stat in stats])
+    stat_index = np.repeat(np.arange(len(stats)), [len(betting_categories[stat]) for stat in stats])
+    n_games_values = sorted(configs['N_GAMES'].unique())
+    store = build_feature_store(task['logs'], stats=stats, n_games=max(n_games_values))
+    odds_by_player = dict(tuple(task['odds'].groupby('PLAYER_NAME', sort=False))) if task['odds'] is not None else {}
+
+    player_scores = [_score_player(store, player, stats, thresholds, stat_index, n_games_values, task['league_std'],
+                                   odds_by_player.get(player), task['start_date'], task['end_date'])
+                     for player in store['history']]
+    player_scores = [scores for scores in player_scores if scores is not None]
+    totals = np.zeros((len(configs), len(total_columns)))
+    if not player_scores:
+        return totals
+
+    # Stack the players so every configuration is a few array operations over the whole chunk
+    stacked = {key: np.concatenate([scores[key] for scores in player_scores]) for key in ['won_higher', 'won_lower', 'over_profit', 'under_profit', 'league_std']}
+    for n_games in n_games_values:
+        probability = np.concatenate([scores[n_games]['probability'] for scores in player_scores])
+        player_std = np.concatenate([scores[n_games]['player_std'] for scores in player_scores])
+        for config_row in np.flatnonzero(configs['N_GAMES'].to_numpy() == n_games):
+            league_std_rate, probability_high, probability_low = configs.iloc[config_row][['LEAGUE_STD_RATE', 'PROBABILITY_HIGH', 'PROBABILITY_LOW']]
+            is_consistent = player_std <= stacked['league_std'] * league_std_rate
+            higher = (probability > probability_high) & is_consistent
+            lower = (probability < probability_low) & ~(probability > probability_high) & is_consistent
+            priced_higher = higher & ~np.isnan(stacked['over_profit'])
+            priced_lower = lower & ~np.isnan(stacked['under_profit'])
+            totals[config_row] = [
+                np.count_nonzero(higher) + np.count_nonzero(lower),
+                np.count_nonzero(higher & stacked['won_higher']) + np.count_nonzero(lower & stacked['won_lower']),
+                np.count_nonzero(higher),
+                np.count_nonzero(lower),
+                np.count_nonzero(priced_higher) + np.count_nonzero(priced_lower),
+                np.count_nonzero(priced_higher & stacked['won_higher']) + np.count_nonzero(priced_lower & stacked['won_lower']),
+                stacked['over_profit'][priced_higher].sum() + stacked['under_profit'][priced_lower].sum(),
+            ]
+    return totals
+
+
+def run_backtest(player_data, odds_board=None, parameter_grid=default_parameter_grid, categories=None, start_date=None, end_date=None,
+                 league_std_data=None, max_workers=None, players_per_task=16):
+    """
+    Walk-forward backtest of the betting options over a grid of parameters.
+
+    Parameters:
+    - player_data (DataFrame): Player game logs; every game with a box score in [start_date, end_date] is a betting day.
+    - odds_board (DataFrame): Posted lines (e.g. load_latest_odds(start_date=..., end_date=...)) used for the ROI,
+      bets on a (player, date, stat, threshold) without a posted line only count towards the hit rate.
+    - parameter_grid (dict): Values of 'n_games', 'league_std_rate', 'probability_high' and 'probability_low'.
+    - categories (list): Stats of betting_categories to bet on, all of them by default.
+    - start_date, end_date: The backtest window, all games by default. Earlier games still feed the features.
+    - league_std_data (DataFrame): A fixed league std row (prepare_league_std_data) instead of the league std as of each date.
+    - max_workers (int): Worker processes, 1 runs in this process. Defaults to the number of cores.
+    - players_per_task (int): Players per worker task.
+
+    Returns:
+    - DataFrame: One row per configuration with the bet counts, HIT_RATE and, on the priced bets, ROI
+      (profit of 1 unit stakes at the posted decimal odds per bet), best ROI first.
+    """
+    configs = make_parameter_grid(parameter_grid)
+    stats = list(betting_categories) if categories is None else list(categories)
+    logs = add_derived_stat_columns(player_data)[['PLAYER_NAME', 'GAME_DATE', 'OPPONENT_NAME'] + stats].copy()
+    logs['GAME_DATE'] = pd.to_datetime(logs['GAME_DATE'])
+    logs['PLAYER_NAME'] = logs['PLAYER_NAME'].astype(object)
+    start_date = pd.Timestamp(start_date).to_datetime64() if start_date is not None else None
+    end_date = pd.Timestamp(end_date).to_datetime64() if end_date is not None else None
+
+    game_dates = pd.Index(np.sort(logs['GAME_DATE'].dropna().unique()))
+    if league_std_data is None:
+        league_std = pd.DataFrame(league_std_asof(logs, stats, game_dates), index=game_dates, columns=stats)
+    else:
+        league_std = pd.DataFrame([[league_std_data[stat].iloc[0] if stat in league_std_data.columns else 0 for stat in stats]] * len(game_dates),
+                                  index=game_dates, columns=stats)
+    odds = prepare_backtest_odds(odds_board, stats) if odds_board is not None else None
+
+    players = logs['PLAYER_NAME'].dropna().unique()
+    tasks = []
+    for chunk_start in range(0, len(players), players_per_task):
+        chunk_players = players[chunk_start:chunk_start + players_per_task]
+        tasks.append({
+            'logs': logs[logs['PLAYER_NAME'].isin(chunk_players)],
+            'odds': odds[odds['PLAYER_NAME'].isin(chunk_players)] if odds is not None else None,
+            'league_std': league_std,
+            'configs': configs,
+            'stats': stats,
+            'start_date': start_date,
+            'end_date': end_date,
+        })
+
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+    if max_workers <= 1 or len(tasks) <= 1:
+        task_totals = [_backtest_task(task) for task in tasks]
+    else:
+        # map keeps the task order, so the float profit totals add up in the same order on every run
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            task_totals = list(executor.map(_backtest_task, tasks))
+
+    totals = np.sum(task_totals, axis=0) if task_totals else np.zeros((len(configs), len(total_columns)))
+    results = pd.concat([configs, pd.DataFrame(totals, columns=total_columns)], axis=1)
+    count_columns = [col for col in total_columns if col != 'PROFIT']
+    results[count_columns] = results[count_columns].astype(int)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        results['HIT_RATE'] = results['HITS'] / results['BETS'].where(results['BETS'] > 0)
+        results['PRICED_HIT_RATE'] = results['PRICED_HITS'] / results['PRICED_BETS'].where(results['PRICED_BETS'] > 0)
+        results['ROI'] = results['PROFIT'] / results['PRICED_BETS'].where(results['PRICED_BETS'] > 0)
+    return results.sort_values(by=['ROI', 'HIT_RATE'], ascending=False, kind='mergesort', na_position='last').reset_index(drop=True)
+
+
+def benchmark_backtest(player_data, odds_board=None, parameter_grid=default_parameter_grid, workers=(1, 2, 4), **kwargs):
+    """
+    Time the same sweep with several worker counts.
+    """
+    timings = []
+    for max_workers in workers:
+        start = time.perf_counter()
+        results = run_backtest(player_data, odds_board, parameter_grid, max_workers=max_workers, **kwargs)
+        timings.append({'workers': max_workers, 'configurations': len(results), 'seconds': time.perf_counter() - start})
+        print(f"{max_workers} workers: {len(results)} configurations in {timings[-1]['seconds']:.2f}s")
+    return pd.DataFrame(timings)
+
+
+# Example usage
+#if __name__ == '__main__':
+#    data = load_game_logs('data/player_game_logs_winr.parquet')
+#    odds_board = load_latest_odds(start_date='2024-01-01', end_date='2024-04-14')
+#    print(run_backtest(data, odds_board, start_date='2024-01-01', end_date='2024-04-14').head(20))
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from modular.feature_store import build_feature_store, get_last_n_values, get_values_against_team, get_last_n_matrix, get_against_team_matrix
 
 #Things to consider:
 #1. Calculate the probability of a player achieving a certain statistic in a game
@@ -79,6 +80,69 @@ def calculate_probability(player_data, stat, projection, league_std_data, n_game
 
 
 
+def calculate_probability_asof(feature_store, player, game_date, stat, projection, league_std_data, n_games=10, league_std_rate=0.9, opposing_team=None):
+    """
+    Same results as calculate_probability on the player's games before game_date sorted by date, read from the
+    feature store instead of slicing the game logs. The last n games are the most recent by date whatever the row order.
+    """
+    if stat not in feature_store['stats']:
+        raise KeyError(f"Statistic '{stat}' not found in player data columns.")
+
+    last_n_games = get_last_n_values(feature_store, player, game_date, stat, n_games)
+    player_std = last_n_games.std(ddof=1) if len(last_n_games) > 1 else np.nan
+
+    number_of_games_against_team = 0
+    against_team_probability = 0
+    if opposing_team:
+        games_against_team = get_values_against_team(feature_store, player, game_date, stat, opposing_team.strip())
+        number_of_games_against_team = len(games_against_team)
+        if number_of_games_against_team > 0:
+            against_team_probability = np.count_nonzero(games_against_team >= projection) / number_of_games_against_team
+    else:
+        against_team_probability = None
+
+    number_of_games_above_projection = np.count_nonzero(last_n_games >= projection)
+    number_of_games = len(last_n_games)
+    probability = number_of_games_above_projection / number_of_games if number_of_games > 0 else 0
+
+    league_std = league_std_data[stat].iloc[0] if stat in league_std_data.columns else 0
+    std_dev_comparison = player_std < league_std * league_std_rate
+
+    return probability, against_team_probability, number_of_games_against_team, player_std, std_dev_comparison, league_std, number_of_games_above_projection, number_of_games
+
+
+def calculate_probability_grid(stat_values, thresholds, stat_index, number_of_games=None):
+    """
+    Probability of reaching every threshold of every stat with one broadcast comparison.
+
+    Parameters:
+    - stat_values (ndarray): (games, stats) matrix of a player's games, NaN where a stat has no value.
+    - thresholds (ndarray): The flattened threshold grid, one entry per (stat, threshold) pair.
+    - stat_index (ndarray): The stat_values column of each threshold.
+    - number_of_games (ndarray): Games counted per pair. Defaults to the games with a value for the pair's stat.
+
+    Returns:
+    - tuple: (probability, number_of_games_above_projection, number_of_games), one entry per pair.
+    """
+    # NaN >= threshold is False, so missing games are never counted as hits
+    number_of_games_above_projection = np.count_nonzero(stat_values[:, stat_index] >= thresholds, axis=0)
+    if number_of_games is None:
+        number_of_games = np.count_nonzero(~np.isnan(stat_values), axis=0)[stat_index]
+    probability = np.divide(number_of_games_above_projection, number_of_games, out=np.zeros(len(thresholds)), where=number_of_games > 0)
+    return probability, number_of_games_above_projection, number_of_games
+
+
+def calculate_std_grid(stat_values):
+    """
+    Sample standard deviation (ddof=1, like pandas .std()) of every column ignoring NaN, NaN with fewer than 2 games.
+    """
+    number_of_games = np.count_nonzero(~np.isnan(stat_values), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(stat_values, axis=0) / number_of_games
+        variance = np.nansum((stat_values - mean) ** 2, axis=0) / (number_of_games - 1)
+    return np.where(number_of_games > 1, np.sqrt(variance), np.nan)
+
+
 def calculate_bet_outcome(bet_amount, odds, probability):
     """
     Calculate expected profit or loss from a bet based on American odds.
@@ -104,185 +168,425 @@ def calculate_bet_outcome(bet_amount, odds, probability):
     return expected_profit, expected_loss, probability_weighted_to_profit
 
 
-def generate_betting_options(player_data, league_std_data, player_names, opposing_teams, all_players=True, n_games=10, league_std_rate=0.9, probability_high=0.9, probability_low=0.1):
-    if not isinstance(player_names, list):
-        player_names = [player_names]
-    if opposing_teams is not None and not isinstance(opposing_teams, list):
-        opposing_team = [opposing_teams]
+# Thresholds scored for every stat, the combo stats and the double/triple double indicators are read from the
+# derived columns added when the game logs are loaded (modular.schema.derived_stat_columns)
+betting_categories = {
+    'PTS': np.arange(9.5, 30.5, 1),
+    'AST': np.arange(2.5, 12.5, 1),
+    'REB': np.arange(2.5, 12.5, 1),
+    'STL': np.arange(0.5, 5.5, 1),
+    'BLK': np.arange(0.5, 5.5, 1),
+    'FG3M': np.arange(0.5, 5.5, 1),
+    'TOV': np.arange(0.5, 6.5, 1),
+    'PTS_REB_AST': np.arange(14.5, 50.5, 1),
+    'PTS_REB': np.arange(11.5, 40.5, 1),
+    'PTS_AST': np.arange(11.5, 40.5, 1),
+    'REB_AST': np.arange(3.5, 20.5, 1),
+    'BLK_STL': np.arange(0.5, 6.5, 1),
+    'DOUBLE_DOUBLE': np.array([0.5]),
+    'TRIPLE_DOUBLE': np.array([0.5]),
+}
+
+
+def generate_betting_options(player_data, league_std_data, player_names, opposing_teams, all_players=True, n_games=10, league_std_rate=0.9, probability_high=0.9, probability_low=0.1, feature_store=None, categories=None, max_workers=1):
     """
     Generate filtered betting options based on given criteria, now including game dates.
+    Each game date is scored with the player's games before that date, read from the point-in-time
+    feature store (built from player_data when not passed in). The last n_games are the most recent games by
+    GAME_DATE, also for game logs listed newest first (calculate_probability takes the last rows).
+    `categories` restricts the scored stats to a subset of betting_categories (all of them by default).
+    With max_workers > 1 (and no feature_store passed in) the players are sharded across worker processes
+    that read the game logs from shared memory, see modular.parallel_betting.
     """
-    betting_categories = {
-        'PTS': np.arange(9.5, 30.5, 1),
-        'AST': np.arange(2.5, 12.5, 1),
-        'REB': np.arange(2.5, 12.5, 1),
-        'STL': np.arange(0.5, 5.5, 1),
-        'BLK': np.arange(0.5, 5.5, 1),
-        'FG3M': np.arange(0.5, 5.5, 1),
+    if not isinstance(player_names, list):
+        player_names = [player_names]
+    if not isinstance(opposing_teams, list):
+        opposing_teams = [opposing_teams]
+
+    stats = list(betting_categories) if categories is None else list(categories)
+    settings = {
+        'stats': stats,
+        'opposing_teams': opposing_teams,
+        'league_std': [league_std_data[stat].iloc[0] if stat in league_std_data.columns else 0 for stat in stats],
+        'n_games': n_games,
+        'league_std_rate': league_std_rate,
+        'probability_high': probability_high,
+        'probability_low': probability_low,
     }
 
-    results = []
-    
     if all_players:
         players = player_data['PLAYER_NAME'].unique()
     else:
-        players = [player_name]
+        players = player_names
 
+    if max_workers > 1 and feature_store is None:
+        from modular.parallel_betting import generate_betting_options_parallel
+        return generate_betting_options_parallel(player_data, players, settings, max_workers)
+
+    if feature_store is None:
+        feature_store = build_feature_store(player_data, stats=stats, n_games=n_games)
+
+    results = []
     for player in players:
-        player_season_data = player_data[player_data['PLAYER_NAME'] == player].copy()
-        game_dates = player_season_data['GAME_DATE'].unique()
-
-        # Corrected handling of multiple opposing teams
-        for game_date in game_dates:
-            game_data = player_season_data[player_season_data['GAME_DATE'] < game_date]
-            if not isinstance(opposing_team, list):
-                opposing_teams_temp = [opposing_teams]  # Ensure opposing_teams is treated as a list
-            else:
-                opposing_teams_temp = opposing_teams
-
-            for opposing_team in opposing_teams_temp:
-                for stat, thresholds in betting_categories.items():
-                    for threshold in thresholds:
-                        # Calculate probability and other metrics for the specific game
-                        probability, against_team_probability, number_of_games_against_team, player_std, std_dev_comparison, league_std, number_of_games_above_projection, number_of_games = calculate_probability(
-                            game_data, stat, threshold, league_std_data, n_games, league_std_rate, opposing_teams)
-
-                        if (probability > probability_high or probability < probability_low) and (player_std <= league_std * league_std_rate):
-                            prob_comparison = 'Higher' if probability > probability_high else 'Lower' if probability < probability_low else 'Uncertain'
-                            std_dev_comparison = 'Better than league std by at least 10%' if player_std <= league_std * league_std_rate else 'Not better than league std by at least 10%'
-                            recommendation = 'Bet' if (prob_comparison == 'Higher' or prob_comparison == 'Lower') and player_std <= league_std * league_std_rate else 'Avoid'
-
-                            result = {
-                                'PLAYER_NAME': player,
-                                'Stat': stat,
-                                'Threshold': threshold,
-                                'Probability': probability,
-                                'Std Dev Comparison': std_dev_comparison,
-                                'Probability comparison': prob_comparison,
-                                'Recommendation based on Prob and std_dev': recommendation,
-                                'Against Team Probability': against_team_probability if against_team_probability is not None else 'N/A',
-                                'Games Against Team': number_of_games_against_team if number_of_games_against_team > 0 else 'N/A',
-                                'GAME_DATE': game_date  # Include the game date in the results
-                            }
-                            results.append(result)
-
-    results = [result for result in results if result['Recommendation based on Prob and std_dev'] == 'Bet']
-                
-    return pd.DataFrame(results)
+        game_dates = player_data.loc[player_data['PLAYER_NAME'] == player, 'GAME_DATE'].unique()
+        results.extend(generate_player_betting_options(feature_store, player, game_dates, settings))
+    return betting_options_frame(stack_betting_options(results), settings)
+
 
+def _threshold_grid(stats):
+    """
+    The flattened threshold grid: every (stat, threshold) pair with the index of its stat.
+    """
+    thresholds = np.concatenate([betting_categories[stat] for stat in stats])
+    stat_index = np.repeat(np.arange(len(stats)), [len(betting_categories[stat]) for stat in stats])
+    return thresholds, stat_index
 
 
-def evaluate_bets(generated_bets, actual_performance):
-    # Reset index to ensure it's sequential starting from 0
-    generated_bets.reset_index(drop=True, inplace=True)
-
-    # Iterate through generated bets using .iterrows() for safer access
-    for index, row in generated_bets.iterrows():
-        stat_column = row['Stat']
-        actual_stat_row = actual_performance[
-            (actual_performance['PLAYER_NAME'] == row['PLAYER_NAME']) & 
-            (actual_performance['GAME_DATE'] == row['GAME_DATE'])
-        ]
-        
-        if not actual_stat_row.empty:
-            actual_value = actual_stat_row.iloc[0][stat_column]
-            generated_bets.at[index, 'Actual Value'] = actual_value  # Assign actual value to the DataFrame
-            
-            if pd.notnull(actual_value):
-                bet_correct = ((row['Probability comparison'] == 'Higher' and actual_value > row['Threshold']) or
-                               (row['Probability comparison'] == 'Lower' and actual_value < row['Threshold']))
-                generated_bets.at[index, 'Bet Outcome'] = bet_correct
+def generate_player_betting_options(feature_store, player, game_dates, settings):
+    """
+    The betting options of one player on each game date, one block per date and opposing team with the bet
+    (stat, threshold) pairs, their probabilities and the games against the team.
+
+    Parameters:
+    - feature_store (dict): Point-in-time feature store with the settings' stats.
+    - player (str): The player.
+    - game_dates (iterable): The dates to score.
+    - settings (dict): 'stats', 'opposing_teams', 'league_std' (one value per stat), 'n_games', 'league_std_rate',
+      'probability_high' and 'probability_low', as set up by generate_betting_options.
+    """
+    stats, n_games = settings['stats'], settings['n_games']
+    # Flatten the threshold grid so every (stat, threshold) pair is scored in one call per player and date
+    thresholds, stat_index = _threshold_grid(stats)
+    league_std = np.asarray(settings['league_std'], dtype=float)[stat_index]
+
+    results = []
+    for game_date in game_dates:
+        last_n_games = get_last_n_matrix(feature_store, player, game_date, stats, n_games)
+        probability, _, _ = calculate_probability_grid(last_n_games, thresholds, stat_index)
+        player_std = calculate_std_grid(last_n_games)[stat_index]
+
+        # Only pairs with a high or low probability and a player more consistent than the league are bets
+        is_bet = ((probability > settings['probability_high']) | (probability < settings['probability_low'])) & (player_std <= league_std * settings['league_std_rate'])
+        if not is_bet.any():
+            continue
+        bet_pairs = np.flatnonzero(is_bet)
+
+        for opposing_team in settings['opposing_teams']:
+            if opposing_team:
+                games_against_team = get_against_team_matrix(feature_store, player, game_date, stats, opposing_team.strip())
+                against_team_probability, _, number_of_games_against_team = calculate_probability_grid(
+                    games_against_team, thresholds, stat_index, np.full(len(thresholds), len(games_against_team)))
+                against_team_probability = against_team_probability[bet_pairs]
             else:
-                generated_bets.at[index, 'Bet Outcome'] = np.nan  # Mark as NaN if actual value is NaN
-        else:
-            # Mark as NaN if there's no matching performance data
-            generated_bets.at[index, 'Actual Value'] = np.nan
-            generated_bets.at[index, 'Bet Outcome'] = np.nan
-
-    # Initialize running totals outside the loop to avoid resetting them on each iteration
-    running_correct = 0
-    running_incorrect = 0
-
-    # After determining bet outcomes, calculate running totals
-    for index, row in generated_bets.iterrows():
-        if pd.notnull(row['Bet Outcome']):
-            running_correct += int(row['Bet Outcome'] == True)
-            running_incorrect += int(row['Bet Outcome'] == False)
-
-            generated_bets.at[index, 'Running Correct'] = running_correct
-            generated_bets.at[index, 'Running Incorrect'] = running_incorrect
-        else:
-            generated_bets.at[index, 'Running Correct'] = running_correct
-            generated_bets.at[index, 'Running Incorrect'] = running_incorrect
+                against_team_probability, number_of_games_against_team = None, np.zeros(len(thresholds), dtype=int)
 
-    return generated_bets
+            results.append({
+                'PLAYER_NAME': player,
+                'GAME_DATE': game_date,
+                'pairs': bet_pairs,
+                'probability': probability[bet_pairs],
+                'against_team_probability': against_team_probability,
+                'games_against_team': number_of_games_against_team[bet_pairs],
+            })
+    return results
 
-    
-def evaluate_bets_n_games_debug(generated_bets, actual_performance, n_games=10):
-    # Ensure the datetime format is correct
-    actual_performance['GAME_DATE'] = pd.to_datetime(actual_performance['GAME_DATE'])
-    actual_performance.sort_values(by='GAME_DATE', inplace=True)
-    
-    evaluated_bets_list = []  # To store evaluated bets for debugging
 
-    for player in generated_bets['PLAYER_NAME'].unique():
-        print(f"\nEvaluating bets for: {player}")  # Debug: Confirm the player
-        
-        player_bets = generated_bets[generated_bets['PLAYER_NAME'] == player]
-        player_performance = actual_performance[actual_performance['PLAYER_NAME'] == player]
-        
-        player_performance.sort_values(by='GAME_DATE', inplace=True)
-        if len(player_performance) < n_games:
-            print(f"Warning: {player} has only {len(player_performance)} games available, less than {n_games} games specified.")
-        
-        min_date_for_n_games = player_performance['GAME_DATE'].unique()[-n_games]
-        print(f"Minimum date for the last {n_games} games: {min_date_for_n_games}")  # Debug: Check min date
-
-        # Filter for bets and performances within the last n games
-        player_bets_filtered = player_bets[player_bets['GAME_DATE'] >= min_date_for_n_games]
-        player_performance_filtered = player_performance[player_performance['GAME_DATE'] >= min_date_for_n_games]
-
-        correct_bets = 0
-        incorrect_bets = 0
-
-        for index, bet in player_bets_filtered.iterrows():
-            game_date = bet['GAME_DATE']
-            actual = player_performance_filtered[player_performance_filtered['GAME_DATE'] == game_date]
-
-            if not actual.empty:
-                actual_value = actual.iloc[0][bet['Stat']]
-                bet_correct = ((bet['Probability comparison'] == 'Higher' and actual_value > bet['Threshold']) or
-                               (bet['Probability comparison'] == 'Lower' and actual_value < bet['Threshold']))
-                
-                if bet_correct:
-                    correct_bets += 1
-                else:
-                    incorrect_bets += 1
-                
-                evaluated_bets_list.append({**bet, 'Actual Value': actual_value, 'Bet Correct': bet_correct})
-            else:
-                print(f"No actual performance data for {player} on {game_date}")
+def stack_betting_options(results):
+    """
+    Stack the blocks of generate_player_betting_options into flat arrays (one entry per block for the player
+    and date), cheap to concatenate and to send between processes.
+    """
+    return {
+        'PLAYER_NAME': np.array([block['PLAYER_NAME'] for block in results], dtype=object),
+        'GAME_DATE': np.array([block['GAME_DATE'] for block in results], dtype=object),
+        'block_lengths': np.array([len(block['pairs']) for block in results], dtype=np.int64),
+        'pairs': np.concatenate([block['pairs'] for block in results]).astype(np.int32) if results else np.array([], dtype=np.int32),
+        'probability': np.concatenate([block['probability'] for block in results]) if results else np.array([]),
+        'has_team': np.concatenate([np.full(len(block['pairs']), block['against_team_probability'] is not None) for block in results]) if results else np.array([], dtype=bool),
+        'against_team_probability': np.concatenate([block['against_team_probability'] if block['against_team_probability'] is not None else np.full(len(block['pairs']), np.nan)
+                                                    for block in results]) if results else np.array([]),
+        'games_against_team': np.concatenate([block['games_against_team'] for block in results]).astype(np.int64) if results else np.array([], dtype=np.int64),
+    }
 
-        print(f"{player} - Correct Bets: {correct_bets}, Incorrect Bets: {incorrect_bets}")  # Debug: Check bet outcomes
 
-    # Compile the debug results into a DataFrame
-    evaluated_bets_df_debug = pd.DataFrame(evaluated_bets_list)
-    
-    if not evaluated_bets_df_debug.empty:
-        final_corrects = sum(evaluated_bets_df_debug['Bet Correct'])
-        overall_bets = len(evaluated_bets_df_debug)
-        correct_percentage = final_corrects / overall_bets * 100
-        print(f"\nFinal Correct Percentage: {correct_percentage}% ({final_corrects}/{overall_bets})")
-    else:
-        print("No bets evaluated. Check if the date range or player selection might be too restrictive.")
+def concat_stacked_betting_options(stacked_options):
+    """
+    Concatenate stacked betting options in order.
+    """
+    return {key: np.concatenate([stacked[key] for stacked in stacked_options]) for key in stacked_options[0]}
 
-    return evaluated_bets_df_debug
+
+# Columns of the betting options, in order
+betting_option_columns = ['PLAYER_NAME', 'Stat', 'Threshold', 'Probability', 'Std Dev Comparison', 'Probability comparison',
+                          'Recommendation based on Prob and std_dev', 'Against Team Probability', 'Games Against Team', 'GAME_DATE']
+
+
+def betting_options_frame(stacked, settings):
+    """
+    The betting options DataFrame of stacked options, one row per bet pair in block order
+    (an empty frame with the betting option columns when there are none).
+    """
+    if not len(stacked['pairs']):
+        return pd.DataFrame(columns=betting_option_columns)
+    thresholds, stat_index = _threshold_grid(settings['stats'])
+    pairs, probability = stacked['pairs'], stacked['probability']
+
+    against_team_probability = stacked['against_team_probability'].astype(object)
+    against_team_probability[~stacked['has_team']] = 'N/A'
+    games_against_team = stacked['games_against_team'].astype(object)
+    games_against_team[stacked['games_against_team'] <= 0] = 'N/A'
+    return pd.DataFrame({
+        'PLAYER_NAME': np.repeat(stacked['PLAYER_NAME'], stacked['block_lengths']),
+        'Stat': np.array(settings['stats'], dtype=object)[stat_index[pairs]],
+        'Threshold': thresholds[pairs],
+        'Probability': probability,
+        'Std Dev Comparison': np.full(len(pairs), 'Better than league std by at least 10%', dtype=object),
+        'Probability comparison': np.where(probability > settings['probability_high'], 'Higher', 'Lower').astype(object),
+        'Recommendation based on Prob and std_dev': np.full(len(pairs), 'Bet', dtype=object),
+        'Against Team Probability': against_team_probability,
+        'Games Against Team': games_against_team,
+        'GAME_DATE': np.repeat(stacked['GAME_DATE'], stacked['block_lengths']),  # Include the game date in the results
+    }).infer_objects()
+
+
+# Stat column settled by each over/under prop market, the alternate markets use the stat of their base market
+market_stats = {
+    'player_points': 'PTS',
+    'player_rebounds': 'REB',
+    'player_assists': 'AST',
+    'player_threes': 'FG3M',
+    'player_blocks': 'BLK',
+    'player_steals': 'STL',
+    'player_turnovers': 'TOV',
+    'player_blocks_steals': 'BLK_STL',
+    'player_points_rebounds_assists': 'PTS_REB_AST',
+    'player_points_rebounds': 'PTS_REB',
+    'player_points_assists': 'PTS_AST',
+    'player_rebounds_assists': 'REB_AST',
+    'player_double_double': 'DOUBLE_DOUBLE',
+    'player_triple_double': 'TRIPLE_DOUBLE',
+}
+
+
+def get_market_stat(markets):
+    """
+    The stat column of every market (NaN for markets that are not over/under on a stat, e.g. player_first_basket).
+    """
+    return pd.Series(markets).astype(str).str.replace('_alternate$', '', regex=True).map(market_stats)
+
+
+def implied_probability(decimal_odds):
+    """
+    Probability implied by decimal odds (1 / odds), NaN for missing prices.
+    """
+    decimal_odds = np.asarray(decimal_odds, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(decimal_odds > 1, 1 / decimal_odds, np.nan)
 
 
+def scan_odds_edges(odds_board, player_data=None, feature_store=None, n_games=10, min_games=5):
+    """
+    Score every posted line of the odds board with the player's hit rate over the last n games and rank
+    the Over and Under sides by edge over the probability implied by their price.
 
+    Parameters:
+    - odds_board (DataFrame): PLAYER_NAME, GAME_DATE, MARKET, POINT, OVER_PRICE and UNDER_PRICE (decimal odds),
+      e.g. from load_latest_odds.
+    - player_data (DataFrame): Player game logs, used to build the feature store when it is not passed in.
+    - feature_store (dict): Point-in-time feature store with the stat columns of the board's markets.
+    - n_games (int): Number of previous games the hit rates are computed on.
+    - min_games (int): Lines of players with fewer previous games are left out of the ranking.
 
+    Returns:
+    - DataFrame: One row per priced side, best EDGE (model probability - implied probability) first.
+      attrs['skipped_markets'] counts the lines left out per market without a stat column (or without a line).
+    """
+    board = odds_board.copy()
+    board['STAT'] = get_market_stat(board['MARKET']).to_numpy()
+    is_scored = board['STAT'].notna() & board['POINT'].notna()
+    skipped_markets = {str(market): int(count) for market, count in board.loc[~is_scored, 'MARKET'].value_counts(sort=False).items()}
+    board = board[is_scored].reset_index(drop=True)
+
+    stats = list(dict.fromkeys(board['STAT']))
+    if feature_store is None:
+        feature_store = build_feature_store(player_data, stats=stats, n_games=n_games)
+    missing_stats = [stat for stat in stats if stat not in feature_store['stats']]
+    if missing_stats:
+        raise KeyError(f"Statistics {missing_stats} not found in the feature store.")
+
+    # Integer valued stats: Over wins when the stat reaches floor(line) + 1, Under when it stays below ceil(line)
+    lines = board['POINT'].to_numpy(dtype=float)
+    stat_index = board['STAT'].map({stat: i for i, stat in enumerate(stats)}).to_numpy()
+    over_probability = np.full(len(board), np.nan)
+    under_probability = np.full(len(board), np.nan)
+    number_of_games = np.zeros(len(board), dtype=int)
+
+    for (player, game_date), rows in board.groupby(['PLAYER_NAME', 'GAME_DATE'], sort=False).indices.items():
+        last_n_games = get_last_n_matrix(feature_store, player, game_date, stats, n_games)
+        over, _, games = calculate_probability_grid(last_n_games, np.floor(lines[rows]) + 1, stat_index[rows])
+        not_under, _, _ = calculate_probability_grid(last_n_games, np.ceil(lines[rows]), stat_index[rows])
+        over_probability[rows] = np.where(games > 0, over, np.nan)
+        under_probability[rows] = np.where(games > 0, 1 - not_under, np.nan)
+        number_of_games[rows] = games
+
+    board['GAMES'] = number_of_games
+    over_implied, under_implied = implied_probability(board['OVER_PRICE']), implied_probability(board['UNDER_PRICE'])
+    with np.errstate(invalid='ignore'):
+        # Implied probabilities without the bookmaker margin, when both sides are priced
+        over_no_vig = over_implied / (over_implied + under_implied)
+
+    info_columns = [col for col in ['PLAYER_NAME', 'GAME_DATE', 'TEAM_NAME', 'OPPONENT_NAME', 'MARKET', 'STAT', 'POINT', 'BOOKMAKER', 'GAMES'] if col in board.columns]
+    sides = []
+    for side, price_col, model_probability, implied, no_vig in [('Over', 'OVER_PRICE', over_probability, over_implied, over_no_vig),
+                                                                 ('Under', 'UNDER_PRICE', under_probability, under_implied, 1 - over_no_vig)]:
+        side_df = board[info_columns].copy()
+        side_df['SIDE'] = side
+        side_df['PRICE'] = board[price_col].to_numpy(dtype=float)
+        side_df['MODEL_PROBABILITY'] = model_probability
+        side_df['IMPLIED_PROBABILITY'] = implied
+        side_df['NO_VIG_PROBABILITY'] = no_vig
+        sides.append(side_df)
+    edges = pd.concat(sides, ignore_index=True)
+
+    edges = edges[edges['PRICE'].notna() & (edges['GAMES'] >= min_games)]
+    edges['EDGE'] = edges['MODEL_PROBABILITY'] - edges['IMPLIED_PROBABILITY']
+    # Expected profit of a 1 unit stake at the posted price
+    edges['EXPECTED_VALUE'] = edges['MODEL_PROBABILITY'] * edges['PRICE'] - 1
+    edges = edges.sort_values(by=['EDGE', 'EXPECTED_VALUE'], ascending=False, kind='mergesort').reset_index(drop=True)
+    # Reported to the caller instead of printed, the app and the pipeline decide whether to show it
+    edges.attrs['skipped_markets'] = skipped_markets
+    return edges
+
+# Example usage
+#odds_board = load_latest_odds(game_date='2024-03-19')
+#print(scan_odds_edges(odds_board, player_data).head(20))
+
+
+def lookup_actual_values(bets, actual_performance):
+    """
+    The actual value of every bet's stat, read from the player's game on the bet's date (the first row when
+    the logs have several).
 
+    Parameters:
+    - bets (DataFrame): Bets with 'PLAYER_NAME', 'GAME_DATE' and 'Stat'.
+    - actual_performance (DataFrame): Player game logs with the stat columns.
+
+    Returns:
+    - tuple: (actual_values, has_game) aligned with the bets, actual_values is NaN without a game or a value.
+    """
+    keys = ['PLAYER_NAME', 'GAME_DATE']
+    # Merge the bets on the row position of their (player, date) game instead of filtering the logs per bet
+    actual_keys = pd.DataFrame({
+        'PLAYER_NAME': actual_performance['PLAYER_NAME'].astype(object).to_numpy(),
+        'GAME_DATE': pd.to_datetime(actual_performance['GAME_DATE']).to_numpy(),
+        'ROW': np.arange(len(actual_performance)),
+    }).dropna(subset=keys).drop_duplicates(subset=keys, keep='first')
+    bet_keys = pd.DataFrame({
+        'PLAYER_NAME': bets['PLAYER_NAME'].astype(object).to_numpy(),
+        'GAME_DATE': pd.to_datetime(bets['GAME_DATE']).to_numpy(),
+    })
+    rows = bet_keys.merge(actual_keys, on=keys, how='left')['ROW'].to_numpy(dtype=float)
+    has_game = ~np.isnan(rows)
+
+    # Look up each stat's column once for all the bets on that stat
+    actual_values = np.full(len(bets), np.nan)
+    bet_stats = bets['Stat'].to_numpy()
+    for stat in pd.unique(bet_stats):
+        is_stat = (bet_stats == stat) & has_game
+        if not is_stat.any():
+            continue
+        if stat not in actual_performance.columns:
+            raise KeyError(f"Statistic '{stat}' not found in actual performance columns.")
+        actual_values[is_stat] = pd.to_numeric(actual_performance[stat]).to_numpy(dtype=float)[rows[is_stat].astype(int)]
+    return actual_values, has_game
+
+
+def calculate_bet_outcomes(probability_comparison, thresholds, actual_values):
+    """
+    Whether each bet won: 'Higher' bets need an actual value above the threshold, 'Lower' bets one below it.
+    Missing actual values never win.
+    """
+    probability_comparison = np.asarray(probability_comparison, dtype=object)
+    thresholds = np.asarray(thresholds, dtype=float)
+    with np.errstate(invalid='ignore'):
+        return (((probability_comparison == 'Higher') & (actual_values > thresholds)) |
+                ((probability_comparison == 'Lower') & (actual_values < thresholds)))
+
+
+def evaluate_bets(generated_bets, actual_performance):
+    """
+    Settle the generated bets against the actual game logs.
 
+    Returns:
+    - DataFrame: The bets with 'Actual Value', 'Bet Outcome' (True/False, NaN when the game or the value is missing)
+      and the 'Running Correct' / 'Running Incorrect' totals of the settled bets in bet order.
+    """
+    evaluated_bets = generated_bets.reset_index(drop=True)
+    actual_values, _ = lookup_actual_values(evaluated_bets, actual_performance)
+    is_settled = ~np.isnan(actual_values)
+    bet_correct = calculate_bet_outcomes(evaluated_bets['Probability comparison'], evaluated_bets['Threshold'], actual_values)
+
+    evaluated_bets['Actual Value'] = actual_values
+    evaluated_bets['Bet Outcome'] = pd.Series(bet_correct, dtype=object).where(is_settled, np.nan)
+    evaluated_bets['Running Correct'] = np.cumsum(bet_correct & is_settled).astype(float)
+    evaluated_bets['Running Incorrect'] = np.cumsum(~bet_correct & is_settled).astype(float)
+    return evaluated_bets
+
+
+def evaluate_bets_n_games_debug(generated_bets, actual_performance, n_games=10, verbose=True):
+    """
+    Settle the bets placed on each player's last n game dates and print a summary per player.
+
+    Returns:
+    - DataFrame: The settled bets, grouped by player in order of appearance, with 'Actual Value' and 'Bet Correct'.
+      Bets without a game in the logs are left out.
+    """
+    actual_performance = actual_performance.assign(GAME_DATE=pd.to_datetime(actual_performance['GAME_DATE']))
+    bets = generated_bets.assign(GAME_DATE=pd.to_datetime(generated_bets['GAME_DATE']))
+
+    # First of each player's last n game dates (all the dates when there are fewer)
+    player_dates = actual_performance[['PLAYER_NAME', 'GAME_DATE']].drop_duplicates().sort_values(by='GAME_DATE', ascending=False, kind='mergesort')
+    recent_dates = player_dates[player_dates.groupby('PLAYER_NAME', observed=True, sort=False).cumcount() < n_games]
+    min_dates = recent_dates.groupby('PLAYER_NAME', observed=True)['GAME_DATE'].min()
+    min_dates.index = min_dates.index.astype(object)
+
+    bet_players = bets['PLAYER_NAME'].astype(object)
+    in_last_n_games = (bets['GAME_DATE'] >= bet_players.map(min_dates)).to_numpy()
+    actual_values, has_game = lookup_actual_values(bets, actual_performance)
+    bet_correct = calculate_bet_outcomes(bets['Probability comparison'], bets['Threshold'], actual_values)
+    is_evaluated = in_last_n_games & has_game
+
+    # Bets grouped by player in order of first appearance, keeping the bet order within a player
+    player_codes, players = pd.factorize(bet_players)
+    order = np.argsort(player_codes, kind='stable')
+    order = order[is_evaluated[order]]
+    evaluated_bets_df_debug = generated_bets.iloc[order].reset_index(drop=True)
+    evaluated_bets_df_debug['Actual Value'] = actual_values[order]
+    evaluated_bets_df_debug['Bet Correct'] = bet_correct[order]
+
+    if verbose:
+        games_played = actual_performance['PLAYER_NAME'].astype(object).value_counts()
+        correct_bets = np.bincount(player_codes, weights=is_evaluated & bet_correct, minlength=len(players)).astype(int)
+        incorrect_bets = np.bincount(player_codes, weights=is_evaluated & ~bet_correct, minlength=len(players)).astype(int)
+        missing_games = np.bincount(player_codes, weights=in_last_n_games & ~has_game, minlength=len(players)).astype(int)
+        for i, player in enumerate(players):
+            print(f"\nEvaluating bets for: {player}")
+            if games_played.get(player, 0) < n_games:
+                print(f"Warning: {player} has only {games_played.get(player, 0)} games available, less than {n_games} games specified.")
+            print(f"Minimum date for the last {n_games} games: {min_dates.get(player)}")
+            if missing_games[i]:
+                print(f"No actual performance data for {player} on {missing_games[i]} bet dates")
+            print(f"{player} - Correct Bets: {correct_bets[i]}, Incorrect Bets: {incorrect_bets[i]}")
+
+        if not evaluated_bets_df_debug.empty:
+            final_corrects = evaluated_bets_df_debug['Bet Correct'].sum()
+            overall_bets = len(evaluated_bets_df_debug)
+            correct_percentage = final_corrects / overall_bets * 100
+            print(f"\nFinal Correct Percentage: {correct_percentage}% ({final_corrects}/{overall_bets})")
+        else:
+            print("No bets evaluated. Check if the date range or player selection might be too restrictive.")
+
+    return evaluated_bets_df_debug
 
 
 #PARLAYS*********************************************************
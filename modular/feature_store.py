@@ -0,0 +1,266 @@
+import pandas as pd
+import numpy as np
+from modular.schema import add_derived_stat_columns
+
+#Point-in-time ("as-of") features for every player before every game
+#Every lookup only uses games played strictly before the requested date, so the same store can be used
+#for backtests over past dates and for the daily recommendations of upcoming games.
+
+default_stats = ['PTS', 'AST', 'REB', 'STL', 'BLK', 'FG3M']
+
+
+def _prefix_sums(values):
+    """
+    Prefix sums of the values and squared values with a leading 0, so any window sum is a difference of two entries.
+    """
+    sums = np.concatenate([[0.0], np.cumsum(values, dtype=float)])
+    squared_sums = np.concatenate([[0.0], np.cumsum(np.square(values, dtype=float))])
+    return sums, squared_sums
+
+
+def _window_mean_std(sums, squared_sums, start, end):
+    """
+    Mean and sample standard deviation (ddof=1, like pandas .std()) of the windows [start, end) from prefix sums.
+    """
+    count = end - start
+    total = sums[end] - sums[start]
+    squared_total = squared_sums[end] - squared_sums[start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(count > 0, total / count, np.nan)
+        variance = (squared_total - total * mean) / (count - 1)
+        std = np.where(count > 1, np.sqrt(np.clip(variance, 0, None)), np.nan)
+    return count, mean, std
+
+
+def _build_player_history(logs, stats):
+    """
+    Per player arrays used for lookups: dates, opponents, full stat columns and, per stat, the games with a value.
+    'matrix' stacks the stat columns (one column per stat) and, when every stat has a value on the same games
+    (box scores are complete, upcoming games have none), 'played_games' holds those rows so several stats
+    are read with a single date lookup.
+    """
+    history = {}
+    for player, player_logs in logs.groupby('PLAYER_NAME', sort=False, observed=True):
+        dates = player_logs['GAME_DATE'].to_numpy()
+        matrix = player_logs[stats].to_numpy(dtype=float).reshape(len(player_logs), len(stats))
+        player_history = {
+            'GAME_DATE': dates,
+            'OPPONENT_NAME': player_logs['OPPONENT_NAME'].to_numpy(),
+            'matrix': matrix,
+            'stats': {},
+            'played': {},
+        }
+        played_by_stat = ~np.isnan(matrix)
+        for i, stat in enumerate(stats):
+            values = matrix[:, i]
+            played = played_by_stat[:, i]
+            sums, squared_sums = _prefix_sums(values[played])
+            player_history['stats'][stat] = values
+            player_history['played'][stat] = {
+                'GAME_DATE': dates[played],
+                'values': values[played],
+                'sums': sums,
+                'squared_sums': squared_sums,
+            }
+        if (played_by_stat == played_by_stat[:, :1]).all():
+            played = played_by_stat[:, 0] if len(stats) else np.ones(len(dates), dtype=bool)
+            player_history['played_games'] = {'GAME_DATE': dates[played], 'values': matrix[played]}
+        history[player] = player_history
+    return history
+
+
+def _build_features(logs, stats, n_games):
+    """
+    Vectorized as-of feature table with one row per (player, game date), using only games before that date.
+    """
+    players = logs['PLAYER_NAME'].to_numpy()
+    new_player = np.r_[True, players[1:] != players[:-1]]
+    # First row of each (player, date) group carries the state before that date
+    first_of_date = new_player | np.r_[True, logs['GAME_DATE'].to_numpy()[1:] != logs['GAME_DATE'].to_numpy()[:-1]]
+    player_group = np.cumsum(new_player) - 1
+
+    features = logs.loc[first_of_date, ['PLAYER_NAME', 'GAME_DATE']].reset_index(drop=True)
+
+    for stat in stats:
+        values = logs[stat].to_numpy(dtype=float)
+        played = ~np.isnan(values)
+        sums, squared_sums = _prefix_sums(values[played])
+
+        # Position in the global played-games arrays of each row, and of the first game of its player
+        played_before_row = np.cumsum(played) - played
+        player_start = played_before_row[new_player][player_group]
+
+        end = played_before_row[first_of_date]
+        start = player_start[first_of_date]
+        window_start = np.maximum(end - n_games, start)
+
+        games, cum_mean, cum_std = _window_mean_std(sums, squared_sums, start, end)
+        last_n_games, last_n_mean, last_n_std = _window_mean_std(sums, squared_sums, window_start, end)
+
+        features[f'{stat}_GAMES'] = games
+        features[f'{stat}_CUM_MEAN'] = cum_mean
+        features[f'{stat}_CUM_STD'] = cum_std
+        features[f'{stat}_LAST_N_GAMES'] = last_n_games
+        features[f'{stat}_LAST_N_MEAN'] = last_n_mean
+        features[f'{stat}_LAST_N_STD'] = last_n_std
+
+    return features.set_index(['PLAYER_NAME', 'GAME_DATE'])
+
+
+def _prepare_logs(player_data, stats):
+    """
+    Keep the columns the store needs, sorted by player and date.
+    """
+    logs = add_derived_stat_columns(player_data)[['PLAYER_NAME', 'GAME_DATE', 'OPPONENT_NAME'] + stats].copy()
+    logs['GAME_DATE'] = pd.to_datetime(logs['GAME_DATE'])
+    logs['PLAYER_NAME'] = logs['PLAYER_NAME'].astype(object)
+    logs['OPPONENT_NAME'] = logs['OPPONENT_NAME'].astype(str).str.strip()
+    logs = logs.dropna(subset=['PLAYER_NAME'])
+    logs.sort_values(by=['PLAYER_NAME', 'GAME_DATE'], kind='mergesort', inplace=True)
+    logs.reset_index(drop=True, inplace=True)
+    return logs
+
+
+def build_feature_store(player_data, stats=default_stats, n_games=10):
+    """
+    Build the point-in-time feature store from the player game logs.
+
+    Parameters:
+    - player_data (DataFrame): Player game logs, rows without statistics (upcoming games) are allowed.
+    - stats (list): The statistic columns to track.
+    - n_games (int): The rolling window used for the materialized 'LAST_N' feature columns.
+
+    Returns:
+    - dict: 'features' holds, per (PLAYER_NAME, GAME_DATE), the cumulative and last n game counts, means
+      and standard deviations of every stat before that date. 'history' holds per player arrays for O(1)
+      window lookups at any date and any n.
+    """
+    stats = list(stats)
+    logs = _prepare_logs(player_data, stats)
+    return {
+        'stats': stats,
+        'stat_columns': {stat: i for i, stat in enumerate(stats)},
+        'n_games': n_games,
+        'logs': logs,
+        'features': _build_features(logs, stats, n_games),
+        'history': _build_player_history(logs, stats),
+    }
+
+
+def update_feature_store(store, new_player_data):
+    """
+    Add new game logs to the store, recomputing only the players that appear in the new logs.
+    Rows for an existing (player, date) replace the stored ones, e.g. an upcoming game that now has a box score.
+    """
+    stats = store['stats']
+    new_logs = _prepare_logs(new_player_data, stats)
+    if new_logs.empty:
+        return store
+
+    updated_players = new_logs['PLAYER_NAME'].unique()
+    is_updated = store['logs']['PLAYER_NAME'].isin(updated_players)
+
+    player_logs = pd.concat([store['logs'][is_updated], new_logs], ignore_index=True)
+    player_logs = player_logs.drop_duplicates(subset=['PLAYER_NAME', 'GAME_DATE'], keep='last')
+    player_logs.sort_values(by=['PLAYER_NAME', 'GAME_DATE'], kind='mergesort', inplace=True)
+    player_logs.reset_index(drop=True, inplace=True)
+
+    logs = pd.concat([store['logs'][~is_updated], player_logs], ignore_index=True)
+    logs.sort_values(by=['PLAYER_NAME', 'GAME_DATE'], kind='mergesort', inplace=True)
+    store['logs'] = logs.reset_index(drop=True)
+
+    kept_features = store['features'][~store['features'].index.get_level_values('PLAYER_NAME').isin(updated_players)]
+    store['features'] = pd.concat([kept_features, _build_features(player_logs, stats, store['n_games'])]).sort_index()
+    store['history'].update(_build_player_history(player_logs, stats))
+    return store
+
+
+def _date_position(dates, game_date):
+    """
+    Number of entries in the sorted dates strictly before the game date.
+    """
+    return int(np.searchsorted(dates, pd.Timestamp(game_date).to_datetime64(), side='left'))
+
+
+def get_asof_features(store, player, game_date, stat, n_games=None):
+    """
+    Cumulative and last n game features of a stat for a player before the game date.
+
+    Returns:
+    - tuple: (games, cum_mean, cum_std, last_n_games, last_n_mean, last_n_std)
+    """
+    n_games = store['n_games'] if n_games is None else n_games
+    played = store['history'][player]['played'][stat] if player in store['history'] else None
+    if played is None:
+        return 0, np.nan, np.nan, 0, np.nan, np.nan
+
+    end = _date_position(played['GAME_DATE'], game_date)
+    start = max(end - n_games, 0)
+    games, cum_mean, cum_std = _window_mean_std(played['sums'], played['squared_sums'], 0, end)
+    last_n_games, last_n_mean, last_n_std = _window_mean_std(played['sums'], played['squared_sums'], start, end)
+    return int(games), float(cum_mean), float(cum_std), int(last_n_games), float(last_n_mean), float(last_n_std)
+
+
+def get_last_n_values(store, player, game_date, stat, n_games=None):
+    """
+    The values of a stat in the player's last n games (with statistics) before the game date.
+    """
+    n_games = store['n_games'] if n_games is None else n_games
+    if player not in store['history']:
+        return np.array([], dtype=float)
+    played = store['history'][player]['played'][stat]
+    end = _date_position(played['GAME_DATE'], game_date)
+    return played['values'][max(end - n_games, 0):end]
+
+
+def get_values_against_team(store, player, game_date, stat, opposing_team):
+    """
+    The values of a stat in all the player's games against a team before the game date.
+    Games without statistics are kept as NaN so they count as games played but never as hits.
+    """
+    if player not in store['history']:
+        return np.array([], dtype=float)
+    player_history = store['history'][player]
+    end = _date_position(player_history['GAME_DATE'], game_date)
+    against_team = player_history['OPPONENT_NAME'][:end] == opposing_team
+    return player_history['stats'][stat][:end][against_team]
+
+
+def get_last_n_matrix(store, player, game_date, stats, n_games=None):
+    """
+    The last n games before the game date for several stats as a (n_games, len(stats)) matrix.
+    Stats with fewer games are padded with NaN at the top.
+    """
+    n_games = store['n_games'] if n_games is None else n_games
+    matrix = np.full((n_games, len(stats)), np.nan)
+    played_games = store['history'][player].get('played_games') if player in store['history'] else None
+    if played_games is not None:
+        # All stats share their games: one date lookup and one slice of the stacked matrix
+        end = _date_position(played_games['GAME_DATE'], game_date)
+        values = played_games['values'][max(end - n_games, 0):end][:, [store['stat_columns'][stat] for stat in stats]]
+        matrix[n_games - len(values):] = values
+        return matrix
+    for i, stat in enumerate(stats):
+        values = get_last_n_values(store, player, game_date, stat, n_games)
+        if len(values):
+            matrix[n_games - len(values):, i] = values
+    return matrix
+
+
+def get_against_team_matrix(store, player, game_date, stats, opposing_team):
+    """
+    All the player's games against a team before the game date for several stats, one column per stat.
+    """
+    if player not in store['history']:
+        return np.empty((0, len(stats)))
+    player_history = store['history'][player]
+    end = _date_position(player_history['GAME_DATE'], game_date)
+    against_team = player_history['OPPONENT_NAME'][:end] == opposing_team
+    return player_history['matrix'][:end][against_team][:, [store['stat_columns'][stat] for stat in stats]]
+
+
+# Example usage
+# data = pd.read_csv('data/player_game_logs_winr.csv')
+# store = build_feature_store(data, n_games=10)
+# print(store['features'].loc[('Cade Cunningham', pd.Timestamp('2024-03-01'))])
+# print(get_last_n_values(store, 'Cade Cunningham', '2024-03-01', 'PTS'))
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import subprocess
+import pandas as pd
+
+#Import-time benchmark
+#Every module is imported in a fresh interpreter (like a cold app start or a spawned pool worker) and timed.
+#An audit hook records the files the import opens outside the Python sources and any network connection,
+#and the heavy dependencies it loaded, so work that should only happen on use shows up here.
+
+library_modules = ['modular.schema', 'modular.storage', 'modular.team_metadata', 'modular.feature_store', 'modular.metrics_functions',
+                   'modular.betting_functions', 'modular.parallel_betting', 'modular.backtest', 'modular.player_game_logs',
+                   'modular.odds_store', 'modular.odds_normalization', 'modular.odds_fetcher', 'modular.odds_api_pull', 'modular.pipeline']
+heavy_modules = ['nba_api', 'requests', 'matplotlib', 'streamlit', 'scipy']
+
+# Run in the child interpreter: pandas is imported first so every module is timed on top of the same baseline
+import_probe = """
+import sys, time, json, importlib
+import pandas
+opened, connections = [], []
+def audit(event, args):
+    if event == 'open' and isinstance(args[0], str) and not args[0].endswith(('.py', '.pyc', '.so', '.pth')) and '__pycache__' not in args[0]:
+        opened.append(args[0])
+    elif event == 'socket.connect':
+        connections.append(str(args[1]))
+sys.addaudithook(audit)
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'files_opened': sorted(set(path for path in opened if not path.startswith(sys.prefix))),
+                  'connections': connections, 'heavy_modules': [name for name in json.loads(sys.argv[2]) if name in sys.modules]}))
+"""
+
+
+def measure_import(module, cwd=None):
+    """
+    Import a module in a fresh interpreter, returning the import time, the data files it opened,
+    the network connections it made and the heavy dependencies it loaded (or the error when the import fails).
+    """
+    cwd = cwd or os.getcwd()
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [cwd, os.environ.get('PYTHONPATH')]))}
+    result = subprocess.run([sys.executable, '-c', import_probe, module, json.dumps(heavy_modules)], cwd=cwd, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {'seconds': None, 'files_opened': [], 'connections': [], 'heavy_modules': [], 'error': result.stderr.strip().splitlines()[-1]}
+    return {**json.loads(result.stdout.strip().splitlines()[-1]), 'error': None}
+
+
+def benchmark_import_times(modules=library_modules, repeat=3, cwd=None):
+    """
+    Cold import time of every module (best of `repeat` fresh interpreters, on top of pandas) with the files,
+    connections and heavy dependencies the import pulls in.
+    """
+    rows = []
+    for module in modules:
+        runs = [measure_import(module, cwd) for _ in range(repeat)]
+        timings = [run['seconds'] for run in runs if run['seconds'] is not None]
+        last_run = runs[-1]
+        rows.append({'module': module, 'seconds': min(timings) if timings else None, 'files_opened': last_run['files_opened'],
+                     'connections': last_run['connections'], 'heavy_modules': last_run['heavy_modules'], 'error': last_run['error']})
+        seconds = f"{rows[-1]['seconds'] * 1000:.1f} ms" if timings else 'failed'
+        print(f"{module}: {seconds}, files {last_run['files_opened']}, heavy {last_run['heavy_modules']}" + (f", error {last_run['error']}" if last_run['error'] else ''))
+    return pd.DataFrame(rows)
+
+
+# Example usage
+#if __name__ == '__main__':
+#    benchmark_import_times()
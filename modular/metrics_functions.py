@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 import os
+from modular.schema import metric_stats, add_derived_stat_columns
 
 def calculate_running_stats(group, stats):
     """
@@ -11,51 +12,88 @@ def calculate_running_stats(group, stats):
     running_stds = group[stats].std(ddof=0)  # ddof=0 for population standard deviation
     return running_means, running_stds
 
+def calculate_last_n_stats(df, stats, windows, group_cols=('PLAYER_NAME', 'TEAM_NAME')):
+    """
+    Calculate the mean and population standard deviation of the last n games for every group in one pass.
+
+    Parameters:
+    - df (DataFrame): The (already filtered) player game logs.
+    - stats (list): The statistic columns to aggregate.
+    - windows (list of tuples): (n_games, game_location) pairs, e.g. [(10, 'All'), (10, 'Home')].
+      All windows are served from the same sort of the data.
+    - group_cols (list or tuple): The columns identifying a group (player and team by default).
+
+    Returns:
+    - DataFrame: Long format with one mean and one std row per group and window, tagged by 'TYPE'.
+    """
+    stats, group_cols = list(stats), list(group_cols)
+    columns = stats + ['TYPE'] + group_cols + ['HOME_AWAY']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Sort once: groups ascending, most recent game first within each group
+    sorted_df = df.sort_values(by=group_cols + ['GAME_DATE'], ascending=[True] * len(group_cols) + [False], kind='mergesort')
+    # Position of each game counted back from the most recent one, overall and per home/away split
+    game_rank = sorted_df.groupby(group_cols, sort=False, observed=True).cumcount().to_numpy()
+    location_rank = sorted_df.groupby(group_cols + ['HOME_AWAY'], sort=False, observed=True).cumcount().to_numpy()
+    home_away = sorted_df['HOME_AWAY'].to_numpy()
+
+    result_list = []
+    for n_games, game_location in windows:
+        if game_location in ['Home', 'Away']:
+            in_window = (home_away == game_location) & (location_rank < n_games)
+        else:
+            in_window = game_rank < n_games
+
+        grouped = sorted_df.loc[in_window, group_cols + stats].groupby(group_cols, sort=True, observed=True)
+        mean_values = grouped[stats].mean().reset_index()
+        std_values = grouped[stats].std(ddof=0).reset_index()  # ddof=0 for population standard deviation
+
+        mean_values['TYPE'] = 'mean_' + str(n_games) + '_games'
+        std_values['TYPE'] = 'std_' + str(n_games) + '_games'
+
+        # Interleave the rows so each group's mean is directly followed by its std
+        window_df = pd.concat([mean_values, std_values], ignore_index=True)
+        group_order = np.tile(np.arange(len(mean_values)), 2)
+        window_df = window_df.iloc[np.argsort(group_order, kind='stable')]
+        window_df['HOME_AWAY'] = game_location
+        result_list.append(window_df[columns])
+
+    result_df = pd.concat(result_list, ignore_index=True)
+    return result_df
+
+
 def prepare_mean_std_data(df, n_games=10, current_date=None, current_season=None, game_location='All'):
     """
     Prepare aggregated data for players over the last n games up to the current date and within the current season,
     considering home/away context.
     """
-    stats = ['PTS', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA', 'AST', 'OREB', 'DREB', 'REB', 'TOV', 'STL', 'BLK', 'MIN', 'TEAM_WIN_RATE', 'OPPONENT_WIN_RATE']
-    
+    return prepare_mean_std_data_windows(df, [(n_games, game_location)], current_date, current_season)
+
+
+def prepare_mean_std_data_windows(df, windows, current_date=None, current_season=None):
+    """
+    Prepare aggregated data for several (n_games, game_location) windows at once, e.g. the season total,
+    the last 10 games and the last 10 home games, sorting the data only once.
+    """
+    stats = metric_stats
+    df = add_derived_stat_columns(df)
+
     if current_date:
         df = df[df['GAME_DATE'] <= current_date]
     if current_season:
         df = df[df['SEASON'] == current_season]
-    if game_location in ['Home', 'Away']:
-        df = df[df['HOME_AWAY'] == game_location]
-
-    grouped = df.groupby(['PLAYER_NAME', 'TEAM_NAME'])
-    result_list = []
 
-    for (player_name, team_name), group in grouped:
-        group = group.sort_values(by='GAME_DATE', ascending=False).head(n_games)
-        mean_values, std_values = calculate_running_stats(group, stats)
-        
-        mean_values['TYPE'] = 'mean_'+str(n_games)+'_games'
-        std_values['TYPE'] = 'std_'+str(n_games)+'_games'
-        mean_values['PLAYER_NAME'] = player_name
-        mean_values['TEAM_NAME'] = team_name
-        mean_values['HOME_AWAY'] = game_location
-        
-        std_values['PLAYER_NAME'] = player_name
-        std_values['TEAM_NAME'] = team_name
-        std_values['HOME_AWAY'] = game_location
-
-        result_list.append(mean_values)
-        result_list.append(std_values)
-
-    result_df = pd.DataFrame(result_list).reset_index(drop=True)
-    return result_df
+    return calculate_last_n_stats(df, stats, windows)
 
 
 # Example usage
 # Load in data
-data = pd.read_csv('data/player_game_logs_winr.csv')
+#data = pd.read_csv('data/player_game_logs_winr.csv')
 # Filter for a specific player, e.g., Cade Cunningham
-data = data[data['PLAYER_NAME'] == 'Cade Cunningham']
+#data = data[data['PLAYER_NAME'] == 'Cade Cunningham']
 # Assuming 'data' is your DataFrame loaded from 'player_game_logs_winr.csv'
-aggregated_data = prepare_mean_std_data(data, n_games=10, game_location='Home')
+#aggregated_data = prepare_mean_std_data(data, n_games=10, game_location='Home')
 #print(aggregated_data.head())
 #print(aggregated_data.columns)
 
@@ -88,7 +126,8 @@ def prepare_league_std_data(df, n_games=10, current_date=None, current_season=No
     Prepare league-wide aggregated standard deviation data over the last n games up to the current date and within the current season,
     considering home/away context.
     """
-    stats = ['PTS', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA', 'AST', 'OREB', 'DREB', 'REB', 'TOV', 'STL', 'BLK', 'MIN', 'TEAM_WIN_RATE', 'OPPONENT_WIN_RATE']
+    stats = metric_stats
+    df = add_derived_stat_columns(df)
     league_stats = calculate_league_stats(df, stats, n_games, current_date, current_season, game_location)
     
     result_df = pd.DataFrame(league_stats).reset_index(drop=True)
@@ -120,25 +159,31 @@ def prepare_performance_against_all_teams(df):
     Returns:
     - DataFrame: The aggregated data with running averages for each player against each team.
     """
-    stats = ['PTS', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA', 'AST', 'OREB', 'DREB', 'REB', 'TOV', 'STL', 'BLK', 'MIN', 'TEAM_WIN_RATE', 'OPPONENT_WIN_RATE']
-    unique_players = df['PLAYER_NAME'].unique()
-    unique_teams = df['OPPONENT_NAME'].unique()
-    
-    result_list = []
+    stats = metric_stats
+    df = add_derived_stat_columns(df)
+    columns = stats + ['PLAYER_NAME', 'OPPONENT_NAME', 'TYPE']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
 
-    for player in unique_players:
-        for team in unique_teams:
-            player_games = df[(df['PLAYER_NAME'] == player) & (df['OPPONENT_NAME'] == team)]
-            
-            if not player_games.empty:
-                mean_values, _ = calculate_running_stats(player_games, stats)
-                mean_values['PLAYER_NAME'] = player
-                mean_values['OPPONENT_NAME'] = team
-                mean_values['TYPE'] = f'mean_vs_{team}'
-                result_list.append(mean_values)
-    
-    result_df = pd.DataFrame(result_list).reset_index(drop=True)
-    return result_df
+    # One grouped pass over all (player, opponent) pairs
+    result_df = df.groupby(['PLAYER_NAME', 'OPPONENT_NAME'], sort=False, observed=True)[stats].mean().reset_index()
+
+    # Order rows by player, then opponent, in order of first appearance in the data
+    player_order = pd.Index(np.asarray(df['PLAYER_NAME'].unique(), dtype=object)).get_indexer(result_df['PLAYER_NAME'].astype(object))
+    team_order = pd.Index(np.asarray(df['OPPONENT_NAME'].unique(), dtype=object)).get_indexer(result_df['OPPONENT_NAME'].astype(object))
+    result_df = result_df.iloc[np.lexsort((team_order, player_order))]
+
+    result_df['TYPE'] = 'mean_vs_' + result_df['OPPONENT_NAME'].astype(str)
+    return result_df[columns].reset_index(drop=True)
+
+
+def prepare_performance_against_team(df, player_name, opponent_name):
+    """
+    Same rows as prepare_performance_against_all_teams restricted to one (player, opponent) pair, only
+    aggregating that pair's games.
+    """
+    pair_games = df[(df['PLAYER_NAME'] == player_name) & (df['OPPONENT_NAME'] == opponent_name)]
+    return prepare_performance_against_all_teams(pair_games)
 
 #Example usage
 #performance_against_all_teams = prepare_performance_against_all_teams(data)
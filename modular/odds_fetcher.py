@@ -0,0 +1,177 @@
+import os
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+#Concurrent client for The Odds API player prop markets
+#Event odds are fetched with one pooled HTTP session shared by a small worker pool. Several markets are combined
+#into one request (the API takes a comma separated `markets` list) and every request is checked against a
+#quota budget first: a request costs (markets returned) x (regions) usage credits.
+
+default_base_url = 'https://api.the-odds-api.com/v4/sports'
+
+# Define the target markets
+nba_player_prop_markets = [
+    'player_points', 'player_rebounds', 'player_assists',
+    'player_threes', 'player_blocks', 'player_steals',
+    'player_blocks_steals', 'player_turnovers',
+    'player_points_rebounds_assists', 'player_points_rebounds',
+    'player_points_assists', 'player_rebounds_assists',
+    'player_first_basket', 'player_double_double',
+    'player_triple_double', 'player_points_alternate',
+    'player_rebounds_alternate', 'player_assists_alternate',
+    'player_blocks_alternate', 'player_steals_alternate',
+    'player_threes_alternate', 'player_points_assists_alternate',
+    'player_points_rebounds_alternate', 'player_rebounds_assists_alternate',
+    'player_points_rebounds_assists_alternate'
+]
+
+
+class QuotaBudget:
+    """
+    Usage credit budget shared by the fetch workers. A request is only sent when its estimated cost fits in the
+    budget of the run (`budget`, None for no limit) and in the remaining quota last reported by the API.
+    """
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.reserved = 0
+        self.remaining = None
+        self.lock = threading.Lock()
+
+    def reserve(self, cost):
+        with self.lock:
+            if self.budget is not None and self.reserved + cost > self.budget:
+                return False
+            if self.remaining is not None and cost > self.remaining:
+                return False
+            self.reserved += cost
+            if self.remaining is not None:
+                self.remaining -= cost
+            return True
+
+    def update(self, headers):
+        remaining = headers.get('x-requests-remaining')
+        if remaining is not None:
+            with self.lock:
+                # Other requests may still be in flight, keep the lower of the two counts
+                self.remaining = float(remaining) if self.remaining is None else min(self.remaining, float(remaining))
+
+
+def make_odds_session(max_concurrency=8, max_retries=3, backoff=0.5):
+    """
+    HTTP session with a connection pool sized for the workers, retrying rate limited (429) and server errors with backoff.
+    """
+    session = requests.Session()
+    retry = Retry(total=max_retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=('GET',))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def fetch_events(session, api_key, base_url=default_base_url, sport='basketball_nba', regions='us', timeout=10):
+    """
+    Fetch the list of upcoming events (games). Listing events does not use quota.
+    """
+    response = session.get(f"{base_url}/{sport}/events", params={'apiKey': api_key, 'regions': regions}, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_event_odds(session, event_id, markets, api_key, base_url=default_base_url, sport='basketball_nba', regions='us',
+                     odds_format='decimal', timeout=10):
+    """
+    Fetch the odds of one event for several markets in a single request.
+
+    Returns:
+    - tuple: (payload, response headers). The payload holds the event fields and its bookmakers' markets.
+    """
+    odds_url = f"{base_url}/{sport}/events/{event_id}/odds"
+    odds_params = {'apiKey': api_key, 'markets': ','.join(markets), 'regions': regions, 'oddsFormat': odds_format}
+    response = session.get(odds_url, params=odds_params, timeout=timeout)
+    response.raise_for_status()
+    return response.json(), response.headers
+
+
+def fetch_odds_pages(api_key, markets=nba_player_prop_markets, events=None, base_url=default_base_url, sport='basketball_nba',
+                     regions='us', markets_per_request=25, max_concurrency=8, quota_budget=None, record_dir=None,
+                     session=None, timeout=10):
+    """
+    Fetch the odds of every event for the markets, concurrently.
+
+    Parameters:
+    - api_key (str): The Odds API key.
+    - markets (list): Market keys to fetch.
+    - events (list): Events to fetch (dicts with an 'id'), by default the upcoming events of the sport.
+    - base_url (str): API base URL, e.g. a local mock server.
+    - markets_per_request (int): Number of markets combined in one request.
+    - max_concurrency (int): Maximum number of requests in flight.
+    - quota_budget (int): Maximum usage credits the run may spend, None to only respect the remaining quota.
+    - record_dir (str): Directory to save the raw JSON responses to, e.g. to replay them in benchmarks (see load_recorded_odds_pages).
+    - session (Session): HTTP session to use, a pooled session is created by default.
+
+    Returns:
+    - tuple: (events, pages) where pages holds the event odds payloads in event and market order.
+    """
+    session = session or make_odds_session(max_concurrency)
+    if events is None:
+        events = fetch_events(session, api_key, base_url, sport, regions, timeout)
+
+    market_chunks = [markets[i:i + markets_per_request] for i in range(0, len(markets), markets_per_request)]
+    requests_to_send = [(event, chunk) for event in events for chunk in market_chunks]
+    budget = QuotaBudget(quota_budget)
+    regions_count = len(regions.split(','))
+
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+        with open(os.path.join(record_dir, 'events.json'), 'w') as f:
+            json.dump(events, f)
+
+    def fetch_page(request_index):
+        event, chunk = requests_to_send[request_index]
+        if not budget.reserve(len(chunk) * regions_count):
+            print(f"Quota budget reached, skipping {len(chunk)} markets for event {event['id']}.")
+            return None
+        try:
+            payload, headers = fetch_event_odds(session, event['id'], chunk, api_key, base_url, sport, regions, timeout=timeout)
+        except requests.HTTPError as e:
+            # The error message holds the request URL and so the API key, only report the status
+            print(f"Error fetching odds for event {event['id']} ({len(chunk)} markets): HTTP {e.response.status_code} {e.response.reason}")
+            return None
+        except Exception as e:
+            print(f"Error fetching odds for event {event['id']} ({len(chunk)} markets): {type(e).__name__}")
+            return None
+        budget.update(headers)
+        if record_dir:
+            with open(os.path.join(record_dir, f"odds_{request_index:05d}.json"), 'w') as f:
+                json.dump(payload, f)
+        return payload
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        pages = list(executor.map(fetch_page, range(len(requests_to_send))))
+
+    pages = [page for page in pages if page is not None]
+    print(f"Fetched {len(pages)} of {len(requests_to_send)} odds pages for {len(events)} events "
+          f"({budget.reserved} credits reserved, {budget.remaining if budget.remaining is not None else 'unknown'} remaining).")
+    return events, pages
+
+
+def load_recorded_odds_pages(record_dir):
+    """
+    Load the events and odds payloads saved by fetch_odds_pages(record_dir=...), in request order.
+    """
+    with open(os.path.join(record_dir, 'events.json')) as f:
+        events = json.load(f)
+    pages = []
+    for file_name in sorted(os.listdir(record_dir)):
+        if file_name.startswith('odds_') and file_name.endswith('.json'):
+            with open(os.path.join(record_dir, file_name)) as f:
+                pages.append(json.load(f))
+    return events, pages
+
+
+# Example usage
+#events, pages = fetch_odds_pages(api_key, nba_player_prop_markets, max_concurrency=8, quota_budget=500, record_dir='data/odds_pages')
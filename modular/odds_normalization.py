@@ -0,0 +1,220 @@
+import time
+import numpy as np
+import pandas as pd
+
+#Normalization of the raw event odds pages returned by The Odds API
+#The nested bookmakers > markets > outcomes JSON is flattened into one long record per outcome with json_normalize,
+#then the latest Over and Under prices of every player prop are pivoted into one wide row.
+
+odds_record_columns = ['GAME_ID', 'COMMENCE_TIME', 'HOME_TEAM', 'AWAY_TEAM', 'BOOKMAKER', 'PLAYER_NAME', 'MARKET', 'OVER_UNDER', 'PRICE', 'POINT', 'LAST_UPDATE']
+over_under_keys = ['PLAYER_NAME', 'GAME_DATE', 'MARKET', 'POINT', 'HOME_TEAM', 'AWAY_TEAM']
+
+# json_normalize output columns to odds record columns
+odds_json_columns = {
+    'id': 'GAME_ID',
+    'commence_time': 'COMMENCE_TIME',
+    'home_team': 'HOME_TEAM',
+    'away_team': 'AWAY_TEAM',
+    'bookmakers.key': 'BOOKMAKER',
+    'description': 'PLAYER_NAME',
+    'bookmakers.markets.key': 'MARKET',
+    'name': 'OVER_UNDER',
+    'price': 'PRICE',
+    'point': 'POINT',
+    'bookmakers.markets.last_update': 'LAST_UPDATE',
+}
+
+
+def flatten_odds_pages(pages, players=None):
+    """
+    Flatten event odds pages into one record per bookmaker, market and outcome.
+
+    Parameters:
+    - pages (list): Event odds payloads (dicts with the event fields and 'bookmakers').
+    - players (iterable): Only keep the outcomes of these players, all outcomes by default.
+
+    Returns:
+    - DataFrame: Long odds records with odds_record_columns, times as naive UTC datetimes.
+    """
+    records = pd.json_normalize(
+        pages,
+        record_path=['bookmakers', 'markets', 'outcomes'],
+        meta=['id', 'commence_time', 'home_team', 'away_team', ['bookmakers', 'key'], ['bookmakers', 'markets', 'key'], ['bookmakers', 'markets', 'last_update']],
+    )
+    records = records.rename(columns=odds_json_columns).reindex(columns=odds_record_columns)
+    if players is not None:
+        records = records[records['PLAYER_NAME'].isin(set(players))]
+
+    records['COMMENCE_TIME'] = pd.to_datetime(records['COMMENCE_TIME'], utc=True).dt.tz_localize(None)
+    records['LAST_UPDATE'] = pd.to_datetime(records['LAST_UPDATE'], utc=True).dt.tz_localize(None)
+    records['PRICE'] = pd.to_numeric(records['PRICE'])
+    records['POINT'] = pd.to_numeric(records['POINT'])
+    return records.reset_index(drop=True)
+
+
+def pivot_over_under(odds_records):
+    """
+    One row per player prop with the latest Over and Under prices.
+
+    The latest Over and the latest Under outcome of every (player, market) are kept, across bookmakers and lines,
+    and pivoted on (player, game date, market, line, teams); an Over and Under posted at different lines stay
+    in separate rows. Outcomes other than Over/Under (e.g. 'Yes' for double doubles) are left out.
+
+    Returns:
+    - DataFrame: PLAYER_NAME, GAME_DATE, MARKET, OVER_PRICE, POINT, HOME_TEAM, AWAY_TEAM, UNDER_PRICE.
+    """
+    over_under = odds_records[odds_records['OVER_UNDER'].isin(['Over', 'Under'])].copy()
+    over_under['GAME_DATE'] = over_under['COMMENCE_TIME'].dt.normalize()
+
+    # Sort by 'Last Update' to ensure the most recent entries are first
+    over_under.sort_values(by=['PLAYER_NAME', 'MARKET', 'OVER_UNDER', 'LAST_UPDATE'], ascending=[True, True, True, False], kind='mergesort', inplace=True)
+    over_under.drop_duplicates(subset=['PLAYER_NAME', 'MARKET', 'OVER_UNDER'], keep='first', inplace=True)
+
+    prices = over_under.set_index(over_under_keys + ['OVER_UNDER'])['PRICE'].unstack('OVER_UNDER')
+    prices = prices.reindex(columns=['Over', 'Under']).rename(columns={'Over': 'OVER_PRICE', 'Under': 'UNDER_PRICE'})
+    prices.columns.name = None
+    prices = prices.reset_index().sort_values(by=over_under_keys, kind='mergesort')
+    return prices[['PLAYER_NAME', 'GAME_DATE', 'MARKET', 'OVER_PRICE', 'POINT', 'HOME_TEAM', 'AWAY_TEAM', 'UNDER_PRICE']].reset_index(drop=True)
+
+
+def pivot_bookmaker_snapshots(odds_records):
+    """
+    One row per bookmaker snapshot of a player prop: the Over and Under prices a bookmaker posted for a
+    (player, game date, market, line) at its last update. Unlike pivot_over_under nothing is collapsed,
+    so every line and bookmaker is kept for the odds history.
+
+    Returns:
+    - DataFrame: over_under_keys, BOOKMAKER, LAST_UPDATE, GAME_ID, COMMENCE_TIME, OVER_PRICE and UNDER_PRICE.
+    """
+    over_under = odds_records[odds_records['OVER_UNDER'].isin(['Over', 'Under'])].copy()
+    over_under['GAME_DATE'] = over_under['COMMENCE_TIME'].dt.normalize()
+    snapshot_keys = over_under_keys + ['BOOKMAKER', 'LAST_UPDATE', 'GAME_ID', 'COMMENCE_TIME']
+    over_under = over_under.drop_duplicates(subset=snapshot_keys + ['OVER_UNDER'], keep='last')
+
+    prices = over_under.set_index(snapshot_keys + ['OVER_UNDER'])['PRICE'].unstack('OVER_UNDER')
+    prices = prices.reindex(columns=['Over', 'Under']).rename(columns={'Over': 'OVER_PRICE', 'Under': 'UNDER_PRICE'})
+    prices.columns.name = None
+    return prices.reset_index()
+
+
+def add_matchup_columns(over_under, player_teams):
+    """
+    Add each player's TEAM_NAME, whether they play at Home or Away and the OPPONENT_NAME.
+
+    Parameters:
+    - over_under (DataFrame): Output of pivot_over_under.
+    - player_teams (DataFrame): PLAYER_NAME and TEAM_NAME of the players playing today.
+    """
+    player_teams = player_teams[['PLAYER_NAME', 'TEAM_NAME']].drop_duplicates(subset=['PLAYER_NAME'])
+    odds_board = over_under.merge(player_teams, on='PLAYER_NAME', how='left')
+    is_home = (odds_board['TEAM_NAME'] == odds_board['HOME_TEAM']).to_numpy()
+    odds_board['HOME_AWAY'] = np.where(is_home, 'Home', 'Away')
+    odds_board['OPPONENT_NAME'] = np.where(is_home, odds_board['AWAY_TEAM'], odds_board['HOME_TEAM'])
+    return odds_board
+
+
+def normalize_odds_pages(pages, player_teams):
+    """
+    Turn raw event odds pages into the over/under odds board of the players playing today.
+
+    Parameters:
+    - pages (list): Event odds payloads, e.g. from fetch_odds_pages.
+    - player_teams (DataFrame): PLAYER_NAME and TEAM_NAME of the players playing today.
+
+    Returns:
+    - DataFrame: One row per player prop with the Over/Under prices, the line, the teams, HOME_AWAY and OPPONENT_NAME.
+    """
+    odds_records = flatten_odds_pages(pages, players=player_teams['PLAYER_NAME'].unique())
+    return add_matchup_columns(pivot_over_under(odds_records), player_teams)
+
+
+def normalize_odds_snapshots(pages, player_teams):
+    """
+    Turn raw event odds pages into the per bookmaker snapshots of the players playing today, for the odds history store.
+    """
+    odds_records = flatten_odds_pages(pages, players=player_teams['PLAYER_NAME'].unique())
+    return add_matchup_columns(pivot_bookmaker_snapshots(odds_records), player_teams)
+
+
+def backfill_alternate_markets(odds_board, alternate_markets):
+    """
+    Add a placeholder row (no prices) for every player, game date, alternate market and line missing from the board.
+
+    Parameters:
+    - odds_board (DataFrame): Board with PLAYER_NAME, GAME_DATE, MARKET and POINT.
+    - alternate_markets (dict): Market key -> list of lines every player should have, e.g. {'player_points_alternate': [9.5, 19.5]}.
+
+    Returns:
+    - DataFrame: The board followed by the placeholder rows, in player, date, market and line order.
+    """
+    alternate_lines = pd.DataFrame([(market, point) for market, points in alternate_markets.items() for point in points], columns=['MARKET', 'POINT'])
+    players = pd.DataFrame({'PLAYER_NAME': odds_board['PLAYER_NAME'].unique()})
+    game_dates = pd.DataFrame({'GAME_DATE': odds_board['GAME_DATE'].unique()})
+    wanted = players.merge(game_dates, how='cross').merge(alternate_lines, how='cross')
+
+    # Anti-join: keep the wanted lines that are not on the board
+    line_keys = ['PLAYER_NAME', 'GAME_DATE', 'MARKET', 'POINT']
+    posted = odds_board[line_keys].drop_duplicates()
+    missing = wanted.merge(posted, on=line_keys, how='left', indicator=True)
+    missing = missing[missing['_merge'] == 'left_only'].drop(columns='_merge')
+    missing['OVER_PRICE'] = np.nan
+    missing['UNDER_PRICE'] = np.nan
+    return pd.concat([odds_board, missing], ignore_index=True)
+
+
+def benchmark_odds_normalization(pages, player_teams=None, repeat=3):
+    """
+    Compare the nested loop normalization with normalize_odds_pages on recorded pages (see load_recorded_odds_pages)
+    or mock pages (tests/odds_mock.py). All the players are kept when player_teams is not given.
+    """
+    if player_teams is None:
+        player_teams = pd.DataFrame({'PLAYER_NAME': flatten_odds_pages(pages)['PLAYER_NAME'].dropna().unique(), 'TEAM_NAME': None})
+    players_today = player_teams['PLAYER_NAME'].unique()
+
+    def normalize_in_loops():
+        betting_data_list = []
+        for odds_data in pages:
+            for bookmaker in odds_data.get('bookmakers', []):
+                for market_data in bookmaker.get('markets', []):
+                    for outcome in market_data.get('outcomes', []):
+                        if outcome.get('description') in players_today:
+                            betting_data_list.append({
+                                'GAME_ID': odds_data['id'],
+                                'COMMENCE_TIME': pd.to_datetime(odds_data['commence_time']),
+                                'HOME_TEAM': odds_data['home_team'],
+                                'AWAY_TEAM': odds_data['away_team'],
+                                'PLAYER_NAME': outcome.get('description'),
+                                'MARKET': market_data.get('key'),
+                                'OVER_UNDER': outcome.get('name'),
+                                'PRICE': outcome.get('price'),
+                                'POINT': outcome.get('point'),
+                                'LAST_UPDATE': pd.to_datetime(market_data.get('last_update'))
+                            })
+        df_betting = pd.DataFrame(betting_data_list)
+        df_betting['COMMENCE_TIME'] = pd.to_datetime(df_betting['COMMENCE_TIME'], utc=True).apply(lambda x: x.replace(tzinfo=None))
+        df_betting['LAST_UPDATE'] = pd.to_datetime(df_betting['LAST_UPDATE'], utc=True).apply(lambda x: x.replace(tzinfo=None))
+        df_betting['GAME_DATE'] = df_betting['COMMENCE_TIME'].dt.date
+        df_betting.sort_values(by=['PLAYER_NAME', 'MARKET', 'OVER_UNDER', 'LAST_UPDATE'], ascending=[True, True, True, False], inplace=True)
+        df_betting.drop_duplicates(subset=['PLAYER_NAME', 'MARKET', 'OVER_UNDER'], keep='first', inplace=True)
+        df_betting['OVER_PRICE'] = df_betting.apply(lambda x: x['PRICE'] if x['OVER_UNDER'] == 'Over' else pd.NA, axis=1)
+        df_betting['UNDER_PRICE'] = df_betting.apply(lambda x: x['PRICE'] if x['OVER_UNDER'] == 'Under' else pd.NA, axis=1)
+        df_over = df_betting[df_betting['OVER_UNDER'] == 'Over'][['PLAYER_NAME', 'GAME_DATE', 'MARKET', 'OVER_PRICE', 'POINT', 'HOME_TEAM', 'AWAY_TEAM']].copy()
+        df_under = df_betting[df_betting['OVER_UNDER'] == 'Under'][['PLAYER_NAME', 'GAME_DATE', 'MARKET', 'UNDER_PRICE', 'POINT', 'HOME_TEAM', 'AWAY_TEAM']].copy()
+        df_final = pd.merge(pd.merge(df_over, df_under, on=over_under_keys, how='outer'), player_teams, on='PLAYER_NAME', how='left')
+        df_final['HOME_AWAY'] = df_final.apply(lambda x: 'Home' if x['TEAM_NAME'] == x['HOME_TEAM'] else 'Away', axis=1)
+        df_final['OPPONENT_NAME'] = df_final.apply(lambda x: x['AWAY_TEAM'] if x['HOME_AWAY'] == 'Home' else x['HOME_TEAM'], axis=1)
+        return df_final
+
+    benchmark_results = []
+    for name, normalize in [('nested loops', normalize_in_loops), ('normalize_odds_pages', lambda: normalize_odds_pages(pages, player_teams))]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            odds_board = normalize()
+        elapsed = (time.perf_counter() - start) / repeat
+        benchmark_results.append({'method': name, 'seconds': elapsed, 'pages': len(pages), 'rows': len(odds_board)})
+    return pd.DataFrame(benchmark_results)
+
+
+# Example usage
+#events, pages = load_recorded_odds_pages('data/odds_pages')
+#print(benchmark_odds_normalization(pages))
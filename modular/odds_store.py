@@ -0,0 +1,176 @@
+import os
+import sqlite3
+import pandas as pd
+
+#Odds history store
+#Every odds pull upserts its per bookmaker snapshots into a SQLite table keyed by
+#(player, game date, market, line, bookmaker, last update), so repeated pulls never duplicate rows.
+#The table is indexed by game date: the line movement of a day and the board as of any time are cheap to read.
+
+default_odds_db_path = 'data/odds_history.sqlite'
+
+odds_key_columns = ['PLAYER_NAME', 'GAME_DATE', 'MARKET', 'POINT', 'BOOKMAKER', 'LAST_UPDATE']
+odds_value_columns = ['OVER_PRICE', 'UNDER_PRICE', 'HOME_TEAM', 'AWAY_TEAM', 'TEAM_NAME', 'HOME_AWAY', 'OPPONENT_NAME', 'GAME_ID', 'COMMENCE_TIME']
+odds_columns = odds_key_columns + odds_value_columns
+
+create_odds_table_sql = """
+CREATE TABLE IF NOT EXISTS odds_snapshots (
+    PLAYER_NAME TEXT NOT NULL,
+    GAME_DATE TEXT NOT NULL,
+    MARKET TEXT NOT NULL,
+    POINT REAL NOT NULL,
+    BOOKMAKER TEXT NOT NULL,
+    LAST_UPDATE TEXT NOT NULL,
+    OVER_PRICE REAL,
+    UNDER_PRICE REAL,
+    HOME_TEAM TEXT,
+    AWAY_TEAM TEXT,
+    TEAM_NAME TEXT,
+    HOME_AWAY TEXT,
+    OPPONENT_NAME TEXT,
+    GAME_ID TEXT,
+    COMMENCE_TIME TEXT,
+    PRIMARY KEY (PLAYER_NAME, GAME_DATE, MARKET, POINT, BOOKMAKER, LAST_UPDATE)
+)
+"""
+create_odds_index_sql = "CREATE INDEX IF NOT EXISTS odds_snapshots_game_date ON odds_snapshots (GAME_DATE, LAST_UPDATE)"
+
+
+def connect_odds_store(db_path=default_odds_db_path):
+    """
+    Open the odds store, creating the table and the game date index if needed.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.execute(create_odds_table_sql)
+    connection.execute(create_odds_index_sql)
+    return connection
+
+
+def _to_store_rows(snapshots):
+    """
+    Snapshot rows as tuples in the table's column order: dates as ISO text, missing values as NULL.
+    """
+    rows = snapshots.reindex(columns=odds_columns).copy()
+    rows['GAME_DATE'] = pd.to_datetime(rows['GAME_DATE']).dt.strftime('%Y-%m-%d')
+    for col in ['LAST_UPDATE', 'COMMENCE_TIME']:
+        rows[col] = pd.to_datetime(rows[col]).dt.strftime('%Y-%m-%d %H:%M:%S')
+    rows = rows.astype(object).where(rows.notna(), None)
+    return list(rows.itertuples(index=False, name=None))
+
+
+def upsert_odds_snapshots(snapshots, db_path=default_odds_db_path):
+    """
+    Insert odds snapshots, replacing the prices of snapshots already stored with the same key.
+
+    Parameters:
+    - snapshots (DataFrame): Rows with odds_key_columns (e.g. from normalize_odds_snapshots) and any of odds_value_columns.
+    - db_path (str): The SQLite file.
+
+    Returns:
+    - int: Number of rows written. Rows missing a key column are skipped.
+    """
+    complete = snapshots.dropna(subset=odds_key_columns)
+    if len(complete) < len(snapshots):
+        print(f"Skipping {len(snapshots) - len(complete)} odds rows with missing key columns.")
+
+    update_columns = ', '.join(f"{col} = excluded.{col}" for col in odds_value_columns)
+    upsert_sql = (f"INSERT INTO odds_snapshots ({', '.join(odds_columns)}) VALUES ({', '.join('?' * len(odds_columns))}) "
+                  f"ON CONFLICT ({', '.join(odds_key_columns)}) DO UPDATE SET {update_columns}")
+    connection = connect_odds_store(db_path)
+    try:
+        with connection:
+            connection.executemany(upsert_sql, _to_store_rows(complete))
+    finally:
+        connection.close()
+    return len(complete)
+
+
+def import_odds_csv(csv_path, db_path=default_odds_db_path, bookmaker='unknown'):
+    """
+    Import an odds board CSV written by the previous append-only pull (data/final_odds_api_pull.csv).
+    The CSV has no bookmaker or update time: rows get `bookmaker` and the game date at midnight as LAST_UPDATE,
+    so rows appended several times collapse to one.
+    """
+    board = pd.read_csv(csv_path)
+    if 'BOOKMAKER' not in board.columns:
+        board['BOOKMAKER'] = bookmaker
+    if 'LAST_UPDATE' not in board.columns:
+        board['LAST_UPDATE'] = pd.to_datetime(board['GAME_DATE'])
+    return upsert_odds_snapshots(board, db_path)
+
+
+def initialize_odds_store(db_path=default_odds_db_path, legacy_csv_path='data/final_odds_api_pull.csv'):
+    """
+    Create the odds store on first use, importing the board CSV of the previous append-only pull when there is one.
+    """
+    if not os.path.exists(db_path) and legacy_csv_path and os.path.exists(legacy_csv_path):
+        print(f"Importing {import_odds_csv(legacy_csv_path, db_path)} odds rows from {legacy_csv_path}.")
+    connect_odds_store(db_path).close()
+
+
+def get_odds_store_version(db_path=default_odds_db_path):
+    """
+    Version of the odds store: changes whenever a pull writes to it.
+    """
+    if not os.path.exists(db_path):
+        return 'missing'
+    file_stat = os.stat(db_path)
+    return f"{file_stat.st_mtime_ns}-{file_stat.st_size}"
+
+
+def _date_filters(game_date=None, start_date=None, end_date=None, as_of=None):
+    conditions, params = [], []
+    if game_date is not None:
+        conditions.append('GAME_DATE = ?')
+        params.append(pd.Timestamp(game_date).strftime('%Y-%m-%d'))
+    if start_date is not None:
+        conditions.append('GAME_DATE >= ?')
+        params.append(pd.Timestamp(start_date).strftime('%Y-%m-%d'))
+    if end_date is not None:
+        conditions.append('GAME_DATE <= ?')
+        params.append(pd.Timestamp(end_date).strftime('%Y-%m-%d'))
+    if as_of is not None:
+        conditions.append('LAST_UPDATE <= ?')
+        params.append(pd.Timestamp(as_of).strftime('%Y-%m-%d %H:%M:%S'))
+    return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+
+def load_odds_history(db_path=default_odds_db_path, game_date=None, start_date=None, end_date=None, players=None):
+    """
+    All stored snapshots (the line movement) for a game date or a range of game dates, oldest update first.
+    """
+    where, params = _date_filters(game_date, start_date, end_date)
+    connection = connect_odds_store(db_path)
+    try:
+        history = pd.read_sql_query(f"SELECT * FROM odds_snapshots{where} ORDER BY GAME_DATE, PLAYER_NAME, MARKET, POINT, LAST_UPDATE", connection, params=params)
+    finally:
+        connection.close()
+    if players is not None:
+        history = history[history['PLAYER_NAME'].isin(set(players))].reset_index(drop=True)
+    return history
+
+
+def load_latest_odds(db_path=default_odds_db_path, as_of=None, game_date=None, start_date=None, end_date=None, by_bookmaker=False):
+    """
+    The odds board as of a time: the latest snapshot updated at or before `as_of` (any time by default) of every
+    (player, game date, market, line), across bookmakers or, with by_bookmaker, per bookmaker.
+
+    Returns:
+    - DataFrame: The stored columns with GAME_DATE as 'YYYY-MM-DD' text, like the previous board CSV.
+    """
+    where, params = _date_filters(game_date, start_date, end_date, as_of)
+    partition = 'PLAYER_NAME, GAME_DATE, MARKET, POINT' + (', BOOKMAKER' if by_bookmaker else '')
+    latest_sql = (f"SELECT {', '.join(odds_columns)} FROM ("
+                  f"SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY LAST_UPDATE DESC, BOOKMAKER) AS update_rank "
+                  f"FROM odds_snapshots{where}) WHERE update_rank = 1 ORDER BY GAME_DATE, PLAYER_NAME, MARKET, POINT")
+    connection = connect_odds_store(db_path)
+    try:
+        return pd.read_sql_query(latest_sql, connection, params=params)
+    finally:
+        connection.close()
+
+
+# Example usage
+#import_odds_csv('data/final_odds_api_pull.csv')
+#board = load_latest_odds(game_date='2024-03-19')
+#line_movement = load_odds_history(game_date='2024-03-19', players=['Brandon Ingram'])
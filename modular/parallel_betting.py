@@ -0,0 +1,152 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from modular.schema import add_derived_stat_columns
+from modular.feature_store import build_feature_store
+from modular.betting_functions import generate_betting_options, generate_player_betting_options, stack_betting_options, concat_stacked_betting_options, betting_options_frame
+
+#League-wide betting options on a process pool
+#The game logs are laid out once as read-only arrays in shared memory: the player, date and opponent columns as
+#codes into small lookup tables and the stat columns as one float matrix, rows grouped by player. Workers attach
+#to the arrays when they start, so a task is only a list of player codes; each worker builds the feature store of
+#its players and returns its options as flat arrays that are merged in player order, the same order as the serial run.
+
+# Arrays attached by each worker process
+worker_game_logs = {}
+
+
+def _share_array(array, blocks):
+    """
+    Copy an array into a new shared memory block, returning the (name, shape, dtype) workers attach with.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+    blocks.append(block)
+    return block.name, array.shape, array.dtype.str
+
+
+def _factorize(values):
+    """
+    Codes and lookup table of a column, the table of a categorical column holds its plain values in code order.
+    """
+    codes, uniques = pd.factorize(values)
+    if isinstance(uniques, pd.CategoricalIndex):
+        uniques = uniques.astype(uniques.categories.dtype)
+    return codes, pd.Index(uniques)
+
+
+def _attach_game_logs(array_specs, uniques, settings):
+    """
+    Worker initializer: map the shared arrays as read-only numpy views.
+    """
+    for key, (name, shape, dtype) in array_specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        view = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        view.flags.writeable = False
+        worker_game_logs[key] = view
+        worker_game_logs.setdefault('blocks', []).append(block)
+    worker_game_logs['uniques'] = uniques
+    worker_game_logs['settings'] = settings
+
+
+def _player_rows(player_codes):
+    """
+    Game log rows of the players, in the order of the codes.
+    """
+    offsets = worker_game_logs['player_offsets']
+    return np.concatenate([np.arange(offsets[code], offsets[code + 1]) for code in player_codes]) if len(player_codes) else np.array([], dtype=int)
+
+
+def _generate_options_task(player_codes):
+    """
+    Betting options of a shard of players, run in a worker process.
+    """
+    uniques, settings = worker_game_logs['uniques'], worker_game_logs['settings']
+    rows = _player_rows(player_codes)
+    # Decode the shared codes through the lookup tables (code -1 is a missing value) instead of pickling the logs
+    player_logs = pd.DataFrame({col: pd.Categorical.from_codes(worker_game_logs[col][rows], categories=uniques[col]).astype(uniques[col].dtype)
+                                for col in ['PLAYER_NAME', 'GAME_DATE', 'OPPONENT_NAME']})
+    for i, stat in enumerate(settings['stats']):
+        player_logs[stat] = worker_game_logs['stat_values'][rows, i]
+    feature_store = build_feature_store(player_logs, stats=settings['stats'], n_games=settings['n_games'])
+
+    results = []
+    player_offsets = worker_game_logs['player_offsets']
+    offsets = np.r_[0, np.cumsum(player_offsets[player_codes + 1] - player_offsets[player_codes])]
+    for i, code in enumerate(player_codes):
+        game_dates = player_logs['GAME_DATE'].iloc[offsets[i]:offsets[i + 1]].unique()
+        results.extend(generate_player_betting_options(feature_store, uniques['PLAYER_NAME'][code], game_dates, settings))
+    # Flat arrays pickle much faster than thousands of small blocks
+    return stack_betting_options(results)
+
+
+def generate_betting_options_parallel(player_data, players, settings, max_workers=None, shards_per_worker=4):
+    """
+    generate_betting_options for many players on a process pool, same rows in the same order as the serial run.
+
+    Parameters:
+    - player_data (DataFrame): Player game logs.
+    - players (iterable): The players to score, players without games are skipped.
+    - settings (dict): The scoring settings built by generate_betting_options.
+    - max_workers (int): Worker processes, defaults to the number of cores.
+    - shards_per_worker (int): Shards of consecutive players per worker, more shards balance uneven players better.
+    """
+    stats = settings['stats']
+    logs = add_derived_stat_columns(player_data)
+    player_codes, player_uniques = _factorize(logs['PLAYER_NAME'])
+    # Rows grouped by player, keeping their order within a player (the order their game dates are scored in)
+    order = np.argsort(player_codes, kind='stable')
+    order = order[player_codes[order] >= 0]
+    player_offsets = np.r_[0, np.cumsum(np.bincount(player_codes[order], minlength=len(player_uniques)))]
+
+    uniques = {'PLAYER_NAME': player_uniques}
+    arrays = {'PLAYER_NAME': player_codes[order].astype(np.int32), 'player_offsets': player_offsets.astype(np.int64)}
+    for col in ['GAME_DATE', 'OPPONENT_NAME']:
+        codes, uniques[col] = _factorize(logs[col])
+        arrays[col] = codes[order].astype(np.int32)
+    arrays['stat_values'] = logs[stats].to_numpy(dtype=float)[order].reshape(len(order), len(stats))
+
+    requested = uniques['PLAYER_NAME'].get_indexer(pd.Index(list(players), dtype=object))
+    requested = requested[requested >= 0]
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+    shards = [shard for shard in np.array_split(requested, max(min(len(requested), max_workers * shards_per_worker), 1)) if len(shard)]
+
+    blocks = []
+    try:
+        array_specs = {key: _share_array(np.ascontiguousarray(array), blocks) for key, array in arrays.items()}
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach_game_logs, initargs=(array_specs, uniques, settings)) as executor:
+            # map returns the shards in submission order, so the merged rows follow the player order
+            shard_results = list(executor.map(_generate_options_task, shards))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    # Without any requested player in the logs the result is the serial run's empty frame
+    return betting_options_frame(concat_stacked_betting_options(shard_results) if shard_results else stack_betting_options([]), settings)
+
+
+def benchmark_betting_options(player_data, league_std_data, workers=(1, 2, 4, 8), **kwargs):
+    """
+    Time league-wide generate_betting_options with 1 to N worker processes and check every run returns the serial rows.
+    """
+    timings = []
+    serial_options = None
+    for max_workers in workers:
+        start = time.perf_counter()
+        options = generate_betting_options(player_data, league_std_data, [], [None], all_players=True, max_workers=max_workers, **kwargs)
+        seconds = time.perf_counter() - start
+        if serial_options is None:
+            serial_options = options
+        matches_serial = options.equals(serial_options)
+        timings.append({'workers': max_workers, 'seconds': seconds, 'options': len(options), 'matches_serial': matches_serial})
+        print(f"{max_workers} workers: {len(options)} options in {seconds:.2f}s (speedup {timings[0]['seconds'] / seconds:.2f}x, same rows: {matches_serial})")
+    return pd.DataFrame(timings)
+
+
+# Example usage
+#if __name__ == '__main__':
+#    data = load_game_logs('data/player_game_logs_winr.parquet')
+#    benchmark_betting_options(data, prepare_league_std_data(data), workers=(1, 2, 4, os.cpu_count()))
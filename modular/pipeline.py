@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import pandas as pd
+from modular.player_game_logs import load_nba_player_game_logs, prepare_upcoming_games_data, combine_with_upcoming_games, get_current_nba_season_year
+from modular.storage import load_game_logs
+from modular.metrics_functions import prepare_league_std_data
+from modular.betting_functions import betting_categories, generate_betting_options, evaluate_bets, scan_odds_edges
+from modular.backtest import prepare_backtest_odds
+from modular.odds_store import default_odds_db_path, initialize_odds_store, upsert_odds_snapshots, load_latest_odds
+
+#Daily recommendation pipeline
+#The steps the app runs interactively chained as explicit stages a cron job can run without the UI:
+#game log refresh -> upcoming game expansion -> features -> odds pull -> betting options -> evaluation and daily board.
+#Each stage's outputs are written to data/pipeline/<date>/ and recorded in a manifest with a fingerprint of the
+#stage's parameters and the content hashes of its input files. A stage whose fingerprint matches and whose outputs
+#are unchanged on disk is skipped, so a rerun after a partial failure resumes at the stage that failed.
+#The game log refresh and the odds pull read sources that change during the day (the stats API, the odds API and
+#the odds store), so they run every time; the stages after them are skipped when the files they write are unchanged.
+#
+#Run with: python -m modular.pipeline [--date YYYY-MM-DD] [--stages ...] [--force ...]
+
+default_pipeline_config = {
+    'date': None,  # Today by default
+    'seasons': None,  # The current season by default
+    'min_avg_minutes': 20,
+    'game_logs_csv': 'data/player_game_logs_winr.csv',
+    'season_games_csv': 'data/23_24_season_games.csv',
+    'odds_db_path': default_odds_db_path,
+    'cache_dir': 'data/pipeline',
+    'api_key': None,  # ODDS_API_KEY by default, without one the odds stage reads the board from the odds store
+    'n_games': 10,
+    'league_std_rate': 0.9,
+    'probability_high': 0.9,
+    'probability_low': 0.1,
+    'max_workers': 1,
+}
+
+
+def hash_file(path, chunk_size=1 << 20):
+    """
+    sha256 of a file's content, None when the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, write):
+    """
+    Write a file through write(tmp_path) and move it into place, so an interrupted stage never leaves a partial output.
+    """
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def get_pipeline_paths(config):
+    """
+    Files read and written by the stages: the game logs and the schedule at their usual paths, the stage outputs in the date's run directory.
+    """
+    run_dir = os.path.join(config['cache_dir'], config['date'])
+    return {
+        'run_dir': run_dir,
+        'manifest': os.path.join(run_dir, 'manifest.json'),
+        'game_logs': config['game_logs_csv'],
+        'season_games': config['season_games_csv'],
+        'upcoming_games': os.path.join(run_dir, 'upcoming_games.parquet'),
+        'combined': os.path.join(run_dir, 'combined_game_logs.parquet'),
+        'league_std': os.path.join(run_dir, 'league_std.csv'),
+        'odds_store': config['odds_db_path'],
+        'odds_board': os.path.join(run_dir, 'odds_board.csv'),
+        'betting_options': os.path.join(run_dir, 'betting_options.parquet'),
+        'evaluated_bets': os.path.join(run_dir, 'evaluated_bets.parquet'),
+        'evaluation_summary': os.path.join(run_dir, 'evaluation_summary.json'),
+        'daily_board': os.path.join(run_dir, 'daily_board.csv'),
+        'odds_edges': os.path.join(run_dir, 'odds_edges.csv'),
+    }
+
+
+def refresh_game_logs(config, paths):
+    # Incremental refresh: only the games played since the last refresh are fetched
+    load_nba_player_game_logs(config['seasons'], min_avg_minutes=config['min_avg_minutes'], save_path=paths['game_logs'], incremental=True)
+
+
+def expand_upcoming_games(config, paths):
+    upcoming_games = prepare_upcoming_games_data(paths['season_games'], paths['game_logs'], expand_with_players=True, today=config['date'])
+    _write_atomic(paths['upcoming_games'], lambda tmp: upcoming_games.to_parquet(tmp, index=False))
+
+
+def compute_features(config, paths):
+    previous_games = load_game_logs(paths['game_logs']).sort_values(by='GAME_DATE')
+    data = combine_with_upcoming_games(previous_games, pd.read_parquet(paths['upcoming_games']))
+    # League spread of the games through the run date, like the Forecasting page
+    league_std_data = prepare_league_std_data(data[data['GAME_DATE'] <= pd.Timestamp(config['date'])], n_games=config['n_games'])
+    _write_atomic(paths['combined'], lambda tmp: data.to_parquet(tmp, index=False))
+    _write_atomic(paths['league_std'], lambda tmp: league_std_data.to_csv(tmp, index=False))
+
+
+def pull_odds(config, paths):
+    initialize_odds_store(config['odds_db_path'])
+    if config['api_key']:
+        # requests is only loaded by runs that pull odds
+        from modular.odds_fetcher import fetch_odds_pages, nba_player_prop_markets
+        from modular.odds_normalization import normalize_odds_snapshots
+        data = pd.read_parquet(paths['combined'])
+        todays_players = data.loc[data['GAME_DATE'] == pd.Timestamp(config['date']), ['PLAYER_NAME', 'TEAM_NAME']]
+        games_data, odds_pages = fetch_odds_pages(config['api_key'], nba_player_prop_markets)
+        upsert_odds_snapshots(normalize_odds_snapshots(odds_pages, todays_players), db_path=config['odds_db_path'])
+    else:
+        print("No odds API key, using the odds already in the odds store.")
+    odds_board = load_latest_odds(db_path=config['odds_db_path'], game_date=config['date'])
+    _write_atomic(paths['odds_board'], lambda tmp: odds_board.to_csv(tmp, index=False))
+
+
+def generate_options(config, paths):
+    data = pd.read_parquet(paths['combined'])
+    league_std_data = pd.read_csv(paths['league_std'])
+    betting_options = generate_betting_options(data, league_std_data, [], [None], all_players=True, n_games=config['n_games'],
+                                               league_std_rate=config['league_std_rate'], probability_high=config['probability_high'],
+                                               probability_low=config['probability_low'], max_workers=config['max_workers'])
+    _write_atomic(paths['betting_options'], lambda tmp: betting_options.to_parquet(tmp, index=False))
+
+
+def summarize_evaluation(evaluated_bets, date, n_games):
+    """
+    Hit rate of the settled bets over the last n game dates before the run date, overall and per stat.
+    """
+    settled = evaluated_bets[evaluated_bets['Bet Outcome'].notna() & (evaluated_bets['GAME_DATE'] < pd.Timestamp(date))]
+    recent_dates = settled['GAME_DATE'].drop_duplicates().nlargest(n_games)
+    settled = settled[settled['GAME_DATE'].isin(recent_dates)]
+    hits = settled['Bet Outcome'].astype(bool)
+    summary = {
+        'date': date,
+        'first_game_date': recent_dates.min().strftime('%Y-%m-%d') if len(recent_dates) else None,
+        'bets': int(len(settled)),
+        'hits': int(hits.sum()),
+        'hit_rate': float(hits.mean()) if len(settled) else None,
+        'by_stat': {},
+    }
+    for stat, stat_hits in hits.groupby(settled['Stat'], sort=True):
+        summary['by_stat'][stat] = {'bets': int(len(stat_hits)), 'hits': int(stat_hits.sum()), 'hit_rate': float(stat_hits.mean())}
+    return summary
+
+
+def evaluate_and_board(config, paths):
+    data = pd.read_parquet(paths['combined'])
+    betting_options = pd.read_parquet(paths['betting_options'])
+    odds_board = pd.read_csv(paths['odds_board'])
+
+    evaluated_bets = evaluate_bets(betting_options, data)
+    summary = summarize_evaluation(evaluated_bets, config['date'], config['n_games'])
+
+    # Today's options with the posted prices of their line, when there is one
+    todays_options = betting_options[betting_options['GAME_DATE'] == pd.Timestamp(config['date'])]
+    if len(odds_board):
+        posted_lines = prepare_backtest_odds(odds_board, list(betting_categories)).rename(columns={'STAT': 'Stat', 'POINT': 'Threshold'})
+        daily_board = todays_options.merge(posted_lines, on=['PLAYER_NAME', 'GAME_DATE', 'Stat', 'Threshold'], how='left')
+        odds_edges = scan_odds_edges(odds_board, data[data['GAME_DATE'] < pd.Timestamp(config['date'])], n_games=config['n_games'])
+        if odds_edges.attrs['skipped_markets']:
+            print(f"Odds edges: skipped the lines of markets without a stat column {odds_edges.attrs['skipped_markets']}")
+    else:
+        daily_board = todays_options.assign(OVER_PRICE=float('nan'), UNDER_PRICE=float('nan'))
+        odds_edges = pd.DataFrame()
+
+    _write_atomic(paths['evaluated_bets'], lambda tmp: evaluated_bets.to_parquet(tmp, index=False))
+    _write_atomic(paths['daily_board'], lambda tmp: daily_board.to_csv(tmp, index=False))
+    _write_atomic(paths['odds_edges'], lambda tmp: odds_edges.to_csv(tmp, index=False))
+    with open(paths['evaluation_summary'] + '.tmp', 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(paths['evaluation_summary'] + '.tmp', paths['evaluation_summary'])
+    print(f"Daily board: {len(daily_board)} options for {config['date']}, last {config['n_games']} game dates hit rate: {summary['hit_rate']}")
+
+
+# Stages in run order: the files they read and write (keys of get_pipeline_paths) and the config values they depend on.
+# optional_inputs are hashed into the fingerprint but may not exist yet, always_run stages fetch new data on every run.
+pipeline_stages = [
+    {'name': 'game_logs', 'inputs': [], 'outputs': ['game_logs'], 'params': ['date', 'seasons', 'min_avg_minutes'], 'run': refresh_game_logs, 'always_run': True},
+    {'name': 'upcoming_games', 'inputs': ['season_games', 'game_logs'], 'outputs': ['upcoming_games'], 'params': ['date'], 'run': expand_upcoming_games},
+    {'name': 'features', 'inputs': ['game_logs', 'upcoming_games'], 'outputs': ['combined', 'league_std'], 'params': ['date', 'n_games'], 'run': compute_features},
+    {'name': 'odds', 'inputs': ['combined'], 'optional_inputs': ['odds_store'], 'outputs': ['odds_board'], 'params': ['date', 'has_api_key'],
+     'run': pull_odds, 'always_run': True},
+    {'name': 'betting_options', 'inputs': ['combined', 'league_std'], 'outputs': ['betting_options'],
+     'params': ['n_games', 'league_std_rate', 'probability_high', 'probability_low'], 'run': generate_options},
+    {'name': 'evaluation', 'inputs': ['combined', 'betting_options', 'odds_board'], 'outputs': ['evaluated_bets', 'evaluation_summary', 'daily_board', 'odds_edges'],
+     'params': ['date', 'n_games'], 'run': evaluate_and_board},
+]
+stage_names = [stage['name'] for stage in pipeline_stages]
+
+
+def stage_fingerprint(stage, config, paths):
+    """
+    sha256 of the stage name, its parameters and the content hashes of its input files.
+    """
+    # The API key itself is never written to the manifest, only whether there is one
+    params = {name: (bool(config['api_key']) if name == 'has_api_key' else config[name]) for name in stage['params']}
+    inputs = {name: hash_file(paths[name]) for name in stage['inputs'] + stage.get('optional_inputs', [])}
+    payload = json.dumps({'stage': stage['name'], 'params': params, 'inputs': inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, manifest_path):
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def is_stage_current(stage, manifest, fingerprint, paths):
+    """
+    Whether the stage last ran with the same fingerprint and its outputs are still the files it wrote.
+    """
+    record = manifest.get(stage['name'])
+    if record is None or record['fingerprint'] != fingerprint:
+        return False
+    return all(hash_file(paths[name]) == record['outputs'].get(name) for name in stage['outputs'])
+
+
+def run_pipeline(config=None, stages=None, force=()):
+    """
+    Run the daily pipeline, skipping the stages whose inputs and parameters are unchanged since their last run.
+    The game log refresh and the odds pull always run, to pick up the games and lines posted since the last run.
+
+    Parameters:
+    - config (dict): Overrides of default_pipeline_config.
+    - stages (list): Names of the stages to run, all of them by default. Stages left out must have run before
+      (or, for game_logs, the game logs must exist), their outputs are read as they are.
+    - force (iterable): Names of stages to rerun even when they are current, 'all' reruns every stage.
+
+    Returns:
+    - dict: The manifest of the run, one record per stage with its fingerprint, output hashes and timing.
+    """
+    config = {**default_pipeline_config, **(config or {})}
+    config['date'] = pd.Timestamp(config['date'] if config['date'] is not None else pd.Timestamp.now()).strftime('%Y-%m-%d')
+    config['seasons'] = config['seasons'] or [get_current_nba_season_year()]
+    if config['api_key'] is None:
+        config['api_key'] = os.environ.get('ODDS_API_KEY')
+    stages = stage_names if stages is None else list(stages)
+    unknown_stages = set(stages) | (set(force) - {'all'})
+    unknown_stages -= set(stage_names)
+    if unknown_stages:
+        raise ValueError(f"Unknown pipeline stages {sorted(unknown_stages)}, expected some of {stage_names}.")
+
+    paths = get_pipeline_paths(config)
+    os.makedirs(paths['run_dir'], exist_ok=True)
+    manifest = load_manifest(paths['manifest'])
+
+    for stage in pipeline_stages:
+        if stage['name'] not in stages:
+            continue
+        missing_inputs = [paths[name] for name in stage['inputs'] if not os.path.exists(paths[name])]
+        if missing_inputs:
+            raise FileNotFoundError(f"Stage '{stage['name']}' is missing its inputs {missing_inputs}, run the stages that write them first.")
+
+        fingerprint = stage_fingerprint(stage, config, paths)
+        if not stage.get('always_run') and 'all' not in force and stage['name'] not in force and is_stage_current(stage, manifest, fingerprint, paths):
+            print(f"[{stage['name']}] up to date, skipped")
+            continue
+
+        print(f"[{stage['name']}] running")
+        start = time.perf_counter()
+        stage['run'](config, paths)
+        seconds = time.perf_counter() - start
+        # Recorded after every stage, so a failure in a later stage keeps the work done so far
+        manifest[stage['name']] = {
+            'fingerprint': fingerprint,
+            'outputs': {name: hash_file(paths[name]) for name in stage['outputs']},
+            'seconds': round(seconds, 3),
+            'finished_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+        }
+        save_manifest(manifest, paths['manifest'])
+        print(f"[{stage['name']}] done in {seconds:.2f}s")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the daily betting board: refresh the game logs, pull the odds, score and evaluate the betting options.')
+    parser.add_argument('--date', help='Run date (YYYY-MM-DD), today by default.')
+    parser.add_argument('--stages', nargs='+', choices=stage_names, help='Stages to run, all by default.')
+    parser.add_argument('--force', nargs='+', default=[], choices=stage_names + ['all'], help='Stages to rerun even when their inputs are unchanged.')
+    parser.add_argument('--seasons', nargs='+', help="Seasons to refresh (e.g. 2023-24), the current season by default.")
+    parser.add_argument('--min-avg-minutes', type=float, default=default_pipeline_config['min_avg_minutes'])
+    parser.add_argument('--game-logs-csv', default=default_pipeline_config['game_logs_csv'])
+    parser.add_argument('--season-games-csv', default=default_pipeline_config['season_games_csv'])
+    parser.add_argument('--odds-db-path', default=default_pipeline_config['odds_db_path'])
+    parser.add_argument('--cache-dir', default=default_pipeline_config['cache_dir'])
+    parser.add_argument('--api-key', help='The Odds API key, ODDS_API_KEY by default.')
+    parser.add_argument('--n-games', type=int, default=default_pipeline_config['n_games'])
+    parser.add_argument('--league-std-rate', type=float, default=default_pipeline_config['league_std_rate'])
+    parser.add_argument('--probability-high', type=float, default=default_pipeline_config['probability_high'])
+    parser.add_argument('--probability-low', type=float, default=default_pipeline_config['probability_low'])
+    parser.add_argument('--max-workers', type=int, default=default_pipeline_config['max_workers'], help='Worker processes scoring the betting options.')
+    args = parser.parse_args(argv)
+
+    config = {key: value for key, value in vars(args).items() if key not in ('stages', 'force')}
+    try:
+        run_pipeline(config, stages=args.stages, force=args.force)
+    except Exception as e:
+        print(f"Pipeline stopped: {e!r}, rerun to resume from the failed stage.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,16 @@
 import pandas as pd
 from datetime import datetime, timedelta
-from nba_api.stats.endpoints import commonallplayers, playergamelog, leaguedashplayerstats, leaguegamefinder
-from nba_api.stats.static import teams
 import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
 import os
+from modular.storage import save_game_logs, load_game_logs
+from modular.schema import apply_game_log_schema
+from modular.team_metadata import get_team_tables, parse_matchups, team_names_to_abbreviations
+# The nba_api endpoints are imported by the functions that call them: importing the module (the app, the pipeline,
+# process pool workers) never loads nba_api, only fetching game logs does
 
 
 def get_current_nba_season_year():
@@ -15,6 +21,7 @@ def get_current_nba_season_year():
         return str(current_date.year - 1) + "-" + str(current_date.year)[2:]
 
 def calculate_cumulative_win_rates(season):
+    from nba_api.stats.endpoints import leaguegamefinder
     try:
         # Adjust the season start date based on the typical NBA season start dates
         season_start_date = season.split('-')[0] + "-10-01"  # Assuming October 1st as a generic start date
@@ -32,22 +39,197 @@ def calculate_cumulative_win_rates(season):
         return pd.DataFrame()
     
 
-def get_win_rate(row, team_type, all_games):
-    game_date = row['GAME_DATE']
-    team_name = row[team_type]
-    team_games = all_games[(all_games['TEAM_NAME'] == team_name) & (all_games['GAME_DATE'] < game_date)]
-    if not team_games.empty:
-        return team_games.iloc[-1]['CUMULATIVE_WIN_RATE']
-    else:
-        return 0.0
+def get_win_rates_asof(player_data, team_type, all_games):
+    """
+    The team's cumulative win rate after its last game strictly before each row's GAME_DATE,
+    0.0 when the team has not played yet.
+
+    Parameters:
+    - player_data (DataFrame): Rows with 'GAME_DATE' and the team column.
+    - team_type (str): 'TEAM_NAME' or 'OPPONENT_NAME'.
+    - all_games (DataFrame): Output of calculate_cumulative_win_rates.
+
+    Returns:
+    - Series: The win rates aligned with player_data's index.
+    """
+    left = pd.DataFrame({
+        'GAME_DATE': pd.to_datetime(player_data['GAME_DATE']).astype('datetime64[ns]'),
+        'TEAM_NAME': player_data[team_type].fillna('').astype(str),
+        'ROW': np.arange(len(player_data)),
+    }).sort_values('GAME_DATE', kind='mergesort')
+    right = all_games[['GAME_DATE', 'TEAM_NAME', 'CUMULATIVE_WIN_RATE']].copy()
+    right['GAME_DATE'] = right['GAME_DATE'].astype('datetime64[ns]')
+    right = right.sort_values('GAME_DATE', kind='mergesort')
+
+    # Strictly-before as-of join per team: the team's latest game before the date, games on the date itself are not counted yet
+    merged = pd.merge_asof(left, right, on='GAME_DATE', by='TEAM_NAME', direction='backward', allow_exact_matches=False)
+    win_rates = np.zeros(len(player_data))
+    win_rates[merged['ROW'].to_numpy()] = merged['CUMULATIVE_WIN_RATE'].fillna(0.0).to_numpy()
+    return pd.Series(win_rates, index=player_data.index)
+
+
+# Columns returned by playergamelog.PlayerGameLog, in order
+game_log_columns = ['SEASON_ID', 'Player_ID', 'Game_ID', 'GAME_DATE', 'MATCHUP', 'WL', 'MIN', 'FGM', 'FGA', 'FG_PCT', 'FG3M', 'FG3A', 'FG3_PCT',
+                    'FTM', 'FTA', 'FT_PCT', 'OREB', 'DREB', 'REB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'PLUS_MINUS', 'VIDEO_AVAILABLE']
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by the fetch workers: allows bursts of up to `capacity` requests
+    and `rate` requests per second on average.
+    """
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def fetch_player_game_log(player_id, season, rate_limiter, max_retries=3, backoff=1.0, game_log_endpoint=None):
+    """
+    Fetch one player's game log, waiting on the rate limiter before every attempt and retrying
+    with exponential backoff (plus jitter) on errors.
+    """
+    if game_log_endpoint is None:
+        from nba_api.stats.endpoints import playergamelog
+        game_log_endpoint = playergamelog.PlayerGameLog
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire()
+        try:
+            return game_log_endpoint(player_id=player_id, season=season).get_data_frames()[0]
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+
+def print_fetch_progress(completed, total, player_name, error=None):
+    """
+    Default progress reporting for fetch_player_game_logs.
+    """
+    if error is not None:
+        print(f"[{completed}/{total}] Error fetching game logs for {player_name}: {error}")
+    elif completed % 25 == 0 or completed == total:
+        print(f"[{completed}/{total}] Fetched game logs up to {player_name}")
+
+
+def fetch_player_game_logs(players, season, max_workers=4, requests_per_second=1.5, max_retries=3, backoff=1.0, progress_callback=print_fetch_progress, game_log_endpoint=None):
+    """
+    Fetch the game logs of several players concurrently.
+
+    Parameters:
+    - players (DataFrame): Players to fetch, with 'PLAYER_ID' and 'PLAYER_NAME' columns.
+    - season (str): The season, e.g. '2023-24'.
+    - max_workers (int): Size of the worker pool.
+    - requests_per_second (float): Rate limit shared by all workers (stats.nba.com blocks bursts).
+    - max_retries (int), backoff (float): Retries per player and base backoff in seconds.
+    - progress_callback (callable): Called as progress_callback(completed, total, player_name, error) after each player.
+    - game_log_endpoint (callable): Replacement for playergamelog.PlayerGameLog, e.g. a local stub for benchmarks.
+
+    Returns:
+    - list of tuples: (player_id, player_name, DataFrame or None on failure), in the order of `players`.
+    """
+    rate_limiter = TokenBucket(requests_per_second)
+    players = list(players[['PLAYER_ID', 'PLAYER_NAME']].itertuples(index=False, name=None))
+    results = [None] * len(players)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(fetch_player_game_log, player_id, season, rate_limiter, max_retries, backoff, game_log_endpoint): i
+            for i, (player_id, player_name) in enumerate(players)
+        }
+        for completed, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            player_id, player_name = players[i]
+            try:
+                results[i] = (player_id, player_name, future.result())
+                error = None
+            except Exception as e:
+                results[i] = (player_id, player_name, None)
+                error = e
+            if progress_callback:
+                progress_callback(completed, len(players), player_name, error)
 
+    return results
 
 
-def load_nba_player_game_logs(seasons, min_avg_minutes=30.0, save_path='data/player_game_logs.csv'):
+def load_existing_game_logs(save_path):
+    """
+    Load previously saved game logs for an incremental refresh, keeping Game_ID as the zero padded string the API returns.
+    """
+    if not os.path.exists(save_path):
+        return pd.DataFrame()
+    existing_data = pd.read_csv(save_path, dtype={'Game_ID': str})
+    existing_data['Game_ID'] = existing_data['Game_ID'].str.zfill(10)
+    existing_data['GAME_DATE'] = pd.to_datetime(existing_data['GAME_DATE'])
+    return existing_data
+
+
+def fetch_new_game_logs(season, latest_dates, rate_limiter, max_retries=3, backoff=1.0, league_game_log_endpoint=None):
+    """
+    Fetch the games played after each player's latest saved game with a single league-wide game log request.
+
+    Parameters:
+    - season (str): The season, e.g. '2023-24'.
+    - latest_dates (Series): Latest saved GAME_DATE indexed by Player_ID, for the players to update.
+    - rate_limiter (TokenBucket): Shared rate limiter.
+    - max_retries, backoff: Retries with exponential backoff (plus jitter) on errors, like fetch_player_game_log.
+    - league_game_log_endpoint (callable): Replacement for leaguegamelog.LeagueGameLog.
+
+    Returns:
+    - DataFrame: The new games in the playergamelog format with a PLAYER_NAME column.
+    """
+    if league_game_log_endpoint is None:
+        from nba_api.stats.endpoints import leaguegamelog
+        league_game_log_endpoint = leaguegamelog.LeagueGameLog
+    date_from = latest_dates.min().strftime('%m/%d/%Y')
+
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire()
+        try:
+            league_logs = league_game_log_endpoint(season=season, player_or_team_abbreviation='P', date_from_nullable=date_from).get_data_frames()[0]
+            break
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
+    league_logs = league_logs.rename(columns={'PLAYER_ID': 'Player_ID', 'GAME_ID': 'Game_ID'})
+    league_logs = league_logs[league_logs['Player_ID'].isin(latest_dates.index)]
+    league_logs['GAME_DATE'] = pd.to_datetime(league_logs['GAME_DATE'])
+    # Keep only games after the player's own latest saved game
+    is_new = league_logs['GAME_DATE'] > league_logs['Player_ID'].map(latest_dates)
+    return league_logs.loc[is_new, game_log_columns + ['PLAYER_NAME']].reset_index(drop=True)
+
+
+def load_nba_player_game_logs(seasons, min_avg_minutes=30.0, save_path='data/player_game_logs.csv', max_workers=4, requests_per_second=1.5, max_retries=3, progress_callback=print_fetch_progress, game_log_endpoint=None, incremental=False, league_game_log_endpoint=None):
+    """
+    Fetch the game logs of every player averaging at least min_avg_minutes, add team, opponent, win rate and
+    home/away columns, and save them to save_path.
+    With incremental=True the existing save_path is kept: players already in it only get the games after their
+    latest saved game (one league-wide request), new players get their full season, and only the new rows
+    have their derived columns computed before being appended.
+    """
+    from nba_api.stats.endpoints import commonallplayers, leaguedashplayerstats
     if not isinstance(seasons, list):
         seasons = [seasons]
 
-    new_players_data = pd.DataFrame()
+    # Per-player frames are buffered and combined once, concatenating inside the loop copies the growing frame every time
+    player_frames = []
+    existing_data = load_existing_game_logs(save_path) if incremental else pd.DataFrame()
 
     for season in seasons:
         print(f"Processing season {season}...")
@@ -70,13 +252,11 @@ def load_nba_player_game_logs(seasons, min_avg_minutes=30.0, save_path='data/pla
             print(f"No players meet the minimum average minutes threshold for season {season}.")
             continue
 
-        teams_list = teams.get_teams()
-        if not teams_list:
+        team_abbrev_to_full_name = get_team_tables()['abbreviation_to_name']
+        if not team_abbrev_to_full_name:
             print("Failed to load NBA teams list.")
             continue
 
-        team_abbrev_to_full_name = {team['abbreviation']: team['full_name'] for team in teams_list}
-
         try:
             all_games = calculate_cumulative_win_rates(season)
             if all_games.empty:
@@ -86,39 +266,71 @@ def load_nba_player_game_logs(seasons, min_avg_minutes=30.0, save_path='data/pla
             print(f"Error calculating win rates for season {season}: {e}")
             continue
 
-        for index, player in eligible_players.iterrows():
+        player_logs = []
+        if not existing_data.empty:
+            latest_dates = existing_data.groupby('Player_ID')['GAME_DATE'].max()
+            latest_dates = latest_dates[latest_dates.index.isin(eligible_players['PLAYER_ID'])]
+            if not latest_dates.empty:
+                try:
+                    delta_data = fetch_new_game_logs(season, latest_dates, TokenBucket(requests_per_second), max_retries, league_game_log_endpoint=league_game_log_endpoint)
+                    print(f"Found {len(delta_data)} new games for {len(latest_dates)} saved players in season {season}.")
+                    if not delta_data.empty:
+                        player_logs.append((None, 'saved players', delta_data))
+                    eligible_players = eligible_players[~eligible_players['PLAYER_ID'].isin(latest_dates.index)]
+                except Exception as e:
+                    print(f"Error fetching new games for season {season}, fetching full player logs instead: {e}")
+
+        player_logs += fetch_player_game_logs(eligible_players, season, max_workers=max_workers, requests_per_second=requests_per_second,
+                                              max_retries=max_retries, progress_callback=progress_callback, game_log_endpoint=game_log_endpoint)
+
+        for player_id, player_name, player_data in player_logs:
             try:
-                player_id = player['PLAYER_ID']
-                player_name = player['PLAYER_NAME']
-                player_log = playergamelog.PlayerGameLog(player_id=player_id, season=season)
-                player_data = player_log.get_data_frames()[0]
+                if player_data is None:
+                    continue
                 #print(f"Processing player {player_name} in season {season}...")
                 if player_data.empty:
                     print(f"No game logs found for player {player_name} in season {season}.")
                     continue
 
-                player_data['PLAYER_NAME'] = player_name
-                player_data['TEAM_ABBREVIATION'] = player_data['MATCHUP'].str[:3]
-                player_data['OPPONENT_ABBREVIATION'] = player_data['MATCHUP'].apply(lambda x: x.split(' ')[2] if 'vs.' in x else x.split(' ')[-1])
+                if 'PLAYER_NAME' not in player_data.columns:
+                    player_data['PLAYER_NAME'] = player_name
+                # Parse dates per frame, the league and player endpoints use different date formats
+                player_data['GAME_DATE'] = pd.to_datetime(player_data['GAME_DATE'])
+                matchups = parse_matchups(player_data['MATCHUP'])
+                player_data['TEAM_ABBREVIATION'] = matchups['TEAM_ABBREVIATION']
+                player_data['OPPONENT_ABBREVIATION'] = matchups['OPPONENT_ABBREVIATION']
                 player_data['TEAM_NAME'] = player_data['TEAM_ABBREVIATION'].map(team_abbrev_to_full_name)
                 player_data['OPPONENT_NAME'] = player_data['OPPONENT_ABBREVIATION'].map(team_abbrev_to_full_name)
-                
-                new_players_data = pd.concat([new_players_data, player_data], ignore_index=True)
+
+                player_frames.append(player_data)
 
             except Exception as e:
                 print(f"Error processing player {player_name} in season {season}: {e}")
                 continue
-            time.sleep(0.6)
+    new_players_data = pd.concat(player_frames, ignore_index=True) if player_frames else pd.DataFrame()
+    del player_frames
     #print(new_players_data.head())
     if not new_players_data.empty:
         new_players_data['GAME_DATE'] = pd.to_datetime(new_players_data['GAME_DATE'])
-        new_players_data['TEAM_WIN_RATE'] = new_players_data.apply(lambda row: get_win_rate(row, 'TEAM_NAME', all_games), axis=1)
-        new_players_data['OPPONENT_WIN_RATE'] = new_players_data.apply(lambda row: get_win_rate(row, 'OPPONENT_NAME', all_games), axis=1)
-        new_players_data['HOME_AWAY'] = new_players_data['MATCHUP'].str.split(' ').str[1].apply(lambda x: 'Away' if '@' in x else 'Home')
+        new_players_data['TEAM_WIN_RATE'] = get_win_rates_asof(new_players_data, 'TEAM_NAME', all_games)
+        new_players_data['OPPONENT_WIN_RATE'] = get_win_rates_asof(new_players_data, 'OPPONENT_NAME', all_games)
+        new_players_data['HOME_AWAY'] = parse_matchups(new_players_data['MATCHUP'])['HOME_AWAY']
         new_players_data.reset_index(drop=True, inplace=True)
+        if not existing_data.empty:
+            print(f"Appending {len(new_players_data)} new game log rows to {len(existing_data)} saved rows.")
+            new_players_data = pd.concat([existing_data, new_players_data], ignore_index=True)
+            new_players_data = new_players_data.drop_duplicates(subset=['Player_ID', 'Game_ID'], keep='last').reset_index(drop=True)
         new_players_data.to_csv(save_path, index=False)
+        try:
+            # Typed columnar copy read by the app, the CSV stays the export format
+            save_game_logs(new_players_data, save_path)
+        except ImportError as e:
+            print(f"Skipping the columnar copy of the game logs: {e}")
         print(f"Player game logs saved to {save_path}")
-        return new_players_data
+        return apply_game_log_schema(new_players_data, report=True)
+    elif not existing_data.empty:
+        print(f"No new player game logs, {save_path} is up to date.")
+        return apply_game_log_schema(existing_data, report=True)
     else:
         print("No player game logs to save after processing all selected seasons.")
         return pd.DataFrame()  # Ensure to return an empty DataFrame if no data
@@ -132,106 +344,95 @@ def load_nba_player_game_logs(seasons, min_avg_minutes=30.0, save_path='data/pla
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from nba_api.stats.static import teams
 
-def prepare_upcoming_games_data(season_games_csv, player_game_logs_csv, expand_with_players=False):
+# Team roster indexes built from the saved game logs, keyed by (path, file version)
+team_roster_index_cache = {}
+
+def build_team_roster_index(player_game_logs):
+    """
+    Current roster of every team: each player is assigned to the last team they played for, so traded players
+    only appear on their new team.
+
+    Parameters:
+    - player_game_logs (DataFrame): Game logs with 'TEAM_NAME', 'Player_ID', 'PLAYER_NAME' and 'GAME_DATE'.
+
+    Returns:
+    - DataFrame: One row per player with 'TEAM_NAME', 'Player_ID' and 'PLAYER_NAME'.
+    """
+    latest_games = player_game_logs.sort_values(by='GAME_DATE', kind='mergesort').drop_duplicates(subset=['Player_ID'], keep='last')
+    roster_index = latest_games[['TEAM_NAME', 'Player_ID', 'PLAYER_NAME']].astype({'TEAM_NAME': object, 'PLAYER_NAME': object})
+    return roster_index.sort_values(by=['TEAM_NAME', 'PLAYER_NAME']).reset_index(drop=True)
+
+
+def get_team_roster_index(player_game_logs_csv):
+    """
+    The team roster index of the saved game logs, built once per version of the file.
+    """
+    file_stat = os.stat(player_game_logs_csv)
+    cache_key = (os.path.abspath(player_game_logs_csv), file_stat.st_mtime_ns, file_stat.st_size)
+    if cache_key not in team_roster_index_cache:
+        team_roster_index_cache.clear()
+        player_game_logs = load_game_logs(player_game_logs_csv, columns=['TEAM_NAME', 'Player_ID', 'PLAYER_NAME', 'GAME_DATE'])
+        team_roster_index_cache[cache_key] = build_team_roster_index(player_game_logs)
+    return team_roster_index_cache[cache_key]
+
+
+def prepare_upcoming_games_data(season_games_csv, player_game_logs_csv, expand_with_players=False, roster_index=None, today=None):
+    """
+    Home and away rows for every game in the next 7 days of the season schedule, optionally expanded to one
+    row per player on each team's current roster (roster_index, by default built from player_game_logs_csv).
+    today defaults to the current date.
+    """
     # Load season games data
     data = pd.read_csv(season_games_csv)
     
+    # Team abbreviations of both sides of every game
+    home_abbreviations = team_names_to_abbreviations(data['Home/Neutral'])
+    away_abbreviations = team_names_to_abbreviations(data['Visitor/Neutral'])
+
     # Process home and away data
-    home_data = data[['DATE', 'Start (ET)', 'Home/Neutral']].copy()
+    home_data = data[['DATE', 'Start (ET)']].copy()
     home_data['HOME_AWAY'] = 'Home'
-    home_data['MATCHUP'] = home_data['Home/Neutral'] + ' vs. ' + data['Visitor/Neutral']
-    home_data.rename(columns={'Home/Neutral': 'Team'}, inplace=True)
-    home_data['WL_encoded'] = np.nan
-    
-    away_data = data[['DATE', 'Start (ET)', 'Visitor/Neutral']].copy()
+    home_data['MATCHUP'] = home_abbreviations + ' vs. ' + away_abbreviations
+    home_data['TEAM_ABBREVIATION'] = home_abbreviations
+    home_data['OPPONENT_ABBREVIATION'] = away_abbreviations
+
+    away_data = data[['DATE', 'Start (ET)']].copy()
     away_data['HOME_AWAY'] = 'Away'
-    away_data['MATCHUP'] = away_data['Visitor/Neutral'] + ' @ ' + home_data['Team']  # Adjusted to use '@' for away games
-    away_data.rename(columns={'Visitor/Neutral': 'Team'}, inplace=True)
-    away_data['WL_encoded'] = np.nan
-    
+    away_data['MATCHUP'] = away_abbreviations + ' @ ' + home_abbreviations  # Adjusted to use '@' for away games
+    away_data['TEAM_ABBREVIATION'] = away_abbreviations
+    away_data['OPPONENT_ABBREVIATION'] = home_abbreviations
+
     final_data = pd.concat([home_data, away_data], ignore_index=True)
-    final_data.sort_values(by=['DATE', 'Start (ET)', 'HOME_AWAY'], inplace=True)
-    final_data.reset_index(drop=True, inplace=True)
-    
+
     # Convert 'DATE' column to datetime format
     final_data['DATE'] = pd.to_datetime(final_data['DATE'], format='%a, %b %d, %Y')
-    
-    # Get unique team information from the NBA API
-    teams_info = teams.get_teams()
-    teams_df = pd.DataFrame(teams_info)
-    teams_df.rename(columns={'id': 'TEAM_ID', 'full_name': 'TEAM_NAME', 'abbreviation': 'TEAM_ABBREVIATION'}, inplace=True)
-    
-    # Merge final_data with teams_df to include TEAM_ID and abbreviations
-    final_data = pd.merge(final_data, teams_df[['TEAM_NAME', 'TEAM_ID', 'TEAM_ABBREVIATION']], left_on='Team', right_on='TEAM_NAME', how='left')
-    
-    # Ensure all team names in MATCHUP are abbreviations
-    for index, row in final_data.iterrows():
-        for _, team_row in teams_df.iterrows():
-            final_data.at[index, 'MATCHUP'] = final_data.at[index, 'MATCHUP'].replace(team_row['TEAM_NAME'], team_row['TEAM_ABBREVIATION'])
-    
+    final_data.sort_values(by=['DATE', 'Start (ET)', 'HOME_AWAY'], kind='mergesort', inplace=True)
+    final_data.reset_index(drop=True, inplace=True)
+
+    # Full team names and ids from the team lookup tables
+    team_tables = get_team_tables()
+    final_data['TEAM_NAME'] = final_data['TEAM_ABBREVIATION'].map(team_tables['abbreviation_to_name'])
+    final_data['OPPONENT_NAME'] = final_data['OPPONENT_ABBREVIATION'].map(team_tables['abbreviation_to_name'])
+    final_data['TEAM_ID'] = final_data['TEAM_ABBREVIATION'].map(team_tables['abbreviation_to_id'])
+
     # Extract and filter for upcoming games
-    today = pd.Timestamp.now().floor('D')  # Normalize to avoid time part
+    today = pd.Timestamp(today if today is not None else pd.Timestamp.now()).floor('D')  # Normalize to avoid time part
     week_out = today + timedelta(days=7)
-    upcoming_games = final_data[(final_data['DATE'] >= today) & (final_data['DATE'] <= week_out)]
-    upcoming_games.sort_values(by='DATE', inplace=True)
-    upcoming_games.reset_index(drop=True, inplace=True)
-    
+    upcoming_games = final_data[(final_data['DATE'] >= today) & (final_data['DATE'] <= week_out)].reset_index(drop=True)
+
     # Format the 'DATE' column to match the example output's 'GAME_DATE' format
     upcoming_games['GAME_DATE'] = upcoming_games['DATE'].dt.strftime('%Y-%m-%d')
-    
-    # Correct the column name for consistency
-    upcoming_games.rename(columns={'HOME_AWAY': 'HOME_AWAY'}, inplace=True)
-    
-    # Drop unnecessary columns and adjust to match the target dataset structure
-    upcoming_games = upcoming_games[['GAME_DATE', 'MATCHUP', 'HOME_AWAY', 'TEAM_ID', 'TEAM_NAME']]
-    
-    # Create OPPOSING_TEAM column
-    upcoming_games['OPPONENT_NAME'] = np.nan  # Placeholder for opposing team names
-    
-    # Populate TEAM_NAME and OPPOSING_TEAM with correct names
-    for index, row in upcoming_games.iterrows():
-        if row['HOME_AWAY'] == 'Home':
-            # If it's a home game, the home team is TEAM_NAME and the visitor team is OPPOSING_TEAM
-            home_team_abbr = row['MATCHUP'].split(' vs. ')[0]
-            away_team_abbr = row['MATCHUP'].split(' vs. ')[1]
-        else:
-            # If it's an away game, the visitor team is TEAM_NAME and the home team is OPPOSING_TEAM
-            away_team_abbr = row['MATCHUP'].split(' @ ')[0]
-            home_team_abbr = row['MATCHUP'].split(' @ ')[1]
-
-        home_team_full_name = teams_df[teams_df['TEAM_ABBREVIATION'] == home_team_abbr]['TEAM_NAME'].values[0]
-        away_team_full_name = teams_df[teams_df['TEAM_ABBREVIATION'] == away_team_abbr]['TEAM_NAME'].values[0]
-
-        upcoming_games.at[index, 'TEAM_NAME'] = home_team_full_name if row['HOME_AWAY'] == 'Home' else away_team_full_name
-        upcoming_games.at[index, 'OPPONENT_NAME'] = away_team_full_name if row['HOME_AWAY'] == 'Home' else home_team_full_name
-
-
-    # Load player game logs to use for fetching rosters
-    player_game_logs = pd.read_csv(player_game_logs_csv)
-    print(player_game_logs.columns)
-    print(upcoming_games.columns)
-    
-    if expand_with_players:
-        expanded_games_with_players = pd.DataFrame()
-
-        # Assuming player_game_logs_csv is correctly loaded into player_game_logs DataFrame
-        player_game_logs = pd.read_csv(os.path.join('data', 'player_game_logs_winr.csv'))
-
-        expanded_rows = []
 
-        for _, game in upcoming_games.iterrows():
-            team_name = game['TEAM_NAME']
-            team_players = player_game_logs[player_game_logs['TEAM_NAME'] == team_name]
+    # Drop unnecessary columns and adjust to match the target dataset structure
+    upcoming_games = upcoming_games[['GAME_DATE', 'MATCHUP', 'HOME_AWAY', 'TEAM_ID', 'TEAM_NAME', 'OPPONENT_NAME']]
 
-            for _, player in team_players.iterrows():
-                expanded_row = game.copy().to_dict()
-                expanded_row['Player_ID'] = player['Player_ID']
-                expanded_row['PLAYER_NAME'] = player['PLAYER_NAME']
-                expanded_rows.append(expanded_row)
+    if expand_with_players:
+        if roster_index is None:
+            roster_index = get_team_roster_index(player_game_logs_csv)
 
-        expanded_games_with_players = pd.DataFrame(expanded_rows)
+        # One row per game and player on the team's current roster
+        expanded_games_with_players = upcoming_games.merge(roster_index, on='TEAM_NAME', how='inner')
 
         #drop duplicate players and game_dates
         expanded_games_with_players = expanded_games_with_players.drop_duplicates(subset=['GAME_DATE', 'PLAYER_NAME'], keep='first')
@@ -239,12 +440,31 @@ def prepare_upcoming_games_data(season_games_csv, player_game_logs_csv, expand_w
         # only include these columns: ['GAME_DATE', 'MATCHUP', 'HOME_AWAY', 'TEAM_NAME','OPPOSING_TEAM', 'Player_ID', 'PLAYER_NAME']
         expanded_games_with_players = expanded_games_with_players[['GAME_DATE', 'MATCHUP', 'HOME_AWAY', 'TEAM_NAME', 'OPPONENT_NAME', 'Player_ID', 'PLAYER_NAME']]
         
-        # Return the expanded DataFrame
-        return expanded_games_with_players
+        # Return the expanded DataFrame with the same compact dtypes as the game logs
+        return apply_game_log_schema(expanded_games_with_players.reset_index(drop=True))
 
 
     return upcoming_games
 
+
+def combine_with_upcoming_games(previous_games, upcoming_games):
+    """
+    The game logs followed by the expanded upcoming games on dates not already in the logs, sorted by game date.
+    """
+    # Ensure GAME_DATE is in datetime format for comparison
+    upcoming_games = upcoming_games.assign(GAME_DATE=pd.to_datetime(upcoming_games['GAME_DATE']))
+
+    # Filter out upcoming games that have dates already in previous games
+    unique_upcoming_games = upcoming_games[~upcoming_games['GAME_DATE'].isin(previous_games['GAME_DATE'])]
+
+    # Concatenate the unique upcoming games to the previous games dataset, in chronological order
+    data = pd.concat([previous_games, unique_upcoming_games], ignore_index=True)
+    data.sort_values(by='GAME_DATE', inplace=True)
+    data.reset_index(drop=True, inplace=True)
+
+    # Concatenating with the upcoming games turns categoricals back into strings, restore the compact dtypes
+    return apply_game_log_schema(data)
+
 # Example usage with file paths
 #season_games_csv = 'data/23_24_season_games.csv'
 #player_game_logs_csv = 'data/player_game_logs_winr.csv'
@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+#Stage timing for the app reruns
+#A profile is a dict holding the spans of one rerun. Each span records the wall time of a stage, the rows it was
+#given and returned and, when memory tracing is on, the peak memory allocated above the memory in use when it started.
+#Spans nest (a stage inside a cached loader), the peak of a nested span also counts toward the span around it.
+#tracemalloc is process wide: with several sessions rerunning at once their allocations add up in each other's peaks.
+
+# Whether tracemalloc was started by a profile (and may be stopped by one)
+profiling_state = {'started_tracemalloc': False}
+
+
+def start_profile(name, trace_memory=False):
+    """
+    Start the profile of a run. trace_memory turns tracemalloc on for the run (it slows allocations down,
+    so it is stopped again by the next profile started without it).
+    """
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        profiling_state['started_tracemalloc'] = True
+    elif not trace_memory and profiling_state['started_tracemalloc'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+        profiling_state['started_tracemalloc'] = False
+    return {'name': name, 'started_at': pd.Timestamp.now().isoformat(timespec='seconds'), 'start': time.perf_counter(),
+            'seconds': None, 'trace_memory': trace_memory and tracemalloc.is_tracing(), 'spans': [], 'stack': []}
+
+
+@contextmanager
+def profile_span(profile, name, rows_in=None):
+    """
+    Time the stage run inside the with block. The block can set span['rows_out'] (and any other field) on the yielded span.
+
+    Example:
+        with profile_span(profile, 'evaluate_bets', rows_in=len(bets)) as span:
+            evaluated = evaluate_bets(bets, logs)
+            span['rows_out'] = len(evaluated)
+    """
+    span = {'name': name, 'depth': len(profile['stack']), 'seconds': None, 'rows_in': rows_in, 'rows_out': None, 'peak_mb': None}
+    tracing = profile['trace_memory'] and tracemalloc.is_tracing()
+    if tracing:
+        # Fold the peak so far into the enclosing span before resetting it for this one
+        current, peak = tracemalloc.get_traced_memory()
+        if profile['stack']:
+            parent = profile['stack'][-1]
+            parent['traced_peak'] = max(parent['traced_peak'], peak)
+        tracemalloc.reset_peak()
+        span['traced_start'], span['traced_peak'] = current, current
+    profile['spans'].append(span)
+    profile['stack'].append(span)
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span['seconds'] = time.perf_counter() - start
+        profile['stack'].pop()
+        if tracing:
+            peak = max(span.pop('traced_peak'), tracemalloc.get_traced_memory()[1])
+            span['peak_mb'] = (peak - span.pop('traced_start')) / 1e6
+            if profile['stack']:
+                parent = profile['stack'][-1]
+                parent['traced_peak'] = max(parent['traced_peak'], peak)
+
+
+def finish_profile(profile):
+    """
+    Close the profile: its total wall time, the spans still open (e.g. after an exception) are left unfinished.
+    """
+    profile['seconds'] = time.perf_counter() - profile['start']
+    return profile
+
+
+def profile_frame(profile):
+    """
+    The spans of a profile as a table, nested spans indented under the span they ran in.
+    """
+    spans = pd.DataFrame(profile['spans'], columns=['name', 'depth', 'seconds', 'rows_in', 'rows_out', 'peak_mb'])
+    spans['name'] = ['  ' * depth + name for depth, name in zip(spans['depth'], spans['name'])]
+    return spans.drop(columns='depth')
+
+
+def append_profile_log(profile, log_path):
+    """
+    Append the profile as one JSON line to log_path, to follow the stage timings across reruns and releases.
+    """
+    record = {'name': profile['name'], 'started_at': profile['started_at'], 'seconds': profile['seconds'], 'trace_memory': profile['trace_memory'],
+              'spans': [{key: span[key] for key in ['name', 'depth', 'seconds', 'rows_in', 'rows_out', 'peak_mb']} for span in profile['spans']]}
+    log_dir = os.path.dirname(log_path)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+    with open(log_path, 'a') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+
+def load_profile_log(log_path):
+    """
+    The logged spans, one row per span with the run's name and start time.
+    """
+    rows = []
+    with open(log_path) as f:
+        for line in f:
+            record = json.loads(line)
+            rows.extend({'run': record['name'], 'started_at': record['started_at'], **span} for span in record['spans'])
+    return pd.DataFrame(rows)
+
+
+# Example usage
+#profile = start_profile('Forecasting Player Statistics', trace_memory=True)
+#with profile_span(profile, 'load_game_logs') as span:
+#    data = load_game_logs('data/player_game_logs_winr.csv')
+#    span['rows_out'] = len(data)
+#append_profile_log(finish_profile(profile), 'data/profile_log.jsonl')
+#print(load_profile_log('data/profile_log.jsonl').groupby('name')['seconds'].describe())
@@ -0,0 +1,119 @@
+import pandas as pd
+
+#Memory-compact dtype schema for the game log DataFrames
+#Used by the loaders, the upcoming games expansion and the metrics functions so every cached copy of the
+#game logs shares the same compact dtypes: categorical names, small ints for counting stats, float32 rates.
+
+categorical_columns = ['MATCHUP', 'WL', 'PLAYER_NAME', 'TEAM_ABBREVIATION', 'OPPONENT_ABBREVIATION', 'TEAM_NAME', 'OPPONENT_NAME', 'HOME_AWAY']
+counting_columns = ['MIN', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA', 'OREB', 'DREB', 'REB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'PLUS_MINUS', 'VIDEO_AVAILABLE']
+float_columns = ['FG_PCT', 'FG3_PCT', 'FT_PCT', 'TEAM_WIN_RATE', 'OPPONENT_WIN_RATE']
+id_columns = ['SEASON_ID', 'Player_ID']
+
+# Combined statistics of the combo prop markets, e.g. points + rebounds + assists
+combo_stat_columns = {
+    'PTS_REB_AST': ['PTS', 'REB', 'AST'],
+    'PTS_REB': ['PTS', 'REB'],
+    'PTS_AST': ['PTS', 'AST'],
+    'REB_AST': ['REB', 'AST'],
+    'BLK_STL': ['BLK', 'STL'],
+}
+# Double and triple double indicators (1 when 2 or 3 of these stats reach 10)
+double_digit_stats = ['PTS', 'REB', 'AST', 'STL', 'BLK']
+indicator_stat_columns = {'DOUBLE_DOUBLE': 2, 'TRIPLE_DOUBLE': 3}
+derived_stat_columns = list(combo_stat_columns) + list(indicator_stat_columns)
+
+# Statistics aggregated by the metrics functions
+metric_stats = ['PTS', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA', 'AST', 'OREB', 'DREB', 'REB', 'TOV', 'STL', 'BLK', 'MIN', 'TEAM_WIN_RATE', 'OPPONENT_WIN_RATE'] + derived_stat_columns
+
+
+def derived_stat_values(df):
+    """
+    Values of the derived stat columns missing from the DataFrame: combo sums and double/triple double indicators,
+    NaN on rows where a component is missing (upcoming games).
+    """
+    derived = {}
+    for combo, components in combo_stat_columns.items():
+        if combo not in df.columns and all(col in df.columns for col in components):
+            derived[combo] = df[components].astype('float32').sum(axis=1, min_count=len(components))
+    if all(col in df.columns for col in double_digit_stats):
+        double_digits = df[double_digit_stats].astype('float32')
+        double_digit_count = (double_digits >= 10).sum(axis=1).astype('float32').where(double_digits.notna().all(axis=1))
+        for indicator, count in indicator_stat_columns.items():
+            if indicator not in df.columns:
+                derived[indicator] = (double_digit_count >= count).astype('float32').where(double_digit_count.notna())
+    return derived
+
+
+def add_derived_stat_columns(df):
+    """
+    Add the derived stat columns once; the DataFrame is returned as is when they are already there
+    (every frame loaded through apply_game_log_schema).
+    """
+    derived = derived_stat_values(df)
+    return df.assign(**derived) if derived else df
+
+
+def bytes_per_row(df):
+    """
+    Deep memory usage of the DataFrame per row.
+    """
+    return df.memory_usage(deep=True).sum() / max(len(df), 1)
+
+
+def apply_game_log_schema(df, report=False):
+    """
+    Cast the game logs to the compact schema.
+    - Names (player, team, opponent, matchup, home/away, win/loss) become categoricals.
+    - The derived stats (combos, double/triple doubles) are added, so every consumer reads the same columns.
+    - Counting stats become int16, or float32 when the column has missing values (upcoming games) or fractions.
+    - Percentages and win rates become float32, ids int32 (float64 when missing), GAME_DATE datetime64
+      and Game_ID the zero padded string the API returns.
+
+    Parameters:
+    - df (DataFrame): Game logs, possibly with upcoming game rows and only some of the columns.
+    - report (bool): Print the bytes per row before and after.
+
+    Returns:
+    - DataFrame: The typed copy.
+    """
+    typed_df = df.copy()
+    for col, values in derived_stat_values(typed_df).items():
+        typed_df[col] = values
+    if 'GAME_DATE' in typed_df.columns:
+        typed_df['GAME_DATE'] = pd.to_datetime(typed_df['GAME_DATE'])
+    if 'Game_ID' in typed_df.columns:
+        game_ids = typed_df['Game_ID']
+        typed_df['Game_ID'] = game_ids.astype(str).str.zfill(10).where(game_ids.notna())
+    for col in id_columns:
+        if col in typed_df.columns:
+            values = pd.to_numeric(typed_df[col])
+            typed_df[col] = values.astype('int32') if values.notna().all() else values.astype('float64')
+    for col in counting_columns + derived_stat_columns:
+        if col in typed_df.columns:
+            values = pd.to_numeric(typed_df[col])
+            is_integral = values.notna().all() and (values == values.round()).all()
+            typed_df[col] = values.astype('int16') if is_integral else values.astype('float32')
+    for col in float_columns:
+        if col in typed_df.columns:
+            typed_df[col] = pd.to_numeric(typed_df[col]).astype('float32')
+    for col in categorical_columns:
+        if col in typed_df.columns:
+            typed_df[col] = typed_df[col].astype('category')
+
+    if report:
+        print(memory_report(df, typed_df))
+    return typed_df
+
+
+def memory_report(before_df, after_df):
+    """
+    Describe the memory saved by the schema, in bytes per row and in total.
+    """
+    before, after = bytes_per_row(before_df), bytes_per_row(after_df)
+    return (f"Game logs memory: {before:.0f} -> {after:.0f} bytes per row "
+            f"({before_df.memory_usage(deep=True).sum() / 1e6:.2f} MB -> {after_df.memory_usage(deep=True).sum() / 1e6:.2f} MB for {len(after_df)} rows)")
+
+
+# Example usage
+#data = pd.read_csv('data/player_game_logs_winr.csv')
+#data = apply_game_log_schema(data, report=True)
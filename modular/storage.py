@@ -0,0 +1,140 @@
+import os
+import pandas as pd
+from modular.schema import apply_game_log_schema
+
+#Storage layer for the player game logs
+#The game logs are stored in a typed columnar file (Parquet, or Feather; dtypes from modular/schema.py) next to the CSV, which stays the export format.
+#Loaders pass the CSV path: the columnar copy is used when it is up to date and rebuilt from the CSV otherwise.
+
+storage_formats = {'.parquet': 'parquet', '.feather': 'feather', '.csv': 'csv'}
+
+
+def get_storage_path(path, storage_format='parquet'):
+    """
+    The columnar file stored next to a game log CSV, e.g. data/player_game_logs_winr.parquet.
+    """
+    return os.path.splitext(path)[0] + '.' + storage_format
+
+
+def season_to_season_id(season):
+    """
+    Convert a season like '2023-24' to the regular season SEASON_ID used by the API (22023). Ids are passed through.
+    """
+    if isinstance(season, str) and '-' in season:
+        return int('2' + season.split('-')[0])
+    return int(season)
+
+
+def _build_filters(seasons=None, start_date=None, end_date=None):
+    filters = []
+    if seasons is not None:
+        if not isinstance(seasons, list):
+            seasons = [seasons]
+        filters.append(('SEASON_ID', 'in', [season_to_season_id(season) for season in seasons]))
+    if start_date is not None:
+        filters.append(('GAME_DATE', '>=', pd.Timestamp(start_date)))
+    if end_date is not None:
+        filters.append(('GAME_DATE', '<=', pd.Timestamp(end_date)))
+    return filters
+
+
+def _apply_filters(df, filters):
+    """
+    Apply the filters in pandas for formats without predicate pushdown.
+    """
+    for col, op, value in filters:
+        if op == 'in':
+            df = df[df[col].isin(value)]
+        elif op == '>=':
+            df = df[df[col] >= value]
+        elif op == '<=':
+            df = df[df[col] <= value]
+    return df
+
+
+def save_game_logs(df, path, storage_format='parquet', export_csv=False):
+    """
+    Save the game logs in the typed columnar format, sorted by date so date filters can skip row groups.
+
+    Parameters:
+    - df (DataFrame): The game logs.
+    - path (str): The game log path, the columnar file is written next to it with the format's extension.
+    - storage_format (str): 'parquet' or 'feather'.
+    - export_csv (bool): Also write the CSV export to `path`.
+
+    Returns:
+    - str: The path of the columnar file.
+    """
+    typed_df = apply_game_log_schema(df)
+    if 'GAME_DATE' in typed_df.columns:
+        typed_df = typed_df.sort_values(by='GAME_DATE', kind='mergesort')
+    typed_df = typed_df.reset_index(drop=True)
+
+    storage_path = get_storage_path(path, storage_format)
+    # Written next to the target and moved into place, readers (another app session) never see a partial file
+    tmp_path = f"{storage_path}.tmp{os.getpid()}"
+    try:
+        if storage_format == 'parquet':
+            typed_df.to_parquet(tmp_path, index=False, row_group_size=2000)
+        elif storage_format == 'feather':
+            typed_df.to_feather(tmp_path)
+        else:
+            raise ValueError(f"Unsupported storage format '{storage_format}'.")
+        os.replace(tmp_path, storage_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    if export_csv:
+        df.to_csv(path, index=False)
+    return storage_path
+
+
+def load_game_logs(path, columns=None, seasons=None, start_date=None, end_date=None, storage_format='parquet'):
+    """
+    Load the game logs with column projection and season/date filters.
+
+    The columnar file next to `path` is read when it is at least as new as the CSV, otherwise it is (re)built
+    from the CSV first. Without pyarrow the CSV is parsed and filtered in pandas.
+
+    Parameters:
+    - path (str): The game log path (the CSV export or the columnar file).
+    - columns (list): Columns to read, all by default.
+    - seasons (list): Seasons ('2023-24') or SEASON_IDs to keep.
+    - start_date, end_date: Inclusive GAME_DATE bounds.
+    - storage_format (str): 'parquet' or 'feather'.
+
+    Returns:
+    - DataFrame: The typed game logs.
+    """
+    filters = _build_filters(seasons, start_date, end_date)
+    path_format = storage_formats.get(os.path.splitext(path)[1], 'csv')
+    storage_path = path if path_format != 'csv' else get_storage_path(path, storage_format)
+    csv_path = path if path_format == 'csv' else get_storage_path(path, 'csv')
+
+    csv_is_newer = os.path.exists(csv_path) and (not os.path.exists(storage_path) or os.path.getmtime(csv_path) > os.path.getmtime(storage_path))
+    if csv_is_newer:
+        data = pd.read_csv(csv_path, dtype={'Game_ID': str})
+        try:
+            save_game_logs(data, storage_path, storage_format=storage_formats[os.path.splitext(storage_path)[1]])
+        except ImportError:
+            # No pyarrow: keep serving the CSV
+            data = apply_game_log_schema(data)
+            data = _apply_filters(data, filters)
+            return (data[columns] if columns else data).reset_index(drop=True)
+
+    # Filter columns are read even when not projected
+    read_columns = None if columns is None else list(dict.fromkeys(columns + [col for col, _, _ in filters]))
+    if storage_path.endswith('.parquet'):
+        data = pd.read_parquet(storage_path, columns=read_columns, filters=filters or None)
+    else:
+        data = pd.read_feather(storage_path, columns=read_columns)
+        data = _apply_filters(data, filters)
+
+    return (data[columns] if columns else data).reset_index(drop=True)
+
+
+# Example usage
+# Loads data/player_game_logs_winr.parquet, building it from the CSV on first use
+#recent_points = load_game_logs('data/player_game_logs_winr.csv', columns=['PLAYER_NAME', 'GAME_DATE', 'PTS'], start_date='2024-03-01')
+#print(recent_points.head())
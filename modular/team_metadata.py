@@ -0,0 +1,76 @@
+import pandas as pd
+
+#Team metadata shared by the loaders and the schedule parsing
+#Lookup dictionaries between team names, abbreviations and ids are built once from the static nba_api team list,
+#and MATCHUP strings ('BOS vs. NYK' at home, 'BOS @ NYK' away) are parsed once per distinct value.
+
+# Lookup tables built on first use
+team_tables = {}
+
+
+def get_team_tables():
+    """
+    The team lookup dictionaries: 'abbreviation_to_name', 'name_to_abbreviation', 'abbreviation_to_id',
+    'name_to_id', 'id_to_name' and 'id_to_abbreviation', plus 'teams_df' with TEAM_ID, TEAM_NAME and TEAM_ABBREVIATION.
+    """
+    if not team_tables:
+        # nba_api is only imported when the tables are first needed, not when the module is
+        from nba_api.stats.static import teams
+        teams_list = teams.get_teams()
+        team_tables['abbreviation_to_name'] = {team['abbreviation']: team['full_name'] for team in teams_list}
+        team_tables['name_to_abbreviation'] = {team['full_name']: team['abbreviation'] for team in teams_list}
+        team_tables['abbreviation_to_id'] = {team['abbreviation']: team['id'] for team in teams_list}
+        team_tables['name_to_id'] = {team['full_name']: team['id'] for team in teams_list}
+        team_tables['id_to_name'] = {team['id']: team['full_name'] for team in teams_list}
+        team_tables['id_to_abbreviation'] = {team['id']: team['abbreviation'] for team in teams_list}
+        team_tables['teams_df'] = pd.DataFrame({
+            'TEAM_ID': [team['id'] for team in teams_list],
+            'TEAM_NAME': [team['full_name'] for team in teams_list],
+            'TEAM_ABBREVIATION': [team['abbreviation'] for team in teams_list],
+        })
+    return team_tables
+
+
+def team_names_to_abbreviations(names):
+    """
+    Map full team names to abbreviations, names without a match are kept as they are.
+    """
+    names = pd.Series(names)
+    return names.map(get_team_tables()['name_to_abbreviation']).fillna(names)
+
+
+def team_abbreviations_to_names(abbreviations):
+    """
+    Map team abbreviations to full team names (NaN when there is no match).
+    """
+    return pd.Series(abbreviations).map(get_team_tables()['abbreviation_to_name'])
+
+
+def parse_matchups(matchups):
+    """
+    Split MATCHUP strings into the team and opponent abbreviations and the home/away flag.
+
+    Parameters:
+    - matchups (Series): MATCHUP values such as 'BOS vs. NYK' (home) or 'BOS @ NYK' (away).
+
+    Returns:
+    - DataFrame: 'TEAM_ABBREVIATION', 'OPPONENT_ABBREVIATION' and 'HOME_AWAY' ('Home' or 'Away'), aligned with the matchups.
+    """
+    matchups = pd.Series(matchups)
+    # A season only has a few hundred distinct matchups, parse each once and broadcast back with the codes
+    codes, unique_matchups = pd.factorize(matchups)
+    parts = pd.Series(unique_matchups, dtype=object).str.split(' ', n=2, expand=True).reindex(columns=[0, 1, 2])
+    parsed = pd.DataFrame({
+        'TEAM_ABBREVIATION': parts[0],
+        'OPPONENT_ABBREVIATION': parts[2],
+        'HOME_AWAY': parts[1].map(lambda separator: 'Away' if '@' in separator else 'Home', na_action='ignore'),
+    })
+    # Missing matchups have code -1 and come back as NaN
+    parsed = parsed.reindex(codes)
+    parsed.index = matchups.index
+    return parsed
+
+
+# Example usage
+#print(parse_matchups(pd.Series(['BOS vs. NYK', 'NYK @ BOS'])))
+#print(get_team_tables()['abbreviation_to_name']['BOS'])
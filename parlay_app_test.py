@@ -2,6 +2,8 @@ import pandas as pd
 import streamlit as st
 import numpy as np
 import os
+from modular.odds_store import initialize_odds_store, load_latest_odds, get_odds_store_version
+from modular.odds_normalization import backfill_alternate_markets
 
 # Initialize session state for selected parlays if it doesn't exist
 if 'selected_parlays' not in st.session_state:
@@ -17,9 +19,6 @@ else:
     parlays_df = pd.DataFrame(columns=['Bet Info', 'Price'])
 
 
-# Load data from CSV
-df = pd.read_csv('data/final_odds_api_pull.csv') 
-
 # Add alternate markets if they do not exist for every player
 alternate_markets = {
     'player_rebounds_alternate': [4.5, 7.5, 10.5],
@@ -27,21 +26,16 @@ alternate_markets = {
     'player_points_alternate': [9.5, 19.5, 29.5],
 }
 
-for player in df['PLAYER_NAME'].unique():
-    for game_date in df['GAME_DATE'].unique():
-        for market, points_options in alternate_markets.items():
-            for point in points_options:
-                if not ((df['PLAYER_NAME'] == player) & (df['GAME_DATE'] == game_date) & (df['MARKET'] == market) & (df['POINT'] == point)).any():
-                    # Add row with placeholder prices, adjust as necessary
-                    df = pd.concat([df, pd.DataFrame.from_records([{
-                        'PLAYER_NAME': player,
-                        'GAME_DATE': game_date,
-                        'MARKET': market,
-                        'POINT': point,
-                        'OVER_PRICE': np.nan,  # Placeholder
-                        'UNDER_PRICE': np.nan,  # Placeholder
-                        # Add other necessary columns with defaults
-                    }])], ignore_index=True)
+@st.cache_data
+def load_odds_board(odds_version):
+    """
+    Latest line of every player prop plus the alternate market placeholders, rebuilt only when the odds store changes.
+    """
+    return backfill_alternate_markets(load_latest_odds(), alternate_markets)
+
+# Load the latest line of every player prop from the odds history store (created from the old CSV on first use)
+initialize_odds_store()
+df = load_odds_board(get_odds_store_version())
 
 # UI components for date, team, and player selection
 date = st.selectbox('Select Date:', df['GAME_DATE'].unique())
@@ -0,0 +1,112 @@
+import time
+import random
+import threading
+import numpy as np
+import pandas as pd
+from modular.player_game_logs import game_log_columns, fetch_player_game_logs
+
+#Offline stand-in for playergamelog.PlayerGameLog, used by the game log fetch tests and benchmarks
+#The stub answers after a fixed latency, fails a share of the requests at random and returns synthetic game logs
+#with the columns of the real endpoint.
+
+
+def make_stub_game_log_endpoint(latency=0.3, failure_rate=0.0, n_games=70, seed=0):
+    """
+    Offline stand-in for playergamelog.PlayerGameLog with a fixed latency and random failures,
+    returning synthetic game logs with the same columns. Used to test and benchmark the fetch path.
+    """
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    abbreviations = ['BOS', 'DEN', 'DET', 'LAL', 'MIA', 'NYK', 'PHX', 'UTA']
+    counting_stats = ['MIN', 'FGM', 'FGA', 'FG3M', 'FG3A', 'FTM', 'FTA', 'OREB', 'DREB', 'REB', 'AST', 'STL', 'BLK', 'TOV', 'PF', 'PTS', 'PLUS_MINUS']
+
+    class StubPlayerGameLog:
+        def __init__(self, player_id, season, **kwargs):
+            time.sleep(latency)
+            with rng_lock:
+                failed = rng.random() < failure_rate
+            if failed:
+                raise ConnectionError(f"Stub request failed for player {player_id}")
+            self.player_id = player_id
+            self.season = season
+
+        def get_data_frames(self):
+            games = np.arange(n_games)
+            values = np.random.default_rng(int(self.player_id)).integers(0, 30, size=(n_games, len(counting_stats)))
+            data = pd.DataFrame(values, columns=counting_stats)
+            data.insert(0, 'SEASON_ID', '2' + self.season[:4])
+            data.insert(1, 'Player_ID', self.player_id)
+            data.insert(2, 'Game_ID', ['00223' + str(game).zfill(5) for game in games])
+            data.insert(3, 'GAME_DATE', (pd.Timestamp(self.season[:4] + '-10-24') + pd.to_timedelta(games * 2, unit='D')).strftime('%b %d, %Y').str.upper())
+            data.insert(4, 'MATCHUP', [abbreviations[game % 4] + (' vs. ' if game % 2 else ' @ ') + abbreviations[4 + game % 4] for game in games])
+            data.insert(5, 'WL', np.where(games % 3, 'W', 'L'))
+            for made, attempted, percentage in [('FGM', 'FGA', 'FG_PCT'), ('FG3M', 'FG3A', 'FG3_PCT'), ('FTM', 'FTA', 'FT_PCT')]:
+                data[attempted] = data[[made, attempted]].max(axis=1)
+                data[percentage] = (data[made] / data[attempted].where(data[attempted] > 0)).fillna(0).round(3)
+            data['VIDEO_AVAILABLE'] = 1
+            return [data[game_log_columns]]
+
+    return StubPlayerGameLog
+
+
+def benchmark_game_log_fetch(n_players=40, latency=0.3, workers=(1, 2, 4, 8), requests_per_second=10, failure_rate=0.0):
+    """
+    Time fetch_player_game_logs against the local stub endpoint for several worker pool sizes.
+    """
+    players = pd.DataFrame({'PLAYER_ID': np.arange(1, n_players + 1), 'PLAYER_NAME': [f'Player {i}' for i in range(1, n_players + 1)]})
+    endpoint = make_stub_game_log_endpoint(latency=latency, failure_rate=failure_rate)
+
+    benchmark_results = []
+    for max_workers in workers:
+        start = time.perf_counter()
+        player_logs = fetch_player_game_logs(players, '2023-24', max_workers=max_workers, requests_per_second=requests_per_second,
+                                             backoff=0.05, progress_callback=None, game_log_endpoint=endpoint)
+        elapsed = time.perf_counter() - start
+        benchmark_results.append({
+            'max_workers': max_workers,
+            'seconds': elapsed,
+            'players_per_second': n_players / elapsed,
+            'failed_players': sum(player_data is None for _, _, player_data in player_logs),
+        })
+    return pd.DataFrame(benchmark_results)
+
+
+def benchmark_game_log_accumulation(season_counts=(1, 2, 3, 4, 5), players_per_season=250, games_per_player=70):
+    """
+    Compare concatenating each player's frame inside the loop with buffering the frames in a list and
+    concatenating once, for 1-5 seasons of eligible players. Reports time and peak traced memory.
+    """
+    import tracemalloc
+
+    endpoint = make_stub_game_log_endpoint(latency=0.0, n_games=games_per_player)
+    player_frame = endpoint(player_id=1, season='2023-24').get_data_frames()[0]
+
+    def concat_in_loop(frames_count):
+        combined = pd.DataFrame()
+        for _ in range(frames_count):
+            combined = pd.concat([combined, player_frame.copy()], ignore_index=True)
+        return combined
+
+    def buffer_then_concat(frames_count):
+        frames = [player_frame.copy() for _ in range(frames_count)]
+        return pd.concat(frames, ignore_index=True)
+
+    benchmark_results = []
+    for seasons_count in season_counts:
+        frames_count = seasons_count * players_per_season
+        for method, accumulate in [('concat_in_loop', concat_in_loop), ('buffer_then_concat', buffer_then_concat)]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            combined = accumulate(frames_count)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            benchmark_results.append({
+                'seasons': seasons_count,
+                'method': method,
+                'rows': len(combined),
+                'seconds': elapsed,
+                'peak_mb': peak / 1e6,
+                'output_mb': combined.memory_usage(deep=True).sum() / 1e6,
+            })
+    return pd.DataFrame(benchmark_results)
@@ -0,0 +1,170 @@
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+from modular.odds_fetcher import fetch_odds_pages, nba_player_prop_markets
+
+#Local stand-in for The Odds API, used by the odds client tests and benchmarks
+#The server mimics the events and event odds endpoints, including the comma separated markets, the quota headers
+#and the per market usage cost, and counts the requests it answered and the most requests it had in flight.
+
+
+def make_mock_odds_payloads(n_events=10, players_per_team=8, markets=nba_player_prop_markets, bookmakers=('draftkings', 'fanduel', 'betmgm'),
+                            commence_time='2024-03-19T23:10:00Z', seed=0):
+    """
+    Synthetic events and event odds in the API's format, for the mock server and benchmarks.
+    Over/under markets get one line per player (three for the alternate markets), yes/no markets a 'Yes' price.
+
+    Returns:
+    - tuple: (events, event_odds) where event_odds maps event ids to their payload with all the markets.
+    """
+    rng = random.Random(seed)
+    yes_no_markets = {'player_first_basket', 'player_double_double', 'player_triple_double'}
+    events, event_odds = [], {}
+    for event_index in range(n_events):
+        event = {
+            'id': f'event{event_index:04d}',
+            'sport_key': 'basketball_nba',
+            'sport_title': 'NBA',
+            'commence_time': commence_time,
+            'home_team': f'Home Team {event_index}',
+            'away_team': f'Away Team {event_index}',
+        }
+        players = [f"{team} Player {i}" for team in (event['home_team'], event['away_team']) for i in range(players_per_team)]
+        event_bookmakers = []
+        for bookmaker in bookmakers:
+            bookmaker_markets = []
+            for market in markets:
+                outcomes = []
+                for player in players:
+                    if market in yes_no_markets:
+                        outcomes.append({'name': 'Yes', 'description': player, 'price': round(rng.uniform(1.5, 15.0), 2)})
+                        continue
+                    base_line = rng.randint(1, 30) + 0.5
+                    lines = [base_line - 2, base_line, base_line + 2] if market.endswith('_alternate') else [base_line]
+                    for line in lines:
+                        outcomes.append({'name': 'Over', 'description': player, 'price': round(rng.uniform(1.6, 2.3), 2), 'point': line})
+                        outcomes.append({'name': 'Under', 'description': player, 'price': round(rng.uniform(1.6, 2.3), 2), 'point': line})
+                bookmaker_markets.append({'key': market, 'last_update': '2024-03-19T15:06:25Z', 'outcomes': outcomes})
+            event_bookmakers.append({'key': bookmaker, 'title': bookmaker, 'last_update': '2024-03-19T15:06:25Z', 'markets': bookmaker_markets})
+        events.append(event)
+        event_odds[event['id']] = dict(event, bookmakers=event_bookmakers)
+    return events, event_odds
+
+
+def start_mock_odds_server(events, event_odds, latency=0.0, quota=100000, fail_statuses=()):
+    """
+    Serve events and event odds on a local HTTP server.
+
+    Parameters:
+    - latency (float): Seconds every response is delayed by.
+    - quota (int): Usage credits available, requests beyond it get a 401 like the API's.
+    - fail_statuses (iterable): HTTP statuses (e.g. 429, 503) answered, in order, to the first event odds requests.
+
+    Returns:
+    - tuple: (server, base_url). server.stats holds 'requests' answered, 'attempts' received, 'used' credits
+      and 'max_in_flight' requests; call server.shutdown() when done.
+    """
+    stats = {'requests': 0, 'attempts': 0, 'used': 0, 'in_flight': 0, 'max_in_flight': 0}
+    stats_lock = threading.Lock()
+    failures = list(fail_statuses)
+
+    class MockOddsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with stats_lock:
+                stats['in_flight'] += 1
+                stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+            try:
+                self.answer()
+            finally:
+                with stats_lock:
+                    stats['in_flight'] -= 1
+
+        def answer(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            path_parts = url.path.strip('/').split('/')
+            time.sleep(latency)
+
+            # /v4/sports/{sport}/events and /v4/sports/{sport}/events/{event_id}/odds
+            cost = 0
+            if path_parts[-1] == 'events':
+                body = events
+            elif path_parts[-1] == 'odds' and path_parts[-2] in event_odds:
+                with stats_lock:
+                    stats['attempts'] += 1
+                    failure = failures.pop(0) if failures else None
+                if failure is not None:
+                    self.send_error(failure)
+                    return
+                requested_markets = set(params.get('markets', [''])[0].split(','))
+                payload = event_odds[path_parts[-2]]
+                bookmakers = [dict(bookmaker, markets=[market for market in bookmaker['markets'] if market['key'] in requested_markets])
+                              for bookmaker in payload['bookmakers']]
+                body = dict(payload, bookmakers=bookmakers)
+                returned_markets = {market['key'] for bookmaker in bookmakers for market in bookmaker['markets']}
+                cost = len(returned_markets) * len(params.get('regions', ['us'])[0].split(','))
+            else:
+                self.send_error(404)
+                return
+
+            with stats_lock:
+                if stats['used'] + cost > quota:
+                    self.send_error(401, 'Usage quota has been reached')
+                    return
+                stats['requests'] += 1
+                stats['used'] += cost
+                used = stats['used']
+
+            content = json.dumps(body).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.send_header('x-requests-used', str(used))
+            self.send_header('x-requests-remaining', str(quota - used))
+            self.send_header('x-requests-last', str(cost))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockOddsHandler)
+    server.daemon_threads = True
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v4/sports"
+
+
+def benchmark_odds_fetch(n_events=10, latency=0.1, settings=((1, 1), (25, 1), (25, 4), (5, 8)), markets=nba_player_prop_markets):
+    """
+    Time fetch_odds_pages against the local mock server for (markets_per_request, max_concurrency) settings.
+    (1, 1) is the old one request per game and market, in sequence.
+    """
+    events, event_odds = make_mock_odds_payloads(n_events=n_events, markets=markets)
+    benchmark_results = []
+    for markets_per_request, max_concurrency in settings:
+        server, base_url = start_mock_odds_server(events, event_odds, latency=latency)
+        try:
+            start = time.perf_counter()
+            _, pages = fetch_odds_pages('mock', markets, base_url=base_url, markets_per_request=markets_per_request, max_concurrency=max_concurrency)
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+        benchmark_results.append({
+            'markets_per_request': markets_per_request,
+            'max_concurrency': max_concurrency,
+            'seconds': elapsed,
+            'requests': server.stats['requests'],
+            'credits_used': server.stats['used'],
+            'pages': len(pages),
+        })
+    return pd.DataFrame(benchmark_results)
+
+
+# Example usage (from the repository root)
+#print(benchmark_odds_fetch(n_events=10, latency=0.1))
@@ -0,0 +1,305 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from modular.betting_functions import (betting_categories, calculate_probability, calculate_probability_grid, calculate_std_grid, generate_betting_options,
+                                       _threshold_grid, evaluate_bets, evaluate_bets_n_games_debug)
+
+
+def make_game_logs(players=('Player One', 'Player Two'), n_games=14, seed=0):
+    """
+    Date-sorted game logs with a game without statistics (did not play) mid-season and an upcoming game last.
+    """
+    rng = np.random.default_rng(seed)
+    frames = []
+    for player in players:
+        dates = pd.Timestamp('2024-01-02') + pd.to_timedelta(np.arange(n_games) * 2, unit='D')
+        player_logs = pd.DataFrame({
+            'PLAYER_NAME': player,
+            'GAME_DATE': dates,
+            'OPPONENT_NAME': np.array(['Team A', 'Team B', 'Team C'])[np.arange(n_games) % 3],
+            'PTS': rng.integers(5, 31, n_games).astype(float),
+            'AST': rng.integers(0, 13, n_games).astype(float),
+        })
+        player_logs.loc[[5, n_games - 1], ['PTS', 'AST']] = np.nan
+        frames.append(player_logs)
+    return pd.concat(frames, ignore_index=True)
+
+
+def baseline_betting_options(player_data, league_std_data, opposing_teams, categories, n_games=10, league_std_rate=0.9, probability_high=0.9, probability_low=0.1):
+    """
+    The betting options of the per-date, per-threshold calculate_probability loop generate_betting_options replaced.
+    """
+    results = []
+    for player in player_data['PLAYER_NAME'].unique():
+        player_season_data = player_data[player_data['PLAYER_NAME'] == player]
+        for game_date in player_season_data['GAME_DATE'].unique():
+            game_data = player_season_data[player_season_data['GAME_DATE'] < game_date]
+            for opposing_team in opposing_teams:
+                for stat in categories:
+                    for threshold in betting_categories[stat]:
+                        probability, against_team_probability, number_of_games_against_team, player_std, _, league_std, _, _ = calculate_probability(
+                            game_data.copy(), stat, threshold, league_std_data, n_games, league_std_rate, opposing_team)
+                        if (probability > probability_high or probability < probability_low) and (player_std <= league_std * league_std_rate):
+                            results.append({
+                                'PLAYER_NAME': player,
+                                'Stat': stat,
+                                'Threshold': threshold,
+                                'Probability': probability,
+                                'Std Dev Comparison': 'Better than league std by at least 10%',
+                                'Probability comparison': 'Higher' if probability > probability_high else 'Lower',
+                                'Recommendation based on Prob and std_dev': 'Bet',
+                                'Against Team Probability': against_team_probability if against_team_probability is not None else 'N/A',
+                                'Games Against Team': number_of_games_against_team if number_of_games_against_team > 0 else 'N/A',
+                                'GAME_DATE': game_date,
+                            })
+    return pd.DataFrame(results)
+
+
+def sort_options(options):
+    options = options.astype({'Against Team Probability': object, 'Games Against Team': object})
+    return options.sort_values(['PLAYER_NAME', 'GAME_DATE', 'Stat', 'Threshold', 'Against Team Probability'], key=lambda col: col.astype(str), kind='mergesort').reset_index(drop=True)
+
+
+def test_betting_options_match_calculate_probability_on_date_sorted_logs():
+    player_data = make_game_logs()
+    league_std_data = pd.DataFrame({'PTS': [9.0], 'AST': [4.0]})
+    opposing_teams = [None, 'Team B']
+
+    options = generate_betting_options(player_data, league_std_data, [], opposing_teams, n_games=5, categories=['PTS', 'AST'])
+    expected = baseline_betting_options(player_data, league_std_data, opposing_teams, ['PTS', 'AST'], n_games=5)
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(sort_options(options), sort_options(expected), check_dtype=False)
+
+
+def test_betting_options_use_the_most_recent_games_of_unsorted_logs():
+    # Scoring well in the oldest games and poorly in the latest ones, listed newest first like the saved game logs
+    player_data = make_game_logs(players=('Player One',), n_games=13)
+    player_data['PTS'] = np.where(np.arange(13) < 6, 30.0, 5.0)
+    player_data.loc[12, 'PTS'] = np.nan
+    newest_first = player_data.iloc[::-1].reset_index(drop=True)
+    league_std_data = pd.DataFrame({'PTS': [9.0]})
+    upcoming_date = player_data['GAME_DATE'].max()
+
+    options = generate_betting_options(newest_first, league_std_data, [], [None], n_games=5, categories=['PTS'])
+    upcoming_options = options[(options['GAME_DATE'] == upcoming_date) & (options['Threshold'] == 9.5)]
+
+    # The last 5 games by date, not the last 5 rows of the newest-first logs (the 5 oldest games)
+    assert upcoming_options['Probability'].tolist() == [0.0]
+    assert calculate_probability(player_data[player_data['GAME_DATE'] < upcoming_date].copy(), 'PTS', 9.5, league_std_data, n_games=5)[0] == 0.0
+    assert calculate_probability(newest_first[newest_first['GAME_DATE'] < upcoming_date].copy(), 'PTS', 9.5, league_std_data, n_games=5)[0] == 1.0
+
+    # The row order of the game logs does not change the options
+    sorted_options = generate_betting_options(player_data, league_std_data, [], [None], n_games=5, categories=['PTS'])
+    pd.testing.assert_frame_equal(sort_options(options), sort_options(sorted_options))
+
+
+def make_stat_values(seed=0):
+    """
+    (games, stats) matrix for PTS, AST and REB: PTS with missing games, AST with a single game, REB with none.
+    """
+    rng = np.random.default_rng(seed)
+    stat_values = rng.integers(0, 30, size=(10, 3)).astype(float)
+    stat_values[[1, 4, 7], 0] = np.nan
+    stat_values[1:, 1] = np.nan
+    stat_values[:, 2] = np.nan
+    return stat_values
+
+
+def test_probability_grid_matches_calculate_probability():
+    stats = ['PTS', 'AST', 'REB']
+    stat_values = make_stat_values()
+    thresholds, stat_index = _threshold_grid(stats)
+    player_data = pd.DataFrame(stat_values, columns=stats)
+
+    probability, above, games = calculate_probability_grid(stat_values, thresholds, stat_index)
+
+    expected = [calculate_probability(player_data, stats[i], threshold, pd.DataFrame(), n_games=len(stat_values))
+                for threshold, i in zip(thresholds, stat_index)]
+    assert probability.tolist() == pytest.approx([result[0] for result in expected])
+    assert above.tolist() == [result[6] for result in expected]
+    assert games.tolist() == [result[7] for result in expected]
+    # REB has no games: probability 0, no hits
+    assert (games[stat_index == 2] == 0).all() and (probability[stat_index == 2] == 0).all()
+
+
+def test_probability_grid_never_counts_missing_games_as_hits():
+    stat_values = np.array([[np.nan], [10.0], [20.0], [np.nan]])
+    thresholds, stat_index = np.array([0.5, 15.5, 25.5]), np.zeros(3, dtype=int)
+
+    probability, above, games = calculate_probability_grid(stat_values, thresholds, stat_index)
+    assert above.tolist() == [2, 1, 0]
+    assert games.tolist() == [2, 2, 2]
+    assert probability.tolist() == [1.0, 0.5, 0.0]
+
+    # Counting every game (games against a team): the missing games are played games without a hit
+    probability, above, games = calculate_probability_grid(stat_values, thresholds, stat_index, np.full(3, len(stat_values)))
+    assert above.tolist() == [2, 1, 0]
+    assert probability.tolist() == [0.5, 0.25, 0.0]
+
+
+def test_probability_grid_is_zero_without_games():
+    thresholds, stat_index = np.array([0.5, 1.5]), np.array([0, 1])
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        probability, above, games = calculate_probability_grid(np.empty((0, 2)), thresholds, stat_index)
+        assert probability.tolist() == [0.0, 0.0]
+        assert games.tolist() == [0, 0]
+
+        probability, _, _ = calculate_probability_grid(np.full((3, 2), np.nan), thresholds, stat_index, np.zeros(2, dtype=int))
+        assert probability.tolist() == [0.0, 0.0]
+    assert calculate_probability(pd.DataFrame({'PTS': [np.nan]}), 'PTS', 0.5, pd.DataFrame())[0] == 0
+
+
+def test_std_grid_matches_calculate_probability():
+    stats = ['PTS', 'AST', 'REB']
+    stat_values = make_stat_values()
+    player_data = pd.DataFrame(stat_values, columns=stats)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        player_std = calculate_std_grid(stat_values)
+
+    expected = [calculate_probability(player_data, stat, 0.5, pd.DataFrame(), n_games=len(stat_values))[3] for stat in stats]
+    assert player_std.tolist() == pytest.approx(expected, nan_ok=True)
+    # ddof=1: NaN with a single game (AST) or none (REB)
+    assert np.isnan(player_std[1:]).all()
+    assert calculate_std_grid(np.array([[3.0], [np.nan], [5.0]])).tolist() == pytest.approx([np.sqrt(2)])
+
+
+def baseline_evaluate_bets(generated_bets, actual_performance):
+    """
+    The iterrows evaluate_bets the vectorized one replaced.
+    """
+    generated_bets.reset_index(drop=True, inplace=True)
+    for index, row in generated_bets.iterrows():
+        stat_column = row['Stat']
+        actual_stat_row = actual_performance[
+            (actual_performance['PLAYER_NAME'] == row['PLAYER_NAME']) &
+            (actual_performance['GAME_DATE'] == row['GAME_DATE'])
+        ]
+        if not actual_stat_row.empty:
+            actual_value = actual_stat_row.iloc[0][stat_column]
+            generated_bets.at[index, 'Actual Value'] = actual_value
+            if pd.notnull(actual_value):
+                bet_correct = ((row['Probability comparison'] == 'Higher' and actual_value > row['Threshold']) or
+                               (row['Probability comparison'] == 'Lower' and actual_value < row['Threshold']))
+                generated_bets.at[index, 'Bet Outcome'] = bet_correct
+            else:
+                generated_bets.at[index, 'Bet Outcome'] = np.nan
+        else:
+            generated_bets.at[index, 'Actual Value'] = np.nan
+            generated_bets.at[index, 'Bet Outcome'] = np.nan
+
+    running_correct = 0
+    running_incorrect = 0
+    for index, row in generated_bets.iterrows():
+        if pd.notnull(row['Bet Outcome']):
+            running_correct += int(row['Bet Outcome'] == True)
+            running_incorrect += int(row['Bet Outcome'] == False)
+        generated_bets.at[index, 'Running Correct'] = running_correct
+        generated_bets.at[index, 'Running Incorrect'] = running_incorrect
+    return generated_bets
+
+
+def baseline_evaluate_bets_n_games_debug(generated_bets, actual_performance, n_games=10):
+    """
+    The per-player, per-bet evaluate_bets_n_games_debug the vectorized one replaced.
+    """
+    actual_performance['GAME_DATE'] = pd.to_datetime(actual_performance['GAME_DATE'])
+    actual_performance.sort_values(by='GAME_DATE', inplace=True)
+    evaluated_bets_list = []
+    for player in generated_bets['PLAYER_NAME'].unique():
+        print(f"\nEvaluating bets for: {player}")
+        player_bets = generated_bets[generated_bets['PLAYER_NAME'] == player]
+        player_performance = actual_performance[actual_performance['PLAYER_NAME'] == player].sort_values(by='GAME_DATE')
+        min_date_for_n_games = player_performance['GAME_DATE'].unique()[-n_games]
+        player_bets_filtered = player_bets[player_bets['GAME_DATE'] >= min_date_for_n_games]
+        player_performance_filtered = player_performance[player_performance['GAME_DATE'] >= min_date_for_n_games]
+
+        correct_bets = 0
+        incorrect_bets = 0
+        for index, bet in player_bets_filtered.iterrows():
+            actual = player_performance_filtered[player_performance_filtered['GAME_DATE'] == bet['GAME_DATE']]
+            if not actual.empty:
+                actual_value = actual.iloc[0][bet['Stat']]
+                bet_correct = ((bet['Probability comparison'] == 'Higher' and actual_value > bet['Threshold']) or
+                               (bet['Probability comparison'] == 'Lower' and actual_value < bet['Threshold']))
+                if bet_correct:
+                    correct_bets += 1
+                else:
+                    incorrect_bets += 1
+                evaluated_bets_list.append({**bet, 'Actual Value': actual_value, 'Bet Correct': bet_correct})
+        print(f"{player} - Correct Bets: {correct_bets}, Incorrect Bets: {incorrect_bets}")
+
+    evaluated_bets_df_debug = pd.DataFrame(evaluated_bets_list)
+    if not evaluated_bets_df_debug.empty:
+        final_corrects = sum(evaluated_bets_df_debug['Bet Correct'])
+        overall_bets = len(evaluated_bets_df_debug)
+        print(f"\nFinal Correct Percentage: {final_corrects / overall_bets * 100}% ({final_corrects}/{overall_bets})")
+    return evaluated_bets_df_debug
+
+
+def make_bets_and_logs():
+    """
+    Game logs of two players (missing values, a date listed twice) and bets interleaved between the players,
+    including bets on a date without a game and on a player without game logs.
+    """
+    actual_performance = make_game_logs(n_games=12, seed=1).drop(columns='OPPONENT_NAME')
+    actual_performance.loc[2, 'PTS'] = np.nan
+    duplicate = actual_performance.loc[[7]].assign(PTS=99.0)
+    actual_performance = pd.concat([actual_performance, duplicate], ignore_index=True)
+
+    dates = actual_performance['GAME_DATE'].drop_duplicates().sort_values().tolist()
+    bets = []
+    for i, date in enumerate(dates + [dates[-1] + pd.Timedelta(days=1)]):
+        for player in ['Player Two', 'Player One']:
+            bets.append({'PLAYER_NAME': player, 'GAME_DATE': date, 'Stat': ['PTS', 'AST'][i % 2], 'Threshold': [14.5, 4.5, 20.5][i % 3],
+                         'Probability': 0.95, 'Probability comparison': ['Higher', 'Lower'][(i // 2) % 2]})
+    generated_bets = pd.DataFrame(bets)
+    generated_bets.index = generated_bets.index + 100
+    return generated_bets, actual_performance
+
+
+def test_evaluate_bets_matches_the_iterrows_loop():
+    generated_bets, actual_performance = make_bets_and_logs()
+    generated_bets = pd.concat([generated_bets, pd.DataFrame([{**generated_bets.iloc[0], 'PLAYER_NAME': 'Player Three'}])])
+
+    evaluated = evaluate_bets(generated_bets.copy(), actual_performance)
+    expected = baseline_evaluate_bets(generated_bets.copy(), actual_performance.copy())
+
+    pd.testing.assert_frame_equal(evaluated, expected, check_dtype=False)
+    # Both outcomes occur, missing values and games are not settled and do not move the running totals
+    outcomes = evaluated['Bet Outcome']
+    assert (outcomes == True).any() and (outcomes == False).any()
+    unsettled = outcomes.isna().to_numpy()
+    # The missing PTS value, the games without statistics (two dates per player), the date after the logs and Player Three
+    assert unsettled.sum() == 1 + 4 + 2 + 1
+    assert (np.diff(evaluated['Running Correct'] + evaluated['Running Incorrect'], prepend=0) == ~unsettled).all()
+    # The first row of a date listed twice is used
+    assert 99.0 not in evaluated['Actual Value'].tolist()
+
+
+@pytest.mark.parametrize('n_games', [1, 4, 12])
+def test_evaluate_bets_n_games_debug_matches_the_iterrows_loop(n_games, capsys):
+    generated_bets, actual_performance = make_bets_and_logs()
+
+    evaluated = evaluate_bets_n_games_debug(generated_bets.copy(), actual_performance.copy(), n_games=n_games)
+    summary = [line for line in capsys.readouterr().out.splitlines() if 'Correct' in line]
+    expected = baseline_evaluate_bets_n_games_debug(generated_bets.copy(), actual_performance.copy(), n_games=n_games)
+    expected_summary = [line for line in capsys.readouterr().out.splitlines() if 'Correct' in line]
+
+    pd.testing.assert_frame_equal(evaluated, expected, check_dtype=False)
+    assert summary == expected_summary
+    # Grouped by player in order of appearance, only bets on the last n game dates
+    assert evaluated['PLAYER_NAME'].drop_duplicates().tolist() == ['Player Two', 'Player One']
+    assert evaluated.groupby('PLAYER_NAME')['GAME_DATE'].nunique().max() <= n_games
+
+
+def test_evaluate_bets_n_games_debug_uses_every_date_of_short_logs():
+    generated_bets, actual_performance = make_bets_and_logs()
+
+    evaluated = evaluate_bets_n_games_debug(generated_bets, actual_performance, n_games=50, verbose=False)
+    # Every bet with a game is settled, the bets on the date after the logs are left out
+    assert len(evaluated) == len(generated_bets) - 2
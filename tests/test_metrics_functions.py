@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+from modular.metrics_functions import calculate_last_n_stats, prepare_mean_std_data
+from modular.schema import metric_stats, add_derived_stat_columns
+
+
+def baseline_prepare_mean_std_data(df, n_games=10, current_date=None, current_season=None, game_location='All'):
+    """
+    The per-group loop prepare_mean_std_data replaced, on the same stats.
+    """
+    stats = metric_stats
+    df = add_derived_stat_columns(df)
+    if current_date:
+        df = df[df['GAME_DATE'] <= current_date]
+    if current_season:
+        df = df[df['SEASON'] == current_season]
+    if game_location in ['Home', 'Away']:
+        df = df[df['HOME_AWAY'] == game_location]
+
+    result_list = []
+    for (player_name, team_name), group in df.groupby(['PLAYER_NAME', 'TEAM_NAME']):
+        group = group.sort_values(by='GAME_DATE', ascending=False).head(n_games)
+        mean_values = group[stats].mean()
+        std_values = group[stats].std(ddof=0)
+        mean_values['TYPE'] = 'mean_' + str(n_games) + '_games'
+        std_values['TYPE'] = 'std_' + str(n_games) + '_games'
+        for values in (mean_values, std_values):
+            values['PLAYER_NAME'] = player_name
+            values['TEAM_NAME'] = team_name
+            values['HOME_AWAY'] = game_location
+        result_list.append(mean_values)
+        result_list.append(std_values)
+    return pd.DataFrame(result_list).reset_index(drop=True)
+
+
+@pytest.fixture(scope='module')
+def game_logs():
+    # The first 30 players of the sample game logs, a few of them traded during the season
+    data = pd.read_csv('data/player_game_logs_winr.csv', parse_dates=['GAME_DATE'])
+    players = data['PLAYER_NAME'].drop_duplicates().iloc[:30]
+    return data[data['PLAYER_NAME'].isin(players)].reset_index(drop=True)
+
+
+@pytest.mark.parametrize('n_games, game_location, current_date', [(10, 'All', None), (5, 'Home', None), (3, 'Away', '2024-02-15'), (1000, 'All', None)])
+def test_mean_std_data_matches_the_per_group_loop(game_logs, n_games, game_location, current_date):
+    current_date = pd.Timestamp(current_date) if current_date else None
+
+    aggregated = prepare_mean_std_data(game_logs, n_games=n_games, current_date=current_date, game_location=game_location)
+    expected = baseline_prepare_mean_std_data(game_logs, n_games=n_games, current_date=current_date, game_location=game_location)
+    expected[metric_stats] = expected[metric_stats].astype(float)
+
+    pd.testing.assert_frame_equal(aggregated, expected, check_dtype=False, atol=1e-6)
+
+
+def test_last_n_stats_group_columns():
+    df = pd.DataFrame({'PLAYER_NAME': ['A', 'A', 'B'], 'TEAM_NAME': ['X', 'X', 'Y'], 'HOME_AWAY': ['Home', 'Away', 'Home'],
+                       'GAME_DATE': pd.to_datetime(['2024-01-01', '2024-01-03', '2024-01-02']), 'PTS': [10.0, 20.0, 30.0]})
+    group_cols = ['PLAYER_NAME']
+
+    by_player = calculate_last_n_stats(df, ['PTS'], [(1, 'All')], group_cols=group_cols)
+    assert group_cols == ['PLAYER_NAME']
+    assert list(by_player.columns) == ['PTS', 'TYPE', 'PLAYER_NAME', 'HOME_AWAY']
+    assert by_player['PTS'].tolist() == [20.0, 0.0, 30.0, 0.0]
+
+    # The default groups by player and team, the same with a list or a tuple
+    pd.testing.assert_frame_equal(calculate_last_n_stats(df, ['PTS'], [(2, 'All')]),
+                                  calculate_last_n_stats(df, ('PTS',), [(2, 'All')], group_cols=['PLAYER_NAME', 'TEAM_NAME']))
+    assert calculate_last_n_stats(df.iloc[:0], ['PTS'], [(2, 'All')]).columns.tolist() == ['PTS', 'TYPE', 'PLAYER_NAME', 'TEAM_NAME', 'HOME_AWAY']
@@ -0,0 +1,128 @@
+import pytest
+from modular.odds_fetcher import QuotaBudget, make_odds_session, fetch_odds_pages, load_recorded_odds_pages, nba_player_prop_markets
+from tests.odds_mock import make_mock_odds_payloads, start_mock_odds_server
+
+
+@pytest.fixture
+def mock_odds():
+    events, event_odds = make_mock_odds_payloads(n_events=4, players_per_team=2)
+    servers = []
+
+    def start(**kwargs):
+        server, base_url = start_mock_odds_server(events, event_odds, **kwargs)
+        servers.append(server)
+        return server, base_url
+
+    yield events, start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def requested_markets(page):
+    return {market['key'] for bookmaker in page['bookmakers'] for market in bookmaker['markets']}
+
+
+@pytest.mark.parametrize('markets_per_request, requests_per_event', [(25, 1), (10, 3), (1, 25)])
+def test_markets_are_combined_into_requests(mock_odds, markets_per_request, requests_per_event):
+    events, start = mock_odds
+    server, base_url = start()
+    _, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url, markets_per_request=markets_per_request)
+
+    assert server.stats['requests'] == len(events) * requests_per_event
+    assert len(pages) == len(events) * requests_per_event
+    # Every market of every event is fetched exactly once, pages in event then market order
+    assert [page['id'] for page in pages] == [event['id'] for event in events for _ in range(requests_per_event)]
+    for i, event in enumerate(events):
+        event_pages = pages[i * requests_per_event:(i + 1) * requests_per_event]
+        assert sorted(market for page in event_pages for market in requested_markets(page)) == sorted(nba_player_prop_markets)
+
+
+def test_events_are_listed_when_not_given(mock_odds):
+    events, start = mock_odds
+    server, base_url = start()
+    fetched_events, pages = fetch_odds_pages('mock', nba_player_prop_markets, base_url=base_url)
+
+    assert fetched_events == events
+    # One events listing, then one odds request per event
+    assert server.stats['requests'] == 1 + len(events)
+    assert len(pages) == len(events)
+
+
+def test_concurrency_is_capped(mock_odds):
+    events, start = mock_odds
+    server, base_url = start(latency=0.05)
+    _, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url, markets_per_request=5, max_concurrency=3)
+
+    assert len(pages) == len(events) * 5
+    assert server.stats['max_in_flight'] == 3
+
+
+def test_quota_budget_stops_requests(mock_odds):
+    events, start = mock_odds
+    server, base_url = start()
+    # One request costs its 25 markets, the budget covers two of the four events
+    _, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url, quota_budget=50, max_concurrency=1)
+
+    assert len(pages) == 2
+    assert server.stats['attempts'] == 2
+    assert server.stats['used'] == 50
+
+
+def test_remaining_quota_stops_requests(mock_odds):
+    events, start = mock_odds
+    server, base_url = start(quota=60)
+    # After the first response the API reports 35 credits left: one more request fits, the last two do not
+    _, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url, max_concurrency=1)
+
+    assert len(pages) == 2
+    assert server.stats['attempts'] == 2
+
+
+def test_quota_budget_reserve():
+    budget = QuotaBudget(budget=10)
+    assert budget.reserve(6)
+    assert not budget.reserve(5)
+    assert budget.reserve(4)
+
+    budget = QuotaBudget()
+    budget.update({'x-requests-remaining': '3'})
+    assert not budget.reserve(4)
+    assert budget.reserve(3)
+    budget.update({'x-requests-remaining': '10'})
+    # A stale, higher count from a request that was in flight does not raise the remaining quota
+    assert budget.remaining == 0
+
+
+@pytest.mark.parametrize('fail_statuses', [(429,), (500, 502), (503, 504, 429)])
+def test_rate_limited_and_server_errors_are_retried(mock_odds, fail_statuses):
+    events, start = mock_odds
+    server, base_url = start(fail_statuses=fail_statuses)
+    session = make_odds_session(max_concurrency=1, max_retries=3, backoff=0)
+    _, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url, max_concurrency=1, session=session)
+
+    assert len(pages) == len(events)
+    assert server.stats['requests'] == len(events)
+    assert server.stats['attempts'] == len(events) + len(fail_statuses)
+
+
+def test_request_is_dropped_after_the_retries(mock_odds):
+    events, start = mock_odds
+    server, base_url = start(fail_statuses=(503,) * 3)
+    session = make_odds_session(max_concurrency=1, max_retries=2, backoff=0)
+    _, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url, max_concurrency=1, session=session)
+
+    # The first event fails its request and both retries, the other events are fetched
+    assert [page['id'] for page in pages] == [event['id'] for event in events[1:]]
+
+
+def test_recorded_pages_load_back(mock_odds, tmp_path):
+    events, start = mock_odds
+    server, base_url = start()
+    record_dir = tmp_path / 'odds_pages'
+    fetched_events, pages = fetch_odds_pages('mock', nba_player_prop_markets, events=events, base_url=base_url,
+                                             markets_per_request=10, record_dir=str(record_dir))
+
+    recorded_events, recorded_pages = load_recorded_odds_pages(str(record_dir))
+    assert recorded_events == fetched_events
+    assert recorded_pages == pages
@@ -0,0 +1,358 @@
+import sys
+import time
+import threading
+import types
+import pandas as pd
+import pytest
+import modular.player_game_logs as player_game_logs
+import modular.team_metadata as team_metadata
+from modular.player_game_logs import (TokenBucket, game_log_columns, fetch_player_game_log, fetch_player_game_logs, fetch_new_game_logs,
+                                      load_nba_player_game_logs, calculate_cumulative_win_rates, get_win_rates_asof)
+from tests.game_log_stub import make_stub_game_log_endpoint
+
+
+class FlakyEndpoint:
+    """
+    Endpoint stub failing its first `failures` calls, then returning `frame`.
+    """
+    def __init__(self, frame, failures):
+        self.frame = frame
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError('stats API unavailable')
+        return self
+
+    def get_data_frames(self):
+        return [self.frame]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(player_game_logs.time, 'sleep', waits.append)
+    monkeypatch.setattr(player_game_logs.random, 'uniform', lambda low, high: high)
+    return waits
+
+
+def league_game_log():
+    rows = pd.DataFrame({col: [0, 0] for col in game_log_columns})
+    rows['Player_ID'] = [1, 1]
+    rows['GAME_DATE'] = ['2024-03-01', '2024-03-05']
+    rows['PLAYER_NAME'] = 'Player One'
+    return rows.rename(columns={'Player_ID': 'PLAYER_ID', 'Game_ID': 'GAME_ID'})
+
+
+def test_new_game_logs_retry_with_the_player_fetch_backoff(sleeps):
+    endpoint = FlakyEndpoint(league_game_log(), failures=3)
+    latest_dates = pd.Series([pd.Timestamp('2024-03-02')], index=[1])
+    new_games = fetch_new_game_logs('2023-24', latest_dates, TokenBucket(1000, capacity=10), max_retries=3, backoff=0.5, league_game_log_endpoint=endpoint)
+
+    assert endpoint.calls == 4
+    # backoff * 2 ** attempt plus up to backoff of jitter
+    assert sleeps == [1.0, 1.5, 2.5]
+    assert new_games['GAME_DATE'].tolist() == [pd.Timestamp('2024-03-05')]
+
+    player_endpoint = FlakyEndpoint(league_game_log(), failures=3)
+    sleeps.clear()
+    fetch_player_game_log(1, '2023-24', TokenBucket(1000, capacity=10), max_retries=3, backoff=0.5, game_log_endpoint=player_endpoint)
+    assert sleeps == [1.0, 1.5, 2.5]
+
+
+def test_new_game_logs_raise_after_the_retries(sleeps):
+    endpoint = FlakyEndpoint(league_game_log(), failures=5)
+    latest_dates = pd.Series([pd.Timestamp('2024-03-02')], index=[1])
+    with pytest.raises(ConnectionError):
+        fetch_new_game_logs('2023-24', latest_dates, TokenBucket(1000, capacity=10), max_retries=2, backoff=0.5, league_game_log_endpoint=endpoint)
+    assert endpoint.calls == 3
+
+
+class FakeClock:
+    """
+    Stand-in for the time module: sleeping moves the clock forward instead of waiting.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TrackingEndpoint:
+    """
+    Endpoint stub holding every request for `latency` seconds, recording when it started and the most
+    requests in flight, and failing every request of the players in `failing_players`.
+    """
+    def __init__(self, latency=0.0, failing_players=()):
+        self.latency = latency
+        self.failing_players = set(failing_players)
+        self.started = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.frames = make_stub_game_log_endpoint(latency=0.0, n_games=3)
+
+    def __call__(self, player_id, season, **kwargs):
+        with self.lock:
+            self.started.append(time.perf_counter())
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            if player_id in self.failing_players:
+                raise ConnectionError(f'stats API unavailable for player {player_id}')
+            return self.frames(player_id=player_id, season=season)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+def make_players(n_players):
+    return pd.DataFrame({'PLAYER_ID': range(1, n_players + 1), 'PLAYER_NAME': [f'Player {i}' for i in range(1, n_players + 1)]})
+
+
+def test_token_bucket_allows_a_burst_then_the_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(player_game_logs, 'time', types.SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    bucket = TokenBucket(rate=2, capacity=3)
+
+    granted = []
+    for _ in range(7):
+        bucket.acquire()
+        granted.append(clock.now)
+
+    # The first `capacity` requests go through at once, then one every 1 / rate seconds
+    assert granted == pytest.approx([0.0, 0.0, 0.0, 0.5, 1.0, 1.5, 2.0])
+
+    # Idle time refills the bucket up to its capacity only
+    clock.now += 10
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now == pytest.approx(12.5)
+
+
+def test_fetch_is_bounded_by_the_worker_pool():
+    endpoint = TrackingEndpoint(latency=0.05)
+    player_logs = fetch_player_game_logs(make_players(12), '2023-24', max_workers=3, requests_per_second=1000,
+                                         progress_callback=None, game_log_endpoint=endpoint)
+
+    assert len(endpoint.started) == 12
+    assert endpoint.max_in_flight == 3
+    assert all(player_data is not None for _, _, player_data in player_logs)
+
+
+def test_fetch_is_rate_limited_across_workers():
+    endpoint = TrackingEndpoint()
+    fetch_player_game_logs(make_players(6), '2023-24', max_workers=4, requests_per_second=20,
+                           progress_callback=None, game_log_endpoint=endpoint)
+
+    # One token up front, then the workers share 20 requests per second
+    started = sorted(endpoint.started)
+    assert started[-1] - started[0] >= 5 / 20 * 0.9
+
+
+def test_fetch_reports_progress_and_failures_per_player(sleeps):
+    players = make_players(5)
+    endpoint = TrackingEndpoint(failing_players={2, 4})
+    progress = []
+    player_logs = fetch_player_game_logs(players, '2023-24', max_workers=2, requests_per_second=1000, max_retries=1, backoff=0.0,
+                                         progress_callback=lambda *args: progress.append(args), game_log_endpoint=endpoint)
+
+    # One callback per player, counting up to the number of players
+    assert [(completed, total) for completed, total, _, _ in progress] == [(i, 5) for i in range(1, 6)]
+    assert sorted(player_name for _, _, player_name, _ in progress) == players['PLAYER_NAME'].tolist()
+    errors = {player_name: error for _, _, player_name, error in progress}
+    assert {player_name for player_name, error in errors.items() if error is not None} == {'Player 2', 'Player 4'}
+    assert isinstance(errors['Player 2'], ConnectionError)
+
+    # Failed players are kept, in the order of `players`, without game logs; each was tried max_retries + 1 times
+    assert [(player_id, player_name) for player_id, player_name, _ in player_logs] == list(players.itertuples(index=False, name=None))
+    assert [player_data is None for _, _, player_data in player_logs] == [False, True, False, True, False]
+    assert len(endpoint.started) == 3 + 2 * 2
+    assert list(player_logs[0][2].columns) == game_log_columns
+
+
+teams_list = [
+    {'id': 1610612738, 'abbreviation': 'BOS', 'full_name': 'Boston Celtics'},
+    {'id': 1610612747, 'abbreviation': 'LAL', 'full_name': 'Los Angeles Lakers'},
+    {'id': 1610612748, 'abbreviation': 'MIA', 'full_name': 'Miami Heat'},
+]
+
+# Team results of the season, the win rates before each game are what the new rows get
+team_games = pd.DataFrame({
+    'TEAM_NAME': ['Boston Celtics', 'Los Angeles Lakers', 'Boston Celtics', 'Miami Heat', 'Los Angeles Lakers', 'Boston Celtics', 'Miami Heat'],
+    'GAME_DATE': ['2024-03-01', '2024-03-01', '2024-03-03', '2024-03-03', '2024-03-04', '2024-03-05', '2024-03-05'],
+    'WL': ['W', 'L', 'L', 'W', 'W', 'W', 'L'],
+})
+
+
+def game_log_rows(player_id, games, date_format='%Y-%m-%d'):
+    """
+    Game log rows in the playergamelog format for (Game_ID, GAME_DATE, MATCHUP, PTS) tuples.
+    """
+    rows = pd.DataFrame({col: [0] * len(games) for col in game_log_columns})
+    rows['SEASON_ID'] = '22023'
+    rows['Player_ID'] = player_id
+    rows['Game_ID'] = [game_id for game_id, _, _, _ in games]
+    rows['GAME_DATE'] = [pd.Timestamp(game_date).strftime(date_format) for _, game_date, _, _ in games]
+    rows['MATCHUP'] = [matchup for _, _, matchup, _ in games]
+    rows['WL'] = 'W'
+    rows['PTS'] = [points for _, _, _, points in games]
+    return rows
+
+
+class PlayerGameLogEndpoint:
+    """
+    playergamelog.PlayerGameLog stand-in returning fixed frames per player and recording the players requested.
+    """
+    def __init__(self, frames):
+        self.frames = frames
+        self.requested = []
+
+    def __call__(self, player_id, season, **kwargs):
+        self.requested.append(player_id)
+        return FlakyEndpoint(self.frames[player_id].copy(), failures=0)
+
+
+@pytest.fixture
+def fake_nba_api(monkeypatch):
+    """
+    nba_api replaced by modules returning two eligible players, their stats, the team games and the teams.
+    """
+    players = pd.DataFrame({'PERSON_ID': [1, 2], 'DISPLAY_FIRST_LAST': ['Player One', 'Player Two']})
+    player_stats = pd.DataFrame({'PLAYER_ID': [1, 2], 'PLAYER_NAME': ['Player One', 'Player Two'], 'MIN': [700.0, 640.0], 'GP': [20, 20]})
+    endpoints = types.ModuleType('nba_api.stats.endpoints')
+    endpoints.commonallplayers = types.SimpleNamespace(CommonAllPlayers=FlakyEndpoint(players, failures=0))
+    endpoints.leaguedashplayerstats = types.SimpleNamespace(LeagueDashPlayerStats=FlakyEndpoint(player_stats, failures=0))
+    endpoints.leaguegamefinder = types.SimpleNamespace(LeagueGameFinder=FlakyEndpoint(team_games.copy(), failures=0))
+    static = types.ModuleType('nba_api.stats.static')
+    static.teams = types.SimpleNamespace(get_teams=lambda: teams_list)
+    for name, module in [('nba_api', types.ModuleType('nba_api')), ('nba_api.stats', types.ModuleType('nba_api.stats')),
+                         ('nba_api.stats.endpoints', endpoints), ('nba_api.stats.static', static)]:
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.setattr(team_metadata, 'team_tables', {})
+
+
+@pytest.fixture
+def saved_game_logs(tmp_path, fake_nba_api):
+    """
+    Player 1 saved with two games whose win rates differ from what they would be recomputed to, player 2 eligible
+    but not saved yet.
+    """
+    saved = game_log_rows(1, [('0022300001', '2024-03-01', 'BOS vs. LAL', 10), ('0022300002', '2024-03-03', 'BOS @ MIA', 12)])
+    saved['PLAYER_NAME'] = 'Player One'
+    saved['TEAM_ABBREVIATION'] = 'BOS'
+    saved['OPPONENT_ABBREVIATION'] = ['LAL', 'MIA']
+    saved['TEAM_NAME'] = 'Boston Celtics'
+    saved['OPPONENT_NAME'] = ['Los Angeles Lakers', 'Miami Heat']
+    saved['TEAM_WIN_RATE'] = [0.125, 0.375]
+    saved['OPPONENT_WIN_RATE'] = [0.625, 0.875]
+    saved['HOME_AWAY'] = ['Home', 'Away']
+    save_path = tmp_path / 'player_game_logs.csv'
+    saved.to_csv(save_path, index=False)
+    return save_path
+
+
+def player_two_endpoint():
+    # The player endpoint spells dates out ('MAR 01, 2024')
+    return game_log_rows(2, [('0022300001', '2024-03-01', 'LAL @ BOS', 20), ('0022300007', '2024-03-06', 'LAL vs. MIA', 22)], date_format='%b %d, %Y')
+
+
+def test_incremental_load_appends_only_the_newer_games(saved_game_logs, sleeps):
+    league_log = game_log_rows(1, [('0022300001', '2024-03-01', 'BOS vs. LAL', 99), ('0022300002', '2024-03-03', 'BOS @ MIA', 99),
+                                   ('0022300005', '2024-03-05', 'BOS vs. MIA', 14)])
+    league_log['PLAYER_NAME'] = 'Player One'
+    league_endpoint = FlakyEndpoint(league_log.rename(columns={'Player_ID': 'PLAYER_ID', 'Game_ID': 'GAME_ID'}), failures=0)
+    player_endpoint = PlayerGameLogEndpoint({2: player_two_endpoint()})
+
+    game_logs = load_nba_player_game_logs('2023-24', save_path=str(saved_game_logs), requests_per_second=1000, progress_callback=None,
+                                          game_log_endpoint=player_endpoint, incremental=True, league_game_log_endpoint=league_endpoint)
+
+    # Player 1 is updated from the league log, only player 2 gets its full game log
+    assert player_endpoint.requested == [2]
+    game_logs = game_logs.sort_values(['Player_ID', 'GAME_DATE']).reset_index(drop=True)
+    assert list(zip(game_logs['Player_ID'], game_logs['Game_ID'])) == [
+        (1, '0022300001'), (1, '0022300002'), (1, '0022300005'), (2, '0022300001'), (2, '0022300007')]
+    assert len(pd.read_csv(saved_game_logs)) == 5
+
+    # The saved rows are kept as they were, the overlapping league rows are not appended
+    saved_rows = game_logs.iloc[:2]
+    assert saved_rows['PTS'].tolist() == [10, 12]
+    assert saved_rows['TEAM_WIN_RATE'].tolist() == pytest.approx([0.125, 0.375])
+    assert saved_rows['OPPONENT_WIN_RATE'].tolist() == pytest.approx([0.625, 0.875])
+    assert saved_rows['HOME_AWAY'].astype(str).tolist() == ['Home', 'Away']
+
+    # The new rows get their derived columns and the win rates from before the game
+    new_rows = game_logs.iloc[2:]
+    assert new_rows['PTS'].tolist() == [14, 20, 22]
+    assert new_rows['TEAM_NAME'].astype(str).tolist() == ['Boston Celtics', 'Los Angeles Lakers', 'Los Angeles Lakers']
+    assert new_rows['OPPONENT_NAME'].astype(str).tolist() == ['Miami Heat', 'Boston Celtics', 'Miami Heat']
+    assert new_rows['HOME_AWAY'].astype(str).tolist() == ['Home', 'Away', 'Home']
+    assert new_rows['TEAM_WIN_RATE'].tolist() == pytest.approx([0.5, 0.0, 0.5])
+    assert new_rows['OPPONENT_WIN_RATE'].tolist() == pytest.approx([1.0, 0.0, 0.5])
+
+
+def test_incremental_load_keeps_the_last_copy_of_games_fetched_again(saved_game_logs, sleeps):
+    # Without the league log the saved player's full game log is fetched again, overlapping the saved games
+    league_endpoint = FlakyEndpoint(None, failures=10)
+    player_one = game_log_rows(1, [('0022300001', '2024-03-01', 'BOS vs. LAL', 99), ('0022300002', '2024-03-03', 'BOS @ MIA', 99),
+                                   ('0022300005', '2024-03-05', 'BOS vs. MIA', 14)], date_format='%b %d, %Y')
+    player_endpoint = PlayerGameLogEndpoint({1: player_one, 2: player_two_endpoint()})
+
+    game_logs = load_nba_player_game_logs('2023-24', save_path=str(saved_game_logs), requests_per_second=1000, max_retries=0, progress_callback=None,
+                                          game_log_endpoint=player_endpoint, incremental=True, league_game_log_endpoint=league_endpoint)
+
+    assert sorted(player_endpoint.requested) == [1, 2]
+    assert not game_logs.duplicated(subset=['Player_ID', 'Game_ID']).any()
+    player_one_rows = game_logs[game_logs['Player_ID'] == 1].sort_values('GAME_DATE')
+    # The fetched copy replaces the saved one, with its win rates computed again
+    assert player_one_rows['PTS'].tolist() == [99, 99, 14]
+    assert player_one_rows['TEAM_WIN_RATE'].tolist() == pytest.approx([0.0, 1.0, 0.5])
+    assert player_one_rows['OPPONENT_WIN_RATE'].tolist() == pytest.approx([0.0, 0.0, 1.0])
+    assert len(pd.read_csv(saved_game_logs)) == 5
+
+
+def get_win_rate(row, team_type, all_games):
+    """
+    The per-row win rate lookup get_win_rates_asof replaced, kept as the reference.
+    """
+    game_date = row['GAME_DATE']
+    team_name = row[team_type]
+    team_games = all_games[(all_games['TEAM_NAME'] == team_name) & (all_games['GAME_DATE'] < game_date)]
+    if not team_games.empty:
+        return team_games.iloc[-1]['CUMULATIVE_WIN_RATE']
+    else:
+        return 0.0
+
+
+def test_win_rates_match_the_per_row_lookup(fake_nba_api):
+    all_games = calculate_cumulative_win_rates('2023-24')
+    # Every team on every date around the games, shuffled and with a non-default index
+    rows = pd.DataFrame([(team['full_name'], date) for team in teams_list for date in pd.date_range('2024-02-28', '2024-03-07')],
+                        columns=['OPPONENT_NAME', 'GAME_DATE']).sample(frac=1, random_state=0)
+    rows.index = rows.index * 10 + 3
+
+    win_rates = get_win_rates_asof(rows, 'OPPONENT_NAME', all_games)
+
+    assert win_rates.index.equals(rows.index)
+    assert win_rates.tolist() == pytest.approx(rows.apply(get_win_rate, axis=1, args=('OPPONENT_NAME', all_games)).tolist())
+
+
+def test_win_rates_only_count_games_strictly_before(fake_nba_api):
+    all_games = calculate_cumulative_win_rates('2023-24')
+    rows = pd.DataFrame({
+        'TEAM_NAME': ['Boston Celtics', 'Boston Celtics', 'Boston Celtics', 'Boston Celtics', 'Los Angeles Lakers', 'Miami Heat', None],
+        'GAME_DATE': pd.to_datetime(['2024-03-01', '2024-03-02', '2024-03-03', '2024-03-04', '2024-03-01', '2024-03-03', '2024-03-05']),
+    })
+
+    win_rates = get_win_rates_asof(rows, 'TEAM_NAME', all_games)
+
+    # Boston: 0.0 on its first game, 1.0 after the win, the loss on 03-03 only counts from the next day.
+    # The Lakers and the Heat play their first game on the date, a row without a team has no games.
+    assert win_rates.tolist() == [0.0, 1.0, 1.0, 0.5, 0.0, 0.0, 0.0]